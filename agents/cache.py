@@ -0,0 +1,119 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.config import Settings
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC, case-folded, single spaces."""
+    return " ".join(unicodedata.normalize("NFC", text).casefold().split())
+
+
+class ExtractionCache:
+    """LRU + TTL cache of model extraction results.
+
+    Keys combine the normalised message, the already-known fields sent as
+    context, the model and the prompt version, and are stored hashed. Editing
+    the prompt changes its version, so stale results are never served.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 2048,
+        ttl_s: float = 3600,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._capacity = max(0, capacity)
+        self._ttl_s = ttl_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Optional[str]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, *, capacity: int, ttl_s: float) -> None:
+        with self._lock:
+            self._capacity = max(0, capacity)
+            self._ttl_s = ttl_s
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @property
+    def enabled(self) -> bool:
+        return self._capacity > 0
+
+    @staticmethod
+    def make_key(text: str, existing: Dict[str, Any], model: str, prompt_version: str) -> str:
+        raw = json.dumps(
+            [normalize_text(text), existing, model, prompt_version],
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Optional[str]]]:
+        if not self.enabled:
+            return None
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key: str, value: Dict[str, Optional[str]]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + self._ttl_s, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> int:
+        with self._lock:
+            n = len(self._entries)
+            self._entries.clear()
+            return n
+
+    def clear(self) -> None:
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self._capacity,
+            "ttl_s": self._ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+extraction_cache = ExtractionCache()
+
+
+def configure_from_settings(settings: Settings) -> ExtractionCache:
+    extraction_cache.configure(
+        capacity=settings.extraction_cache_size, ttl_s=settings.extraction_cache_ttl_s
+    )
+    return extraction_cache
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+# Optional request parameters some models/SDK versions reject
+OPTIONAL_PARAMS = ("response_format", "temperature", "max_output_tokens")
+# Capability recorded for strict structured outputs (Responses API `text_format`)
+STRICT_OUTPUT = "text_format"
+
+
+def unsupported_param(exc: Exception, sent: Dict[str, Any]) -> Optional[str]:
+    """Return the optional parameter an SDK/API error complains about, if any."""
+    text = str(exc)
+    for param in OPTIONAL_PARAMS:
+        if param not in sent or param not in text:
+            continue
+        # Older SDKs raise TypeError for unknown kwargs; the API answers "Unsupported parameter"
+        if isinstance(exc, TypeError) or "Unsupported parameter" in text or "not supported" in text:
+            return param
+    return None
+
+
+def unsupported_strict_output(exc: Exception) -> bool:
+    """True if an error means the model/SDK cannot do strict structured outputs."""
+    if isinstance(exc, AttributeError):
+        # SDK without `responses.parse`
+        return True
+    text = str(exc)
+    if isinstance(exc, TypeError) and STRICT_OUTPUT in text:
+        return True
+    return any(
+        marker in text for marker in ("json_schema", "text.format", "Structured Outputs")
+    ) and ("not supported" in text or "Unsupported" in text or "Invalid" in text)
+
+
+class ModelCapabilityRegistry:
+    """Remembers which optional parameters each model accepts.
+
+    Keyed by base URL and model name, so a parameter rejected once is never
+    sent again to that model. Optionally persisted as a small JSON file.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._caps: Dict[str, Dict[str, bool]] = {}
+        if path:
+            self.load()
+
+    @staticmethod
+    def _key(model: str, base_url: Optional[str]) -> str:
+        return f"{base_url or 'default'}|{model}"
+
+    def configure(self, path: Optional[str]) -> None:
+        self._path = path
+        if path:
+            self.load()
+
+    def supports(self, model: str, base_url: Optional[str], param: str) -> bool:
+        # Unknown means "try it": the first rejection teaches us otherwise
+        return self._caps.get(self._key(model, base_url), {}).get(param, True)
+
+    def record(self, model: str, base_url: Optional[str], param: str, supported: bool) -> None:
+        key = self._key(model, base_url)
+        with self._lock:
+            caps = self._caps.setdefault(key, {})
+            if caps.get(param) == supported:
+                return
+            caps[param] = supported
+        logger.info(
+            "model_capability", extra={"model": model, "param": param, "supported": supported}
+        )
+        self.save()
+
+    def load(self) -> None:
+        if not self._path or not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("model_capabilities_load_failed", extra={"error": str(exc)})
+            return
+        with self._lock:
+            for key, caps in (data or {}).items():
+                self._caps[key] = {str(p): bool(v) for p, v in (caps or {}).items()}
+
+    def save(self) -> None:
+        if not self._path:
+            return
+        tmp = f"{self._path}.tmp"
+        try:
+            with self._lock:
+                data = json.dumps(self._caps, indent=2, sort_keys=True)
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(data)
+            os.replace(tmp, self._path)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("model_capabilities_save_failed", extra={"error": str(exc)})
+
+    def snapshot(self) -> Dict[str, Dict[str, bool]]:
+        with self._lock:
+            return {k: dict(v) for k, v in self._caps.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._caps.clear()
+
+
+registry = ModelCapabilityRegistry()
+
+
+def configure_from_settings(settings: Settings) -> ModelCapabilityRegistry:
+    registry.configure(settings.agent_capabilities_path)
+    return registry
@@ -1,13 +1,18 @@
-
 try:
-    from openai import OpenAI  # type: ignore
+    from openai import AsyncOpenAI, OpenAI  # type: ignore
 except Exception:  # pragma: no cover - handled at runtime if SDK not installed
+    AsyncOpenAI = None  # type: ignore
     OpenAI = None  # type: ignore
 
-from typing import Optional
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
 
 from app.config import Settings
 
+logger = logging.getLogger(__name__)
+
 
 def _normalize_base_url(url: Optional[str]) -> Optional[str]:
     if not url:
@@ -20,6 +25,17 @@ def _normalize_base_url(url: Optional[str]) -> Optional[str]:
     return u
 
 
+def _client_kwargs(settings: Settings) -> Dict[str, Any]:
+    # Organization/base_url/project are optional and only set if provided.
+    kwargs: Dict[str, Any] = {}
+    base_url = _normalize_base_url(settings.openai_base_url)
+    if base_url:
+        kwargs["base_url"] = base_url
+    if settings.openai_org_id:
+        kwargs["organization"] = settings.openai_org_id
+    return kwargs
+
+
 def create_agents_client(settings: Settings):
     """Create and return an OpenAI Agents SDK client.
 
@@ -28,16 +44,80 @@ def create_agents_client(settings: Settings):
     if settings.openai_api_key is None or OpenAI is None:
         return None
 
-    # Organization/base_url/project are optional and only set if provided.
-    kwargs = {}
-    base_url = _normalize_base_url(settings.openai_base_url)
-    if base_url:
-        kwargs["base_url"] = base_url
-    if settings.openai_org_id:
-        kwargs["organization"] = settings.openai_org_id
-
-    client = OpenAI(api_key=settings.openai_api_key, **kwargs)
+    client = OpenAI(api_key=settings.openai_api_key, **_client_kwargs(settings))
 
     # Optionally, project configuration can be stored/used at higher layers
     # (e.g., selecting an agent or project ID during Phase 3).
     return client
+
+
+def create_async_agents_client(settings: Settings):
+    """Create an `AsyncOpenAI` client with a tuned, keep-alive connection pool.
+
+    Returns None if API key or SDK missing. Prefer `get_agents_client`, which
+    shares one instance (and its pool) across the whole process.
+    """
+    if not settings.openai_api_key or AsyncOpenAI is None:
+        return None
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_keepalive,
+            keepalive_expiry=settings.openai_keepalive_s,
+        ),
+        timeout=httpx.Timeout(settings.openai_timeout_s, connect=5.0),
+    )
+    return AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        max_retries=settings.openai_max_retries,
+        http_client=http_client,
+        **_client_kwargs(settings),
+    )
+
+
+# Process-wide async client, created in the app lifespan (or lazily on first use)
+_async_client: Any = None
+_async_client_key: Optional[Tuple[Optional[str], ...]] = None
+# Clients replaced after a settings change; closed with the current one, since
+# requests started on them may still be in flight
+_retired_clients: List[Any] = []
+
+
+def _settings_key(settings: Settings) -> Tuple[Optional[str], ...]:
+    return (settings.openai_api_key, settings.openai_base_url, settings.openai_org_id)
+
+
+def init_agents_client(settings: Settings):
+    """Create the shared async client for this process, replacing any previous one."""
+    global _async_client, _async_client_key
+    if _async_client is not None:
+        _retired_clients.append(_async_client)
+    _async_client = create_async_agents_client(settings)
+    _async_client_key = _settings_key(settings)
+    if _async_client is not None:
+        logger.info("agents_client_ready", extra={"model": settings.agent_model})
+    return _async_client
+
+
+def get_agents_client(settings: Settings):
+    """Return the shared async client, creating it if the settings changed."""
+    if not settings.openai_api_key:
+        return None
+    if _async_client is None or _async_client_key != _settings_key(settings):
+        return init_agents_client(settings)
+    return _async_client
+
+
+async def close_agents_client() -> None:
+    """Close the shared client and any it replaced (their connection pools included)."""
+    global _async_client, _async_client_key
+    clients = [*_retired_clients, _async_client]
+    _retired_clients.clear()
+    _async_client, _async_client_key = None, None
+    for client in clients:
+        if client is None:
+            continue
+        try:
+            await client.close()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("agents_client_close_failed", extra={"error": str(exc)})
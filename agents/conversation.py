@@ -1,51 +1,106 @@
+import hashlib
 import json
-import re
 from typing import Dict, List, Optional, Tuple
 
+from agents.decoder import decode_extraction
+from agents.schemas import Extraction
 from agents.session import SessionState
 
-
 FIELDS = ("name", "reason", "preferred_time")
 
 
-def build_extraction_prompt(text: str, state: SessionState) -> str:
-    existing = {
-        "name": state.name,
-        "reason": state.reason,
-        "preferred_time": state.preferred_time,
-    }
+# Few-shot examples: (known context, patient message, expected JSON)
+_EXAMPLES: Tuple[Tuple[Dict[str, Optional[str]], str, Dict[str, Optional[str]]], ...] = (
+    (
+        {"name": None, "reason": None, "preferred_time": None},
+        "Bonjour, je m'appelle Jean Dupont, j'ai mal aux dents depuis hier."
+        " Mardi prochain le matin ?",
+        {
+            "name": "Jean Dupont",
+            "reason": "douleur dentaire",
+            "preferred_time": "mardi prochain matin",
+        },
+    ),
+    (
+        {"name": None, "reason": None, "preferred_time": None},
+        "Bonjour",
+        {"name": None, "reason": None, "preferred_time": None},
+    ),
+    (
+        {"name": None, "reason": None, "preferred_time": None},
+        "C'est pour un détartrage, plutôt jeudi après-midi",
+        {"name": None, "reason": "détartrage", "preferred_time": "jeudi après-midi"},
+    ),
+    (
+        {"name": None, "reason": "contrôle", "preferred_time": None},
+        "Marie Lambert",
+        {"name": "Marie Lambert", "reason": None, "preferred_time": None},
+    ),
+    (
+        {"name": "Paul Martin", "reason": None, "preferred_time": "demain 14h"},
+        "une dent cassée en mangeant",
+        {"name": None, "reason": "dent cassée", "preferred_time": None},
+    ),
+    (
+        {"name": "Sophie Leroy", "reason": "blanchiment", "preferred_time": None},
+        "n'importe quand la semaine prochaine sauf le lundi",
+        {"name": None, "reason": None, "preferred_time": "semaine prochaine sauf lundi"},
+    ),
+)
+
+
+def _compact_json(value: object) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def _build_static_prefix() -> str:
+    examples = "\n".join(
+        f"Contexte: {_compact_json(ctx)}\nMessage: {msg}\nRéponse: {_compact_json(out)}\n"
+        for ctx, msg, out in _EXAMPLES
+    )
     return (
-        "Tu es un(e) réceptionniste pour une clinique. Analyse le message du patient en FRANÇAIS et "
-        "extrait les champs demandés. Réponds STRICTEMENT en JSON, sans texte autour.\n"
-        "Champs à extraire: name (nom complet), reason (motif), preferred_time (préférence de date/heure en texte libre).\n"
-        "Si un champ n'est pas présent, mets-le à null. N'invente pas.\n"
-        f"Contexte (déjà connu, peut être null): {json.dumps(existing, ensure_ascii=False)}\n"
-        f"Message: {text}\n"
-        "Réponse JSON attendue (exemple): {\"name\":\"Jean Dupont\",\"reason\":\"douleur dentaire\",\"preferred_time\":\"mardi prochain matin\"}"
+        "Tu es un(e) réceptionniste pour une clinique."
+        " Extrait strictement les champs demandés et n'invente rien.\n"
+        "Analyse le message du patient en FRANÇAIS et retourne UNIQUEMENT un objet JSON,"
+        " sans texte autour, avec les clés: name (nom complet), reason (motif de la visite),"
+        " preferred_time (préférence de date/heure en texte libre,"
+        " telle qu'écrite par le patient).\n"
+        "Mets une clé à null si l'information est absente du message."
+        " Le contexte liste ce qui est déjà connu; ne le recopie pas et ne le contredis pas.\n"
+        f"Schéma JSON: {_compact_json(Extraction.model_json_schema())}\n"
+        "\n"
+        f"Exemples:\n{examples}"
     )
 
 
-SYSTEM_INSTRUCTIONS = (
-    "Tu es un(e) réceptionniste pour une clinique."
-    " Extrait strictement les champs demandés et n'invente rien."
-)
+# Byte-stable prefix (instructions, schema, examples) shared by every request, so the
+# provider can cache it; only the dynamic suffix below varies per patient and message.
+STATIC_PREFIX = _build_static_prefix()
 
+# Changes whenever the prompt text changes, so cached extractions are not reused across prompts
+PROMPT_VERSION = hashlib.sha256(STATIC_PREFIX.encode("utf-8")).hexdigest()[:12]
 
-def build_messages(text: str, state: SessionState) -> List[Dict[str, str]]:
-    existing = {
+
+def existing_fields(state: SessionState) -> Dict[str, Optional[str]]:
+    return {
         "name": state.name,
         "reason": state.reason,
         "preferred_time": state.preferred_time,
     }
-    user = (
-        "Analyse le message du patient en FRANÇAIS et retourne UNIQUEMENT un JSON avec"
-        " les clés: name, reason, preferred_time. Mets une clé à null si absente.\n"
-        f"Contexte (peut contenir des null): {json.dumps(existing, ensure_ascii=False)}\n"
-        f"Message: {text}"
-    )
+
+
+def build_dynamic_suffix(text: str, state: SessionState) -> str:
+    return f"Contexte: {_compact_json(existing_fields(state))}\nMessage: {text}"
+
+
+def build_extraction_prompt(text: str, state: SessionState) -> str:
+    return STATIC_PREFIX + "\n" + build_dynamic_suffix(text, state)
+
+
+def build_messages(text: str, state: SessionState) -> List[Dict[str, str]]:
     return [
-        {"role": "system", "content": SYSTEM_INSTRUCTIONS},
-        {"role": "user", "content": user},
+        {"role": "system", "content": STATIC_PREFIX},
+        {"role": "user", "content": build_dynamic_suffix(text, state)},
     ]
 
 
@@ -89,70 +144,9 @@ def compose_followup(state: SessionState) -> str:
     return "Merci. Quelle est votre préférence de date/heure ? (ex.: mardi prochain matin)"
 
 
-def _strip_code_fences(s: str) -> str:
-    t = s.strip()
-    if t.startswith("```"):
-        # Remove ```[lang]? ... ```
-        t = re.sub(r"^```[a-zA-Z0-9]*\n?", "", t)
-        t = re.sub(r"\n?```$", "", t)
-    return t.strip()
-
-
-def _extract_json_object(s: str) -> Optional[str]:
-    # Find the first balanced-looking JSON object by slicing from first "{" to last "}"
-    if "{" in s and "}" in s:
-        start = s.find("{")
-        end = s.rfind("}")
-        if end > start:
-            return s[start : end + 1]
-    # Fallback: try a regex for a JSON object
-    m = re.search(r"\{[\s\S]*\}", s)
-    if m:
-        return m.group(0)
-    return None
-
-
 def try_parse_json(text: str) -> Optional[Dict[str, Optional[str]]]:
-    # 1) Try raw JSON
-    try:
-        data = json.loads(text)
-        if isinstance(data, dict):
-            return {
-                "name": _clean(data.get("name")),
-                "reason": _clean(data.get("reason")),
-                "preferred_time": _clean(data.get("preferred_time")),
-            }
-    except Exception:
-        pass
-
-    # 2) Strip code fences and try again
-    t2 = _strip_code_fences(text)
-    if t2 != text:
-        try:
-            data = json.loads(t2)
-            if isinstance(data, dict):
-                return {
-                    "name": _clean(data.get("name")),
-                    "reason": _clean(data.get("reason")),
-                    "preferred_time": _clean(data.get("preferred_time")),
-                }
-        except Exception:
-            pass
-
-    # 3) Extract JSON substring if present and parse
-    t3 = _extract_json_object(text)
-    if t3:
-        try:
-            data = json.loads(t3)
-            if isinstance(data, dict):
-                return {
-                    "name": _clean(data.get("name")),
-                    "reason": _clean(data.get("reason")),
-                    "preferred_time": _clean(data.get("preferred_time")),
-                }
-        except Exception:
-            return None
-    return None
+    decoded = decode_extraction(text)
+    return decoded.model_dump() if decoded is not None else None
 
 
 def _clean(value: Optional[str]) -> Optional[str]:
@@ -0,0 +1,82 @@
+"""
+Tolerant decoder for the model's JSON answer.
+
+Well-formed output is validated straight into `Extraction` by pydantic's
+native JSON parser. Anything else (code fences, prose around the object,
+trailing commas) is handled by a single scan that locates the first complete
+object, dropping trailing commas as it copies, and validates that.
+"""
+
+from typing import List, Optional
+
+from pydantic import TypeAdapter, ValidationError
+
+from agents.schemas import Extraction
+
+_ADAPTER: TypeAdapter = TypeAdapter(Extraction)
+
+_WHITESPACE = " \t\r\n"
+
+
+def _validate(data: str) -> Optional[Extraction]:
+    try:
+        return _ADAPTER.validate_json(data)
+    except ValidationError:
+        return None
+
+
+def decode_extraction(text: Optional[str]) -> Optional[Extraction]:
+    """Return the first JSON object in `text` that validates as an Extraction."""
+    if not text:
+        return None
+    stripped = text.strip()
+    if stripped[:1] == "{":
+        # Fast path: the model did what it was told
+        found = _validate(stripped)
+        if found is not None:
+            return found
+
+    out: List[str] = []
+    depth = 0
+    in_string = False
+    escape = False
+    pending_comma = False
+    for ch in text:
+        if depth == 0:
+            if ch == "{":
+                depth = 1
+                out = ["{"]
+                pending_comma = False
+            continue
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch in _WHITESPACE:
+            continue
+        if ch == ",":
+            pending_comma = True
+            continue
+        if pending_comma:
+            # A comma directly before a closing bracket is dropped
+            if ch not in "}]":
+                out.append(",")
+            pending_comma = False
+        out.append(ch)
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                found = _validate("".join(out))
+                if found is not None:
+                    return found
+                # Not our object (e.g. braces in prose): keep scanning
+    return None
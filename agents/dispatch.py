@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import zlib
+from collections import deque
+from dataclasses import replace
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.config import Settings
+from connectors.whatsapp.types import NormalizedMessage
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[NormalizedMessage, Settings], Awaitable[None]]
+
+
+async def _default_handler(msg: NormalizedMessage, settings: Settings) -> None:
+    from agents.ingest import handle_inbound_message  # local import to avoid cycle
+
+    await handle_inbound_message(msg, settings)
+
+
+def coalesce(batch: List[NormalizedMessage]) -> NormalizedMessage:
+    """Fold a burst of text messages from one sender into a single message."""
+    if len(batch) == 1:
+        return batch[0]
+    last = batch[-1]
+    return replace(
+        last,
+        text="\n".join(m.text for m in batch if m.text),
+        contact_name=next((m.contact_name for m in reversed(batch) if m.contact_name), None),
+        merged_ids=[mid for m in batch for mid in m.ids()],
+    )
+
+
+class IngestionQueue:
+    """Background worker pool for inbound messages.
+
+    Each worker owns its own queue and messages are sharded on `from_waid`, so
+    every message from a given sender is processed by the same worker, in
+    arrival order, while different senders are processed concurrently.
+
+    With a coalescing window, text messages from one sender arriving within
+    `coalesce_ms` of each other are merged into one (the window restarts on
+    each message but never extends past `coalesce_max_ms` from the first).
+
+    `maxsize` bounds what each worker has accepted but not yet started,
+    buffered messages included, so a burst flushed later always has room.
+    `submit` rejects when it is reached; `put` waits for room instead, in
+    arrival order.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        *,
+        workers: int = 4,
+        maxsize: int = 1000,
+        handler: Optional[Handler] = None,
+        on_done: Optional[Callable[[NormalizedMessage], None]] = None,
+        coalesce_ms: int = 0,
+        coalesce_max_ms: int = 2000,
+    ) -> None:
+        self._settings = settings
+        self._workers = max(1, workers)
+        self._maxsize = max(0, maxsize)
+        self._handler: Handler = handler or _default_handler
+        self._on_done = on_done
+        self._queues: List["asyncio.Queue[Optional[NormalizedMessage]]"] = []
+        # Per worker: messages accepted (queued or buffered) and not yet taken
+        self._load: List[int] = []
+        # Per worker: `put` calls waiting for room, oldest first; a future resolves to
+        # True once a slot is reserved for it, False when the queue stops
+        self._waiters: List[Deque["asyncio.Future[bool]"]] = []
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._running = False
+        self._coalesce_s = max(0, coalesce_ms) / 1000
+        self._coalesce_max_s = max(coalesce_ms, coalesce_max_ms) / 1000
+        self._pending: Dict[str, List[NormalizedMessage]] = {}
+        # waid -> (arrival of the first buffered message, flush timer)
+        self._timers: Dict[str, Tuple[float, asyncio.TimerHandle]] = {}
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.coalesced = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _shard(self, waid: str) -> int:
+        # crc32 is stable across processes, unlike hash() with PYTHONHASHSEED
+        return zlib.crc32(waid.encode("utf-8")) % self._workers
+
+    def start(self) -> None:
+        if self._running:
+            return
+        # Unbounded: `_load` enforces maxsize, so puts never wait and never fail
+        self._queues = [asyncio.Queue() for _ in range(self._workers)]
+        self._load = [0] * self._workers
+        self._waiters = [deque() for _ in range(self._workers)]
+        self._tasks = [
+            asyncio.create_task(self._worker(i, q), name=f"ingest-worker-{i}")
+            for i, q in enumerate(self._queues)
+        ]
+        self._running = True
+        logger.info("ingest_queue_started", extra={"workers": self._workers})
+
+    def submit(self, msg: NormalizedMessage) -> bool:
+        """Enqueue a message without blocking. Returns False if not accepted."""
+        if not self._running:
+            return False
+        waid = msg.from_waid or ""
+        shard = self._shard(waid)
+        if self._no_room(shard):
+            self.rejected += 1
+            logger.warning("ingest_queue_full", extra={"message_id": msg.message_id})
+            return False
+        self._load[shard] += 1
+        self._accept(waid, msg)
+        return True
+
+    async def put(self, msg: NormalizedMessage) -> bool:
+        """Enqueue a message, waiting for room if needed. Returns False if not running."""
+        if not self._running:
+            return False
+        waid = msg.from_waid or ""
+        shard = self._shard(waid)
+        if not self._no_room(shard):
+            self._load[shard] += 1
+            self._accept(waid, msg)
+            return True
+        waiters = self._waiters[shard]
+        fut: "asyncio.Future[bool]" = asyncio.get_running_loop().create_future()
+        waiters.append(fut)
+        try:
+            reserved = await fut
+        except asyncio.CancelledError:
+            waiters.remove(fut)
+            if fut.done() and not fut.cancelled() and fut.result():
+                # Hand the reserved slot to the next in line
+                self._release(shard)
+            raise
+        # Stays in line until here, so later arrivals cannot overtake it
+        waiters.remove(fut)
+        if not reserved:
+            return False
+        if not self._running:
+            self._load[shard] -= 1
+            return False
+        self._accept(waid, msg)
+        return True
+
+    def _no_room(self, shard: int) -> bool:
+        # Anyone already waiting goes first, whatever the count says
+        return bool(self._maxsize) and (
+            self._load[shard] >= self._maxsize or bool(self._waiters[shard])
+        )
+
+    def _release(self, shard: int) -> None:
+        self._load[shard] -= 1
+        for fut in self._waiters[shard]:
+            if self._load[shard] >= self._maxsize:
+                break
+            if not fut.done():
+                self._load[shard] += 1
+                fut.set_result(True)
+
+    def _accept(self, waid: str, msg: NormalizedMessage) -> None:
+        if self._coalesce_s > 0 and msg.type == "text":
+            self._buffer(waid, msg)
+            return
+        # Anything buffered for this sender arrived first
+        self._flush(waid)
+        self._enqueue(waid, msg)
+
+    def _buffer(self, waid: str, msg: NormalizedMessage) -> None:
+        self._pending.setdefault(waid, []).append(msg)
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        first, timer = self._timers.get(waid, (now, None))
+        if timer is not None:
+            timer.cancel()
+        delay = min(self._coalesce_s, max(0.0, first + self._coalesce_max_s - now))
+        self._timers[waid] = (first, loop.call_later(delay, self._flush, waid))
+
+    def _flush(self, waid: str) -> None:
+        entry = self._timers.pop(waid, None)
+        if entry is not None:
+            entry[1].cancel()
+        batch = self._pending.pop(waid, None)
+        if not batch:
+            return
+        if len(batch) > 1:
+            self.coalesced += len(batch) - 1
+            # The burst now takes a single slot
+            self._load[self._shard(waid)] -= len(batch) - 1
+            logger.info("ingest_coalesced", extra={"from": waid, "messages": len(batch)})
+        self._enqueue(waid, coalesce(batch))
+
+    def _enqueue(self, waid: str, msg: NormalizedMessage) -> None:
+        # Room was reserved in `_load` when the message was accepted
+        self._queues[self._shard(waid)].put_nowait(msg)
+
+    async def _worker(self, index: int, q: "asyncio.Queue[Optional[NormalizedMessage]]") -> None:
+        while True:
+            msg = await q.get()
+            cancelled = False
+            try:
+                if msg is None:
+                    return
+                self._release(index)
+                await self._handler(msg, self._settings)
+                self.processed += 1
+            except asyncio.CancelledError:
+                # Cut short at the drain timeout: not done, so the journal replays it
+                cancelled = True
+                raise
+            except Exception as exc:  # noqa: BLE001
+                self.failed += 1
+                logger.exception("agent ingestion failed: %s", exc)
+            finally:
+                if msg is not None and not cancelled and self._on_done is not None:
+                    # Failed messages count as done too, so they are not replayed forever
+                    try:
+                        self._on_done(msg)
+                    except Exception as exc:  # noqa: BLE001
+                        logger.warning("ingest_on_done_failed", extra={"error": str(exc)})
+                q.task_done()
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting messages and drain queued work, up to `timeout` seconds."""
+        if not self._running:
+            return
+        self._running = False
+        for waiters in self._waiters:
+            for fut in waiters:
+                if not fut.done():
+                    fut.set_result(False)
+        for waid in list(self._pending):
+            self._flush(waid)
+        for q in self._queues:
+            # Sentinel goes behind pending messages so they are drained first
+            q.put_nowait(None)
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(
+                "ingest_queue_drain_timeout",
+                extra={"abandoned": sum(q.qsize() for q in self._queues)},
+            )
+        self._tasks = []
+        self._queues = []
+        self._load = []
+        logger.info("ingest_queue_stopped", extra=self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "workers": self._workers,
+            "queued": sum(q.qsize() for q in self._queues),
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "buffered": sum(len(b) for b in self._pending.values()),
+        }
+
+
+def from_settings(
+    settings: Settings,
+    handler: Optional[Handler] = None,
+    on_done: Optional[Callable[[NormalizedMessage], None]] = None,
+) -> IngestionQueue:
+    return IngestionQueue(
+        settings,
+        workers=settings.ingest_workers,
+        maxsize=settings.ingest_queue_size,
+        handler=handler,
+        on_done=on_done,
+        coalesce_ms=settings.ingest_coalesce_ms,
+        coalesce_max_ms=settings.ingest_coalesce_max_ms,
+    )
@@ -1,29 +1,587 @@
+import asyncio
 import logging
-from typing import Optional
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from app.config import Settings, load_settings
-from connectors.whatsapp.types import NormalizedMessage
-from agents.client import create_agents_client
-from agents.session import store as session_store
+from agents.breaker import breakers
+from agents.cache import ExtractionCache, extraction_cache
+from agents.capabilities import (
+    OPTIONAL_PARAMS,
+    STRICT_OUTPUT,
+    unsupported_param,
+    unsupported_strict_output,
+)
+from agents.capabilities import registry as capability_registry
+from agents.client import get_agents_client
 from agents.conversation import (
+    FIELDS,
+    PROMPT_VERSION,
     build_messages,
-    try_parse_json,
-    merge_extracted,
     compose_followup,
+    compute_missing,
+    existing_fields,
+    merge_extracted,
 )
-from connectors.whatsapp.client import from_settings as whatsapp_from_settings
+from agents.datetime_fr import format_fr_human, parse_preferred_time_fr
+from agents.decoder import decode_extraction
+from agents.locks import conversation_locks
+from agents.routing import escalation_reason, model_tiers, routing_stats
+from agents.rules import RuleExtraction, pre_extract
 from agents.schemas import Extraction
-from agents.datetime_fr import parse_preferred_time_fr, format_fr_human
+from agents.session import SessionState
+from agents.session import store as session_store
+from agents.streaming import collect_stream
+from agents.usage import TokenUsage, usage_from_response
+from agents.usage import tracker as usage_tracker
+from app.config import Settings
 from connectors.calendar.provider import get_calendar_provider
+from connectors.whatsapp.client import from_settings as whatsapp_from_settings
+from connectors.whatsapp.types import NormalizedMessage
 
 logger = logging.getLogger(__name__)
 
 
+# Values sent for optional parameters, when the model is known (or assumed) to accept them
+_OPTIONAL_PARAM_VALUES: Dict[str, Any] = {
+    "response_format": {"type": "json_object"},
+    "temperature": 0.2,
+    "max_output_tokens": 200,
+}
+
+# Local guesses accepted when the model is unavailable (a bare clock time is enough)
+_DEGRADED_MIN_CONFIDENCE = 0.6
+
+# A rule-guessed time worth a speculative calendar lookup (at least the day is known)
+_SPECULATION_MIN_CONFIDENCE = 0.85
+
+_DEFAULT_DURATION_MIN = 30
+
+# Waits for a conversation's lock at least this long are logged
+_LOCK_WAIT_LOG_S = 0.1
+
+# (available, alternatives when not available)
+_Availability = Tuple[bool, List[datetime]]
+
+
+def _lookup_availability(provider: Any, start: datetime, duration_min: int) -> _Availability:
+    if provider.is_available(start, duration_min=duration_min):
+        return True, []
+    return False, provider.suggest_alternatives(start, duration_min=duration_min, count=2)
+
+
+async def _prefetch_availability(
+    settings: Settings, iso: str, duration_min: int
+) -> Optional[_Availability]:
+    """Calendar lookup run alongside the model call; never raises."""
+
+    def run() -> Optional[_Availability]:
+        provider = get_calendar_provider(settings)
+        if provider is None:
+            return None
+        return _lookup_availability(provider, datetime.fromisoformat(iso), duration_min)
+
+    try:
+        # Providers are blocking; a thread lets the lookup overlap the model's network wait
+        return await asyncio.to_thread(run)
+    except Exception as exc:  # noqa: BLE001
+        logger.info("calendar_speculation_failed", extra={"error": str(exc)})
+        return None
+
+
+def _speculate(
+    tg: asyncio.TaskGroup, settings: Settings, state: SessionState, rules: RuleExtraction
+) -> Optional[Tuple[str, "asyncio.Task[Optional[_Availability]]"]]:
+    """Start a lookup for the time already in the session, or the one the rules see in the
+    message.
+    """
+    if not settings.calendar_speculation:
+        return None
+    iso = state.preferred_time_iso
+    guess = rules.preferred_time
+    confident = guess.confidence >= _SPECULATION_MIN_CONFIDENCE
+    if not iso and not state.preferred_time and guess.value and confident:
+        try:
+            iso = parse_preferred_time_fr(guess.value).iso
+        except Exception:  # noqa: BLE001
+            iso = None
+    if not iso:
+        return None
+    return iso, tg.create_task(_prefetch_availability(settings, iso, _DEFAULT_DURATION_MIN))
+
+
+async def _claim_speculation(
+    speculation: Tuple[str, "asyncio.Task[Optional[_Availability]]"], state: SessionState
+) -> Optional[_Availability]:
+    """Use the prefetched lookup if this turn books the same time; cancel it otherwise."""
+    iso, task = speculation
+    if iso != state.preferred_time_iso or compute_missing(state):
+        task.cancel()
+        logger.info("calendar_speculation", extra={"outcome": "dropped"})
+        return None
+    result = await task
+    outcome = "used" if result is not None else "failed"
+    logger.info("calendar_speculation", extra={"outcome": outcome})
+    return result
+
+
+def _book_choice(settings: Settings, state: SessionState, iso: str) -> Optional[str]:
+    """Book one of the proposed alternatives; blocking, run in a thread. Returns the reply."""
+    try:
+        provider = get_calendar_provider(settings)
+        if provider is None:
+            logger.info("calendar_unconfigured", extra={"reason": "no_provider"})
+            return None
+        start_dt = datetime.fromisoformat(iso)
+        dur = state.pending_duration_min or 30
+        if not provider.is_available(start_dt, duration_min=dur):
+            return (
+                "Désolé, ce créneau vient d'être indisponible."
+                " Pouvez-vous proposer une autre préférence ?"
+            )
+        evt = provider.create_event(
+            start_dt,
+            duration_min=dur,
+            title=f"Consultation — {state.name or ''}",
+            description=f"Motif: {state.reason or ''}",
+            patient_phone=state.from_waid,
+            patient_name=state.name,
+        )
+        state.event_id = evt.id
+        state.preferred_time_iso = iso
+        state.pending_alternatives = None
+        state.pending_duration_min = None
+        session_store.put(state)
+        return (
+            "✅ Réservé.\n"
+            f"Date: {format_fr_human(iso)}\n"
+            f"Nom: {state.name}\n"
+            f"Raison: {state.reason}\n"
+            "Vous recevrez un rappel avant le rendez-vous."
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("booking_selection_failed: %s", exc)
+        return "Une erreur est survenue. Merci de proposer une autre préférence."
+
+
+def _book(
+    settings: Settings, state: SessionState, lookup: Optional[_Availability]
+) -> Optional[str]:
+    """Book the requested time, or store alternatives; blocking, run in a thread.
+
+    Returns the reply, or None to keep the follow-up.
+    """
+    try:
+        provider = get_calendar_provider(settings)
+        if provider is None:
+            logger.info("calendar_unconfigured", extra={"reason": "no_provider"})
+            return None
+        # 30-min slot by default
+        start_dt = datetime.fromisoformat(state.preferred_time_iso or "")
+        duration = _DEFAULT_DURATION_MIN
+        # Always re-checked: the prefetched answer is as old as the model call, and
+        # another conversation may have taken the slot since
+        if provider.is_available(start_dt, duration_min=duration):
+            evt = provider.create_event(
+                start_dt,
+                duration_min=duration,
+                title=f"Consultation — {state.name or ''}",
+                description=f"Motif: {state.reason or ''}",
+                patient_phone=state.from_waid,
+                patient_name=state.name,
+            )
+            state.event_id = evt.id
+            return (
+                "✅ Réservé.\n"
+                f"Date: {format_fr_human(state.preferred_time_iso or '')}\n"
+                f"Nom: {state.name}\n"
+                f"Raison: {state.reason}\n"
+                "Vous recevrez un rappel avant le rendez-vous."
+            )
+        if lookup is not None and not lookup[0]:
+            alts = lookup[1]
+        else:
+            alts = provider.suggest_alternatives(start_dt, duration_min=duration, count=2)
+        if not alts:
+            return (
+                "Désolé, nous ne trouvons pas de créneau proche disponible."
+                " Pouvez-vous proposer une autre préférence ?"
+            )
+        # Offer up to two alternatives
+        opts = [dt.isoformat() for dt in alts]
+        parts = [f"{i+1}) {format_fr_human(o)}" for i, o in enumerate(opts)]
+        state.pending_alternatives = opts
+        state.pending_duration_min = duration
+        session_store.put(state)
+        return (
+            "Désolé, ce créneau n'est pas disponible.\n"
+            + "Propositions:\n"
+            + "\n".join(parts)
+            + "\nRépondez 1 ou 2 pour choisir."
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("booking_flow_failed: %s", exc)
+        return None
+
+
+async def _calendar_stage(
+    settings: Settings, msg: NormalizedMessage, step: Callable[..., Optional[str]], *args: Any
+) -> Tuple[Optional[str], Optional["asyncio.Task[Optional[str]]"]]:
+    """Run a blocking calendar step in a thread, within `calendar_deadline_s`.
+
+    Returns (reply, None) in time. Past the deadline returns (None, task): a
+    thread cannot be stopped and the booking may still go through, so the
+    caller answers now and sends the task's reply once it lands.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(step, settings, *args))
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), settings.calendar_deadline_s), None
+    except asyncio.TimeoutError:
+        logger.warning(
+            "calendar_deadline_exceeded",
+            extra={"from": msg.from_waid, "deadline_s": settings.calendar_deadline_s},
+        )
+        return None, task
+
+
+async def _send_reply(settings: Settings, msg: NormalizedMessage, body: str) -> None:
+    """Auto-reply via WhatsApp, when enabled, within `whatsapp_send_deadline_s`."""
+    if not settings.agent_auto_reply:
+        return
+    try:
+        wa_client = whatsapp_from_settings(settings)
+        if wa_client is None:
+            logger.info("auto_reply_skipped", extra={"reason": "whatsapp_client_unconfigured"})
+            return
+        result = await asyncio.wait_for(
+            wa_client.send_text(to=msg.from_waid, body=body, dry_run=settings.agent_dry_run),
+            settings.whatsapp_send_deadline_s,
+        )
+        logger.info(
+            "auto_reply",
+            extra={"to": msg.from_waid, "dry_run": settings.agent_dry_run, "result": str(result)},
+        )
+    except asyncio.TimeoutError:
+        logger.warning(
+            "auto_reply_deadline_exceeded",
+            extra={"to": msg.from_waid, "deadline_s": settings.whatsapp_send_deadline_s},
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("auto-reply failed: %s", exc)
+
+
+async def _send_late(
+    settings: Settings, msg: NormalizedMessage, task: "asyncio.Task[Optional[str]]"
+) -> None:
+    """Send the outcome of a calendar step that finished past its deadline."""
+    reply = await task
+    logger.info("calendar_late_reply", extra={"from": msg.from_waid, "sent": reply is not None})
+    if reply is not None:
+        await _send_reply(settings, msg, reply)
+
+
+class _StrictOutputUnsupported(Exception):
+    """The model or SDK cannot do strict structured outputs; use free-form JSON."""
+
+
+def _record_usage(
+    settings: Settings, usage: Optional[TokenUsage], metadata: Optional[Dict[str, str]]
+) -> None:
+    if usage is None:
+        return
+    usage_tracker.record((metadata or {}).get("from"), usage, settings.agent_model)
+    logger.info(
+        "agent_usage",
+        extra={
+            "model": settings.agent_model,
+            "prompt_version": PROMPT_VERSION,
+            "input_tokens": usage.input_tokens,
+            "cached_tokens": usage.cached_tokens,
+            "output_tokens": usage.output_tokens,
+        },
+    )
+
+
+def _strict_enabled(settings: Settings) -> bool:
+    models = settings.agent_strict_models
+    if "*" not in models and settings.agent_model not in models:
+        return False
+    return capability_registry.supports(
+        settings.agent_model, settings.openai_base_url, STRICT_OUTPUT
+    )
+
+
+async def _parse_response(
+    client: Any,
+    settings: Settings,
+    messages: Any,
+    *,
+    metadata: Optional[Dict[str, str]] = None,
+) -> Optional[Extraction]:
+    """Ask for the `Extraction` schema as a strict structured output and get it back typed."""
+    model = settings.agent_model
+    base_url = settings.openai_base_url
+    kwargs: Dict[str, Any] = {
+        "model": model,
+        "input": messages,
+        "text_format": Extraction,
+        "timeout": settings.openai_timeout_s,
+    }
+    if metadata:
+        kwargs["metadata"] = metadata
+    for param in ("temperature", "max_output_tokens"):
+        if capability_registry.supports(model, base_url, param):
+            kwargs[param] = _OPTIONAL_PARAM_VALUES[param]
+    try:
+        resp = await client.responses.parse(**kwargs)
+    except Exception as exc:  # noqa: BLE001
+        if unsupported_strict_output(exc):
+            capability_registry.record(model, base_url, STRICT_OUTPUT, False)
+            raise _StrictOutputUnsupported(str(exc)) from exc
+        raise
+    capability_registry.record(model, base_url, STRICT_OUTPUT, True)
+    _record_usage(settings, usage_from_response(resp), metadata)
+    return getattr(resp, "output_parsed", None)
+
+
+async def _create_response(
+    client: Any,
+    settings: Settings,
+    messages: Any,
+    *,
+    metadata: Optional[Dict[str, str]] = None,
+    stream_until: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Optional[str]:
+    """Call the model, dropping optional parameters it is known to reject.
+
+    A parameter rejected once is recorded in the capability registry, so later
+    messages skip it instead of paying for another failed round-trip.
+    With `stream_until` (and AGENT_STREAMING on) the response is streamed and
+    reading stops as soon as the predicate holds for the fields decoded so far.
+    """
+    stream = bool(settings.agent_streaming and stream_until is not None)
+    model = settings.agent_model
+    base_url = settings.openai_base_url
+    for _ in range(len(OPTIONAL_PARAMS) + 1):
+        kwargs: Dict[str, Any] = {
+            "model": model,
+            "input": messages,
+            "timeout": settings.openai_timeout_s,
+        }
+        if metadata:
+            kwargs["metadata"] = metadata
+        if stream:
+            kwargs["stream"] = True
+        for param in OPTIONAL_PARAMS:
+            if capability_registry.supports(model, base_url, param):
+                kwargs[param] = _OPTIONAL_PARAM_VALUES[param]
+        try:
+            resp = await client.responses.create(**kwargs)
+            if stream:
+                text, usage = await collect_stream(resp, stream_until)  # type: ignore[arg-type]
+        except Exception as exc:  # noqa: BLE001
+            param = unsupported_param(exc, kwargs)
+            if param is None:
+                logger.exception("agent model call failed: %s", exc)
+                return None
+            capability_registry.record(model, base_url, param, False)
+            logger.info("agent_call_retry", extra={"reason": f"no_{param}"})
+            continue
+        for param in OPTIONAL_PARAMS:
+            if param in kwargs:
+                capability_registry.record(model, base_url, param, True)
+        if not stream:
+            text = getattr(resp, "output_text", None) or str(resp)
+            usage = usage_from_response(resp)
+        _record_usage(settings, usage, metadata)
+        return text
+    return None
+
+
+async def _call_model(
+    client: Any,
+    settings: Settings,
+    messages: Any,
+    *,
+    metadata: Optional[Dict[str, str]] = None,
+    missing: Tuple[str, ...] = FIELDS,
+) -> Tuple[bool, Optional[Extraction]]:
+    """One extraction round-trip: strict schema output when enabled for the model, free-form
+    JSON otherwise.
+
+    Returns `(answered, extraction)`; `answered` is False when the call itself failed.
+    """
+    if _strict_enabled(settings):
+        try:
+            return True, await _parse_response(client, settings, messages, metadata=metadata)
+        except _StrictOutputUnsupported:
+            logger.info("agent_strict_fallback", extra={"model": settings.agent_model})
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("agent strict call failed: %s", exc)
+            return False, None
+    text_out = await _create_response(
+        client,
+        settings,
+        messages,
+        metadata=metadata,
+        # When streaming, stop reading once every field the session still lacks has arrived
+        stream_until=lambda fields: all(f in fields for f in missing),
+    )
+    if text_out is None:
+        return False, None
+    return True, decode_extraction(text_out)
+
+
+async def probe_model_capabilities(settings: Settings) -> Dict[str, Dict[str, bool]]:
+    """Send one tiny request at startup so the first patient never pays for discovery."""
+    client = get_agents_client(settings)
+    if client is not None:
+        await _create_response(client, settings, "Réponds uniquement: {\"ok\": true}")
+    return capability_registry.snapshot()
+
+
+async def _call_tier(
+    client: Any,
+    settings: Settings,
+    messages: Any,
+    *,
+    metadata: Dict[str, str],
+    missing: Tuple[str, ...],
+    timeout: float,
+) -> Tuple[bool, Optional[Extraction]]:
+    """Call one model within the remaining latency budget, unless its breaker is open."""
+    model = settings.agent_model
+    if timeout <= 0:
+        logger.warning(
+            "agent_deadline_exceeded",
+            extra={"model": model, "deadline_s": settings.agent_deadline_s},
+        )
+        return False, None
+    breaker = breakers.get(model)
+    if not breaker.allow():
+        logger.warning("agent_breaker_open", extra={"model": model})
+        return False, None
+    answered, decoded = False, None
+    try:
+        answered, decoded = await asyncio.wait_for(
+            _call_model(client, settings, messages, metadata=metadata, missing=missing),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        logger.warning(
+            "agent_deadline_exceeded",
+            extra={"model": model, "deadline_s": settings.agent_deadline_s},
+        )
+    finally:
+        # Failures, timeouts and cancellations all count against the breaker
+        if answered:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+    return answered, decoded
+
+
+async def _extract_with_model(
+    client: Any,
+    settings: Settings,
+    msg: NormalizedMessage,
+    state: SessionState,
+    signals: Optional[RuleExtraction] = None,
+) -> Optional[Dict[str, Optional[str]]]:
+    """Extract fields with the model tiers, memoised on message, known fields, models and
+    prompt version.
+
+    Tiers are tried cheapest first and share one latency budget; `signals`
+    (local rule guesses) tell when a tier left a visible field empty.
+    Returns None when no tier answered: breakers open, deadline exceeded or calls failed.
+    """
+    text = msg.text or ""
+    tiers = model_tiers(settings)
+    cache_key = ExtractionCache.make_key(
+        text, existing_fields(state), ",".join(tiers), PROMPT_VERSION
+    )
+    cached = extraction_cache.get(cache_key)
+    if cached is not None:
+        logger.info("agent_cache_hit", extra={"from": msg.from_waid})
+        return cached
+
+    # Retrieve session and build prompt/messages
+    messages = build_messages(text, state)
+    missing = tuple(compute_missing(state)) or FIELDS
+    metadata = {"source": "whatsapp", "from": msg.from_waid}
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.agent_deadline_s
+    answered_any = False
+    best: Optional[Extraction] = None
+    accepted = False
+    for i, model in enumerate(tiers):
+        tier_settings = (
+            settings if model == settings.agent_model else replace(settings, agent_model=model)
+        )
+        started = loop.time()
+        answered, decoded = await _call_tier(
+            client,
+            tier_settings,
+            messages,
+            metadata=metadata,
+            missing=missing,
+            timeout=deadline - started,
+        )
+        if not answered:
+            reason: Optional[str] = "unavailable"
+        elif decoded is None:
+            reason = "invalid"
+        else:
+            reason = escalation_reason(
+                decoded,
+                state,
+                missing,
+                signals,
+                min_rule_confidence=settings.agent_routing_min_rule_confidence,
+            )
+        answered_any = answered_any or answered
+        if decoded is not None:
+            best = decoded
+        last = i == len(tiers) - 1
+        routing_stats.record(model, loop.time() - started, escalated_for=None if last else reason)
+        if reason is None or (last and decoded is not None):
+            accepted = True
+            break
+        if not last:
+            logger.info(
+                "agent_escalate",
+                extra={"model": model, "next_model": tiers[i + 1], "reason": reason},
+            )
+
+    if not answered_any:
+        return None
+    if best is None:
+        return {}
+    extracted = best.model_dump()
+    # Only well-formed, accepted answers are worth replaying
+    if accepted:
+        extraction_cache.put(cache_key, extracted)
+    return extracted
+
+
 async def handle_inbound_message(msg: NormalizedMessage, settings: Settings) -> None:
-    """Stub integration point that will later call the Agents SDK.
+    """Process one inbound message, one at a time per conversation.
 
-    For Phase 2, we only log and no-op to keep webhook latency minimal.
+    The session state is shared and mutated in place, so two messages from the
+    same sender (inline fallback, journal replay, several workers) must never
+    run the pipeline concurrently.
     """
+    async with conversation_locks.hold(msg.from_waid or "") as waited:
+        if waited >= _LOCK_WAIT_LOG_S:
+            logger.info(
+                "conversation_lock_wait",
+                extra={"from": msg.from_waid, "wait_ms": round(waited * 1000, 1)},
+            )
+        await _handle_inbound_message(msg, settings)
+
+
+async def _handle_inbound_message(msg: NormalizedMessage, settings: Settings) -> None:
     logger.info(
         "agent_ingest",
         extra={
@@ -38,7 +596,7 @@ async def handle_inbound_message(msg: NormalizedMessage, settings: Settings) ->
         return
 
     # Retrieve session state early to support alternative selection without OpenAI
-    state = session_store.get(msg.from_waid)
+    state = await session_store.aget(msg.from_waid)
 
     # Handle selection of proposed alternatives (reply "1" or "2")
     text_in = (msg.text or "").strip().lower()
@@ -49,129 +607,60 @@ async def handle_inbound_message(msg: NormalizedMessage, settings: Settings) ->
         elif text_in.startswith("2"):
             choice = 1
         if choice is not None and 0 <= choice < len(state.pending_alternatives):
-            try:
-                provider = get_calendar_provider(settings)
-                if provider is None:
-                    logger.info("calendar_unconfigured", extra={"reason": "no_provider"})
-                    return
-                from datetime import datetime
-
-                iso = state.pending_alternatives[choice]
-                start_dt = datetime.fromisoformat(iso)
-                dur = state.pending_duration_min or 30
-                if provider.is_available(start_dt, duration_min=dur):
-                    evt = provider.create_event(
-                        start_dt,
-                        duration_min=dur,
-                        title=f"Consultation — {state.name or ''}",
-                        description=f"Motif: {state.reason or ''}",
-                        patient_phone=state.from_waid,
-                        patient_name=state.name,
-                    )
-                    state.event_id = evt.id
-                    state.preferred_time_iso = iso
-                    state.pending_alternatives = None
-                    state.pending_duration_min = None
-                    session_store.put(state)
-                    reply = (
-                        "✅ Réservé.\n"
-                        f"Date: {format_fr_human(iso)}\n"
-                        f"Nom: {state.name}\n"
-                        f"Raison: {state.reason}\n"
-                        "Vous recevrez un rappel avant le rendez-vous."
-                    )
-                else:
-                    reply = (
-                        "Désolé, ce créneau vient d'être indisponible."
-                        " Pouvez-vous proposer une autre préférence ?"
-                    )
-            except Exception as exc:  # noqa: BLE001
-                logger.exception("booking_selection_failed: %s", exc)
-                reply = "Une erreur est survenue. Merci de proposer une autre préférence."
-
-            # Optionally auto-reply via WhatsApp for selection flow
-            if settings.agent_auto_reply:
-                try:
-                    wa_client = whatsapp_from_settings(settings)
-                    if wa_client is None:
-                        logger.info("auto_reply_skipped", extra={"reason": "whatsapp_client_unconfigured"})
-                        return
-                    result = await wa_client.send_text(to=msg.from_waid, body=reply, dry_run=settings.agent_dry_run)
-                    logger.info("auto_reply", extra={"to": msg.from_waid, "dry_run": settings.agent_dry_run, "result": str(result)})
-                except Exception as exc:  # noqa: BLE001
-                    logger.exception("auto-reply failed: %s", exc)
+            iso = state.pending_alternatives[choice]
+            reply, late = await _calendar_stage(settings, msg, _book_choice, state, iso)
+            if late is not None:
+                # Too slow to wait for: say so now, send the outcome once it lands
+                reply = compose_followup(state)
+            if reply is not None:
+                await _send_reply(settings, msg, reply)
+            if late is not None:
+                await _send_late(settings, msg, late)
             return
 
-    client = create_agents_client(settings)
+    client = get_agents_client(settings)
     if client is None:
         # Agents not configured; only log
         return
 
-    # Retrieve session and build prompt/messages
-    # state already retrieved above
-    messages = build_messages(msg.text, state)
-
-    # Call the model
-    # Robust parameter fallback loop for model/SDK differences
-    use_response_format = True
-    use_temperature = True
-    use_max_tokens = True
-    text_out: Optional[str] = None
-    for _ in range(4):
-        try:
-            kwargs: Dict[str, Any] = {
-                "model": settings.agent_model,
-                "input": messages,
-                "metadata": {"source": "whatsapp", "from": msg.from_waid},
-            }
-            if use_response_format:
-                kwargs["response_format"] = {"type": "json_object"}
-            if use_temperature:
-                kwargs["temperature"] = 0.2
-            if use_max_tokens:
-                kwargs["max_output_tokens"] = 200
-            resp = client.responses.create(**kwargs)
-            text_out = getattr(resp, "output_text", None) or str(resp)
-            break
-        except TypeError as te:
-            # Older SDKs: drop response_format
-            if "response_format" in str(te) and use_response_format:
-                use_response_format = False
-                logger.info("agent_call_retry", extra={"reason": "no_response_format"})
-                continue
-            logger.exception("agent model call failed: %s", te)
-            return
-        except Exception as exc:  # noqa: BLE001
-            msg_exc = str(exc)
-            if "Unsupported parameter" in msg_exc and "temperature" in msg_exc and use_temperature:
-                use_temperature = False
-                logger.info("agent_call_retry", extra={"reason": "no_temperature"})
-                continue
-            if "Unsupported parameter" in msg_exc and "max_output_tokens" in msg_exc and use_max_tokens:
-                use_max_tokens = False
-                logger.info("agent_call_retry", extra={"reason": "no_max_tokens"})
-                continue
-            logger.exception("agent model call failed: %s", exc)
-            return
-    if text_out is None:
-        return
-
-    # Parse and merge extraction
-    extracted_dict = try_parse_json(text_out) or {}
-    try:
-        extracted_model = Extraction.model_validate(extracted_dict)
-        extracted = extracted_model.model_dump()
-    except Exception:
-        extracted = extracted_dict
-    state = merge_extracted(state, extracted)
-    # Normalize preferred_time if present
-    if state.preferred_time and not state.preferred_time_iso:
-        try:
-            parsed = parse_preferred_time_fr(state.preferred_time)
-            state.preferred_time_iso = parsed.iso
-        except Exception as exc:  # noqa: BLE001
-            logger.warning("preferred_time_parse_failed", extra={"error": str(exc)})
-    session_store.put(state)
+    # Cheap local extraction first: skip the model when it fills every missing field
+    extracted: Dict[str, Optional[str]] = {}
+    missing_before = compute_missing(state)
+    rules = pre_extract(msg.text, state) if settings.agent_rules_enabled else None
+    lookup: Optional[_Availability] = None
+    async with asyncio.TaskGroup() as tg:
+        speculation: Optional[Tuple[str, "asyncio.Task[Optional[_Availability]]"]] = None
+        if rules is not None and rules.covers(missing_before, settings.agent_rules_min_confidence):
+            extracted = rules.as_dict(settings.agent_rules_min_confidence)
+            logger.info("agent_rules_hit", extra={"fields": missing_before})
+        else:
+            # Rule guesses also tell the router when a cheap model missed something
+            rules = rules or pre_extract(msg.text, state)
+            # Look the likely slot up while the model is thinking
+            speculation = _speculate(tg, settings, state, rules)
+            model_extracted = await _extract_with_model(client, settings, msg, state, rules)
+            if model_extracted is None:
+                # Degraded mode: answer from local parsing rather than leaving the patient hanging
+                model_extracted = rules.as_dict(_DEGRADED_MIN_CONFIDENCE)
+                logger.warning(
+                    "agent_degraded",
+                    extra={
+                        "from": msg.from_waid,
+                        "fields": [f for f, v in model_extracted.items() if v],
+                    },
+                )
+            extracted = model_extracted
+        state = merge_extracted(state, extracted)
+        # Normalize preferred_time if present
+        if state.preferred_time and not state.preferred_time_iso:
+            try:
+                parsed = parse_preferred_time_fr(state.preferred_time)
+                state.preferred_time_iso = parsed.iso
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("preferred_time_parse_failed", extra={"error": str(exc)})
+        session_store.put(state)
+        if speculation is not None:
+            lookup = await _claim_speculation(speculation, state)
 
     # Compose follow-up by default
     reply = compose_followup(state)
@@ -185,67 +674,12 @@ async def handle_inbound_message(msg: NormalizedMessage, settings: Settings) ->
     if not state.preferred_time:
         missing.append("preferred_time")
 
+    late = None
     if not missing and state.preferred_time_iso:
-        try:
-            provider = get_calendar_provider(settings)
-            if provider is None:
-                logger.info("calendar_unconfigured", extra={"reason": "no_provider"})
-            else:
-                # 30-min slot by default
-                from datetime import datetime
-
-                start_dt = datetime.fromisoformat(state.preferred_time_iso)
-                duration = 30
-                if provider.is_available(start_dt, duration_min=duration):
-                    evt = provider.create_event(
-                        start_dt,
-                        duration_min=duration,
-                        title=f"Consultation — {state.name or ''}",
-                        description=f"Motif: {state.reason or ''}",
-                        patient_phone=state.from_waid,
-                        patient_name=state.name,
-                    )
-                    state.event_id = evt.id
-                    reply = (
-                        "✅ Réservé.\n"
-                        f"Date: {format_fr_human(state.preferred_time_iso)}\n"
-                        f"Nom: {state.name}\n"
-                        f"Raison: {state.reason}\n"
-                        "Vous recevrez un rappel avant le rendez-vous."
-                    )
-                else:
-                    alts = provider.suggest_alternatives(start_dt, duration_min=duration, count=2)
-                    if alts:
-                        # Offer up to two alternatives
-                        from datetime import timezone
-
-                        opts = [dt.isoformat() for dt in alts]
-                        parts = [f"{i+1}) {format_fr_human(o)}" for i, o in enumerate(opts)]
-                        reply = (
-                            "Désolé, ce créneau n'est pas disponible.\n"
-                            + "Propositions:\n"
-                            + "\n".join(parts)
-                            + "\nRépondez 1 ou 2 pour choisir."
-                        )
-                        state.pending_alternatives = opts
-                        state.pending_duration_min = duration
-                        session_store.put(state)
-                    else:
-                        reply = (
-                            "Désolé, nous ne trouvons pas de créneau proche disponible."
-                            " Pouvez-vous proposer une autre préférence ?"
-                        )
-        except Exception as exc:  # noqa: BLE001
-            logger.exception("booking_flow_failed: %s", exc)
+        booked, late = await _calendar_stage(settings, msg, _book, state, lookup)
+        reply = booked or reply
 
     # Optionally auto-reply via WhatsApp
-    if settings.agent_auto_reply:
-        try:
-            wa_client = whatsapp_from_settings(settings)
-            if wa_client is None:
-                logger.info("auto_reply_skipped", extra={"reason": "whatsapp_client_unconfigured"})
-                return
-            result = await wa_client.send_text(to=msg.from_waid, body=reply, dry_run=settings.agent_dry_run)
-            logger.info("auto_reply", extra={"to": msg.from_waid, "dry_run": settings.agent_dry_run, "result": str(result)})
-        except Exception as exc:  # noqa: BLE001
-            logger.exception("auto-reply failed: %s", exc)
+    await _send_reply(settings, msg, reply)
+    if late is not None:
+        await _send_late(settings, msg, late)
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict
+
+
+@dataclass
+class _Entry:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Holder plus waiters; the entry is dropped when it falls to zero
+    users: int = 0
+
+
+class ConversationLocks:
+    """One asyncio.Lock per conversation key, created on demand.
+
+    A lock is evicted as soon as nobody holds or waits for it, so the registry
+    only ever contains conversations with a message in flight.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, _Entry] = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[float]:
+        """Hold the lock for `key`; yields the time spent waiting for it, in seconds."""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+        entry.users += 1
+        started = time.perf_counter()
+        try:
+            if entry.lock.locked():
+                self.contended += 1
+            await entry.lock.acquire()
+        except BaseException:
+            self._release_entry(key, entry)
+            raise
+        waited = time.perf_counter() - started
+        self.acquisitions += 1
+        self.wait_total_s += waited
+        self.wait_max_s = max(self.wait_max_s, waited)
+        try:
+            yield waited
+        finally:
+            entry.lock.release()
+            self._release_entry(key, entry)
+
+    def _release_entry(self, key: str, entry: _Entry) -> None:
+        entry.users -= 1
+        if entry.users == 0 and self._entries.get(key) is entry:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self._entries),
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "wait_avg_ms": (
+                round(self.wait_total_s / self.acquisitions * 1000, 3) if self.acquisitions else 0.0
+            ),
+            "wait_max_ms": round(self.wait_max_s * 1000, 3),
+        }
+
+
+conversation_locks = ConversationLocks()
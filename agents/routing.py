@@ -0,0 +1,112 @@
+"""
+Tiered model routing.
+
+Models are tried cheapest first; a tier's answer is accepted unless it is
+missing, fails validation, leaves empty a field the local rules can see in
+the message, or contradicts what the session already knows.
+"""
+
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from agents.cache import normalize_text
+from agents.conversation import FIELDS
+from agents.rules import RuleExtraction
+from agents.schemas import Extraction
+from agents.session import SessionState
+from app.config import Settings
+
+
+def model_tiers(settings: Settings) -> Tuple[str, ...]:
+    return settings.agent_model_tiers or (settings.agent_model,)
+
+
+def _same(a: str, b: str) -> bool:
+    a, b = normalize_text(a), normalize_text(b)
+    # Rewordings like "mardi 10h" / "mardi à 10h" are not contradictions
+    return a in b or b in a
+
+
+def escalation_reason(
+    extraction: Extraction,
+    state: SessionState,
+    missing: Iterable[str],
+    signals: Optional[RuleExtraction] = None,
+    *,
+    min_rule_confidence: float = 0.0,
+) -> Optional[str]:
+    """Why this answer should go to the next tier, or None to accept it.
+
+    A field left empty escalates only if the rules see it at `min_rule_confidence` or above.
+    """
+    for f in FIELDS:
+        known, got = getattr(state, f), getattr(extraction, f)
+        if known and got and not _same(known, got):
+            return "contradiction"
+    if signals is not None:
+        for f in missing:
+            guess = signals.guess(f)
+            if (
+                getattr(extraction, f) is None
+                and guess.value
+                and guess.confidence >= min_rule_confidence
+            ):
+                return "empty_field"
+    return None
+
+
+@dataclass
+class TierStats:
+    calls: int = 0
+    escalations: int = 0
+    latency_total_s: float = 0.0
+    latency_max_s: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "escalations": self.escalations,
+            "escalation_rate": round(self.escalations / self.calls, 4) if self.calls else 0.0,
+            "latency_avg_ms": (
+                round(self.latency_total_s / self.calls * 1000, 1) if self.calls else 0.0
+            ),
+            "latency_max_ms": round(self.latency_max_s * 1000, 1),
+        }
+
+
+class RoutingStats:
+    """Per-tier call count, latency and escalation rate, plus escalation reasons."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tiers: "OrderedDict[str, TierStats]" = OrderedDict()
+        self.reasons: Counter = Counter()
+
+    def record(self, model: str, latency_s: float, *, escalated_for: Optional[str] = None) -> None:
+        with self._lock:
+            tier = self._tiers.get(model)
+            if tier is None:
+                tier = self._tiers[model] = TierStats()
+            tier.calls += 1
+            tier.latency_total_s += latency_s
+            tier.latency_max_s = max(tier.latency_max_s, latency_s)
+            if escalated_for is not None:
+                tier.escalations += 1
+                self.reasons[escalated_for] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tiers.clear()
+            self.reasons.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tiers": {m: t.to_dict() for m, t in self._tiers.items()},
+                "escalation_reasons": dict(self.reasons),
+            }
+
+
+routing_stats = RoutingStats()
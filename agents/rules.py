@@ -0,0 +1,185 @@
+"""
+Deterministic French pre-extractor.
+
+Runs before the model on every text message and returns a guess with a
+confidence for each field. When every field still missing from the session
+is guessed with high confidence, the model call can be skipped entirely.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from agents.conversation import FIELDS, compute_missing
+from agents.datetime_fr import WEEKDAYS
+from agents.session import SessionState
+
+# Common visit reasons: (pattern, canonical reason)
+REASON_GAZETTEER: Tuple[Tuple[str, str], ...] = (
+    (
+        r"douleurs?\s+dentaires?|mal\s+(?:aux|à\s+une|a\s+une|de)\s+dents?|rage\s+de\s+dents?",
+        "douleur dentaire",
+    ),
+    (r"d[ée]tartrage|nettoyage", "détartrage"),
+    (r"contr[ôo]le|check[\s-]?up|bilan", "contrôle"),
+    (r"caries?", "carie"),
+    (r"dent\s+(?:cass[ée]e|f[êe]l[ée]e|abîm[ée]e|abim[ée]e)", "dent cassée"),
+    (r"blanchiment", "blanchiment"),
+    (r"dents?\s+de\s+sagesse|extraction|arracher\s+une\s+dent", "extraction"),
+    (r"plombage|obturation", "plombage"),
+    (r"couronne", "couronne"),
+    (r"implants?", "implant"),
+    (r"orthodontie|appareil\s+dentaire", "orthodontie"),
+    (r"gencives?", "gencives"),
+    (r"abc[èe]s", "abcès"),
+)
+_REASON_RES = [(re.compile(rf"\b(?:{p})\b", re.IGNORECASE), label) for p, label in REASON_GAZETTEER]
+
+_DAY_RE = re.compile(
+    r"\b(?:aujourd['’]hui|apr[èe]s-demain|demain|" + "|".join(WEEKDAYS) + r")(?:\s+prochain)?\b",
+    re.IGNORECASE,
+)
+_PART_OF_DAY_RE = re.compile(r"\b(?:matin|apr[èe]s-midi|soir)\b", re.IGNORECASE)
+_CLOCK_RE = re.compile(r"\b\d{1,2}\s*(?:h|:)\s*(?:\d{2})?\b", re.IGNORECASE)
+# A refused or corrected time ("pas demain", "plutôt jeudi") needs the model to read it
+_NEGATION_RE = re.compile(r"\b(?:pas|sauf|plut[ôo]t|impossible)\b", re.IGNORECASE)
+# Below every threshold that lets a guess be used without the model
+_AMBIGUOUS_CONFIDENCE = 0.3
+
+_NAME_WORD = r"[A-ZÀ-Ý][a-zà-ÿ'’-]+"
+# Only the intro phrase is case-insensitive; the name itself must be capitalised
+_NAME_INTRO_RE = re.compile(
+    rf"\b(?i:je\s+m['’]appelle|mon\s+nom\s+est|moi\s+c['’]est)\s+({_NAME_WORD}(?:\s+{_NAME_WORD}){{0,3}})"
+)
+_NAME_CEST_RE = re.compile(rf"\bc['’]est\s+({_NAME_WORD}(?:\s+{_NAME_WORD}){{0,3}})")
+_BARE_NAME_RE = re.compile(r"^[A-Za-zÀ-ÿ'’-]+(?:\s+[A-Za-zÀ-ÿ'’-]+){0,3}$")
+
+# Words that can never be (part of) a name
+_NOT_NAME = {
+    *(
+        "bonjour bonsoir salut merci oui non ok d'accord svp stp "
+        "matin soir midi demain aujourd'hui urgent urgence rendez-vous rdv"
+    ).split(),
+    *WEEKDAYS,
+}
+# Small words that make a reply a sentence ("je ne sais pas") rather than a name
+_FUNCTION_WORDS = set(
+    (
+        "je j' tu il elle on nous vous ils elles me te se ne pas plus rien ça ca ce c' "
+        "le la les l' un une des de d' du au aux et ou mais donc que qui quoi est suis "
+        "sais ai a as pour avec sans en y"
+    ).split()
+)
+
+
+@dataclass
+class FieldGuess:
+    value: Optional[str] = None
+    confidence: float = 0.0
+
+
+@dataclass
+class RuleExtraction:
+    name: FieldGuess = field(default_factory=FieldGuess)
+    reason: FieldGuess = field(default_factory=FieldGuess)
+    preferred_time: FieldGuess = field(default_factory=FieldGuess)
+
+    def guess(self, name: str) -> FieldGuess:
+        return getattr(self, name)
+
+    def covers(self, missing: List[str], min_confidence: float) -> bool:
+        """True if every missing field is guessed at or above `min_confidence`."""
+        return all(
+            self.guess(f).value and self.guess(f).confidence >= min_confidence for f in missing
+        )
+
+    def as_dict(self, min_confidence: float = 0.0) -> Dict[str, Optional[str]]:
+        out: Dict[str, Optional[str]] = {}
+        for f in FIELDS:
+            g = self.guess(f)
+            out[f] = g.value if g.value and g.confidence >= min_confidence else None
+        return out
+
+
+def _guess_name(text: str, asking_for_bare_name: bool) -> FieldGuess:
+    m = _NAME_INTRO_RE.search(text)
+    if m:
+        return FieldGuess(_title(m.group(1)), 0.95)
+    m = _NAME_CEST_RE.search(text)
+    if m and m.group(1).split()[0].lower() not in _NOT_NAME:
+        words = m.group(1).split()
+        return FieldGuess(m.group(1), 0.9 if len(words) >= 2 else 0.7)
+    # A short reply right after we asked for the name is most likely the name itself
+    bare = text.strip().rstrip(".!")
+    if asking_for_bare_name and _BARE_NAME_RE.match(bare):
+        words = bare.split()
+        # "je ne sais pas": lowercase function words, not a name
+        filler = sum(1 for w in words if w.islower() and _is_function_word(w))
+        if filler * 2 > len(words):
+            return FieldGuess()
+        if not any(w.lower() in _NOT_NAME for w in words):
+            capitalised = all(w[0].isupper() for w in words)
+            confidence = 0.9 if capitalised and len(words) >= 2 else 0.75
+            return FieldGuess(_title(bare), confidence)
+    return FieldGuess()
+
+
+def _is_function_word(word: str) -> bool:
+    word = word.replace("’", "'")
+    return word in _FUNCTION_WORDS or word.split("'")[0] + "'" in _FUNCTION_WORDS
+
+
+def _guess_reason(text: str) -> FieldGuess:
+    for rx, label in _REASON_RES:
+        if rx.search(text):
+            return FieldGuess(label, 0.9)
+    return FieldGuess()
+
+
+def _guess_preferred_time(text: str) -> FieldGuess:
+    spans = []
+    for rx in (_DAY_RE, _PART_OF_DAY_RE, _CLOCK_RE):
+        spans.extend(m.span() for m in rx.finditer(text))
+    if not spans:
+        return FieldGuess()
+    has_day = bool(_DAY_RE.search(text))
+    has_hour = bool(_PART_OF_DAY_RE.search(text) or _CLOCK_RE.search(text))
+    if has_day and has_hour:
+        confidence = 0.95
+    elif has_day:
+        confidence = 0.85
+    elif _CLOCK_RE.search(text):
+        confidence = 0.6
+    else:
+        confidence = 0.4
+    start = min(s for s, _ in spans)
+    end = max(e for _, e in spans)
+    days = {m.group(0).lower() for m in _DAY_RE.finditer(text)}
+    parts = {m.group(0).lower() for m in _PART_OF_DAY_RE.finditer(text)}
+    clocks = {m.group(0).replace(" ", "").lower() for m in _CLOCK_RE.finditer(text)}
+    # Two days or hours, or a negation: the span would join a refused time to the wanted one
+    if len(days) > 1 or len(parts) > 1 or len(clocks) > 1 or _NEGATION_RE.search(text):
+        confidence = min(confidence, _AMBIGUOUS_CONFIDENCE)
+    return FieldGuess(text[start:end].strip(), confidence)
+
+
+def _title(value: str) -> str:
+    return " ".join(w[:1].upper() + w[1:] for w in value.split())
+
+
+def pre_extract(text: str, state: SessionState) -> RuleExtraction:
+    missing = compute_missing(state)
+    reason = _guess_reason(text)
+    preferred_time = _guess_preferred_time(text)
+    # A bare reply only counts as a name if it is not a reason or a time
+    asking_for_bare_name = (
+        bool(missing)
+        and missing[0] == "name"
+        and reason.value is None
+        and preferred_time.value is None
+    )
+    return RuleExtraction(
+        name=_guess_name(text, asking_for_bare_name),
+        reason=reason,
+        preferred_time=preferred_time,
+    )
@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import Any, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 
 
 class Extraction(BaseModel):
@@ -8,3 +8,11 @@ class Extraction(BaseModel):
     reason: Optional[str] = None
     preferred_time: Optional[str] = None
 
+    @field_validator("name", "reason", "preferred_time", mode="before")
+    @classmethod
+    def _clean(cls, value: Any) -> Optional[str]:
+        # Models sometimes answer with numbers, padded or empty strings, or nested junk
+        if value is None or isinstance(value, (dict, list)):
+            return None
+        s = str(value).strip()
+        return s or None
@@ -1,8 +1,17 @@
-from dataclasses import dataclass
-from typing import Dict, Optional, List
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple
 
+from app.config import Settings
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
 class SessionState:
     from_waid: str
     name: Optional[str] = None
@@ -12,26 +21,444 @@ class SessionState:
     event_id: Optional[str] = None
     pending_alternatives: Optional[List[str]] = None
     pending_duration_min: Optional[int] = None
-    event_id: Optional[str] = None
+
+
+_STATE_FIELDS = tuple(f.name for f in fields(SessionState))
+
+
+class SessionStore(Protocol):
+    """What the agent pipeline needs from a session store."""
+
+    def get(self, waid: str) -> SessionState: ...
+
+    async def aget(self, waid: str) -> SessionState: ...
+
+    def put(self, state: SessionState) -> None: ...
+
+    def clear(self, waid: Optional[str] = None) -> None: ...
+
+    def stats(self) -> Dict[str, Any]: ...
+
+
+class SessionBackend(Protocol):
+    """Shared, versioned session storage behind the in-process store.
+
+    Versions start at 1; `save` writes only if the stored version still equals
+    `expected_version` (0 meaning "not stored yet") and returns the new
+    version, or None when another writer got there first.
+    """
+
+    name: str
+
+    def load(self, waid: str) -> Optional[Tuple[SessionState, int]]: ...
+
+    def save(self, state: SessionState, expected_version: int) -> Optional[int]: ...
+
+    def delete(self, waid: str) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def _assign(target: SessionState, source: SessionState) -> None:
+    # Update in place: handlers in flight hold a reference to `target`
+    for name in _STATE_FIELDS:
+        setattr(target, name, getattr(source, name))
+
+
+def _merge(base: SessionState, local: SessionState, remote: SessionState) -> SessionState:
+    """Three-way merge of a write conflict against the version both sides started from.
+
+    Fields changed here win (clearing one to None included); the rest come
+    from the concurrent write.
+    """
+    merged = replace(remote)
+    for name in _STATE_FIELDS:
+        value = getattr(local, name)
+        if value != getattr(base, name):
+            setattr(merged, name, value)
+    return merged
+
+
+# (waid, live state, copy to write, expected version, stored version the copy is based on)
+_Pending = Tuple[str, SessionState, SessionState, int, SessionState]
 
 
 class InMemorySessionStore:
-    def __init__(self) -> None:
-        self._sessions: Dict[str, SessionState] = {}
+    """Sessions keyed by WhatsApp id, bounded in size and idle time.
+
+    Entries are kept in least-recently-used order: the store evicts from the
+    front when over `capacity`, and sessions idle for longer than `idle_ttl_s`
+    are dropped (lazily on access, and from the front on each write).
+
+    With a backend attached it becomes a write-behind cache: reads go to the
+    backend on a miss or once an entry is older than `revalidate_s`, writes
+    are batched by `flush()` (run periodically after `start()`), and version
+    conflicts are merged and retried.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 100_000,
+        idle_ttl_s: float = 7 * 86400,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._capacity = max(1, capacity)
+        self._idle_ttl_s = idle_ttl_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self.evictions = 0
+        self.expirations = 0
+        # Write-behind state, only used with a backend
+        self._backend: Optional[SessionBackend] = None
+        self._revalidate_s = 2.0
+        self._loaded: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}
+        # Copy of each session as last read from or written to the backend: the merge base
+        self._base: Dict[str, SessionState] = {}
+        self._dirty: Dict[str, SessionState] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.conflicts = 0
+        self.write_errors = 0
+        self.backend_reads = 0
+        self.backend_writes = 0
+
+    def configure(self, *, capacity: int, idle_ttl_s: float) -> None:
+        with self._lock:
+            self._capacity = max(1, capacity)
+            self._idle_ttl_s = idle_ttl_s
+            self._trim(self._clock())
+
+    def attach(self, backend: Optional[SessionBackend], *, revalidate_s: float = 2.0) -> None:
+        with self._lock:
+            self._backend = backend
+            self._revalidate_s = revalidate_s
+            self._loaded.clear()
+            self._versions.clear()
+            self._base.clear()
+
+    @property
+    def backend(self) -> Optional[SessionBackend]:
+        return self._backend
+
+    def _expired(self, waid: str, now: float) -> bool:
+        return now - self._touched.get(waid, now) > self._idle_ttl_s
+
+    def _drop(self, waid: str) -> None:
+        self._sessions.pop(waid, None)
+        self._touched.pop(waid, None)
+        self._loaded.pop(waid, None)
+        if waid not in self._dirty:
+            # Dirty sessions keep their version until flushed
+            self._versions.pop(waid, None)
+            self._base.pop(waid, None)
+
+    def _trim(self, now: float) -> None:
+        # Oldest entries sit at the front, so expiry stops at the first live one
+        while self._sessions:
+            waid = next(iter(self._sessions))
+            if not self._expired(waid, now):
+                break
+            self._drop(waid)
+            self.expirations += 1
+        while len(self._sessions) > self._capacity:
+            waid = next(iter(self._sessions))
+            self._drop(waid)
+            self.evictions += 1
+
+    def _cached(self, waid: str, now: float) -> Optional[SessionState]:
+        """The cached session if it can be used without asking the backend."""
+        with self._lock:
+            state = self._sessions.get(waid)
+            if state is not None and self._expired(waid, now):
+                self._drop(waid)
+                self.expirations += 1
+                state = None
+            if state is None and waid in self._dirty:
+                # Evicted before it was flushed: the pending copy is the latest
+                state = self._sessions[waid] = self._dirty[waid]
+            fresh = state is not None and (
+                self._backend is None
+                or waid in self._dirty
+                or now - self._loaded.get(waid, now) < self._revalidate_s
+            )
+            if state is not None and fresh:
+                self._sessions.move_to_end(waid)
+                self._touched[waid] = now
+                return state
+            return None
+
+    def _read(self, backend: SessionBackend, waid: str) -> Optional[Tuple[SessionState, int]]:
+        try:
+            loaded = backend.load(waid)
+            self.backend_reads += 1
+            return loaded
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("session_backend_read_failed", extra={"error": str(exc)})
+            return None
+
+    def _install(
+        self, waid: str, loaded: Optional[Tuple[SessionState, int]], now: float
+    ) -> SessionState:
+        with self._lock:
+            state = self._sessions.get(waid)
+            if loaded is not None and waid not in self._dirty:
+                remote, version = loaded
+                if state is None:
+                    state = remote
+                else:
+                    _assign(state, remote)
+                self._versions[waid] = version
+                self._base[waid] = replace(remote)
+            if state is None:
+                state = SessionState(from_waid=waid)
+            self._sessions[waid] = state
+            self._sessions.move_to_end(waid)
+            self._touched[waid] = now
+            if self._backend is not None:
+                self._loaded[waid] = now
+            self._trim(now)
+            return state
 
     def get(self, waid: str) -> SessionState:
-        if waid not in self._sessions:
-            self._sessions[waid] = SessionState(from_waid=waid)
-        return self._sessions[waid]
+        now = self._clock()
+        state = self._cached(waid, now)
+        if state is not None:
+            return state
+        backend = self._backend
+        loaded = self._read(backend, waid) if backend is not None else None
+        return self._install(waid, loaded, now)
+
+    async def aget(self, waid: str) -> SessionState:
+        """`get` for the event loop: a backend read runs in a thread."""
+        now = self._clock()
+        state = self._cached(waid, now)
+        if state is not None:
+            return state
+        backend = self._backend
+        loaded = None
+        if backend is not None:
+            loaded = await asyncio.to_thread(self._read, backend, waid)
+        return self._install(waid, loaded, now)
 
     def put(self, state: SessionState) -> None:
-        self._sessions[state.from_waid] = state
+        now = self._clock()
+        with self._lock:
+            self._sessions[state.from_waid] = state
+            self._sessions.move_to_end(state.from_waid)
+            self._touched[state.from_waid] = now
+            if self._backend is not None:
+                self._dirty[state.from_waid] = state
+            self._trim(now)
+
+    def _take_dirty(self) -> List[_Pending]:
+        # Copies are taken here, on the caller's thread: the writer never touches live states
+        with self._lock:
+            batch = [
+                (
+                    waid,
+                    state,
+                    replace(state),
+                    self._versions.get(waid, 0),
+                    self._base.get(waid) or SessionState(from_waid=waid),
+                )
+                for waid, state in self._dirty.items()
+            ]
+            self._dirty.clear()
+        return batch
+
+    def _write(
+        self, backend: SessionBackend, batch: List[_Pending]
+    ) -> List[Tuple[_Pending, Optional[Tuple[int, SessionState]]]]:
+        results = []
+        for pending in batch:
+            _, _, snapshot, expected, base = pending
+            try:
+                results.append((pending, self._save(backend, snapshot, expected, base)))
+            except Exception as exc:  # noqa: BLE001
+                self.write_errors += 1
+                logger.warning("session_backend_write_failed", extra={"error": str(exc)})
+                results.append((pending, None))
+        return results
+
+    def _apply(self, results: List[Tuple[_Pending, Optional[Tuple[int, SessionState]]]]) -> int:
+        written = 0
+        with self._lock:
+            for (waid, state, snapshot, _, _), outcome in results:
+                if outcome is None:
+                    self._dirty.setdefault(waid, state)
+                    continue
+                version, stored = outcome
+                for name in _STATE_FIELDS:
+                    # Take the other writer's changes, except where this process moved on
+                    value, sent = getattr(stored, name), getattr(snapshot, name)
+                    if value != sent and getattr(state, name) == sent:
+                        setattr(state, name, value)
+                self._versions[waid] = version
+                self._base[waid] = stored
+                if waid in self._sessions:
+                    self._loaded[waid] = self._clock()
+                elif waid not in self._dirty:
+                    # Evicted while dirty: nothing left to track
+                    self._versions.pop(waid, None)
+                    self._base.pop(waid, None)
+                written += 1
+        return written
+
+    def flush(self) -> int:
+        """Write dirty sessions to the backend; returns how many were written."""
+        backend = self._backend
+        if backend is None:
+            return 0
+        return self._apply(self._write(backend, self._take_dirty()))
+
+    async def flush_async(self) -> int:
+        """`flush` for the event loop: only the backend writes run in a thread."""
+        backend = self._backend
+        if backend is None:
+            return 0
+        batch = self._take_dirty()
+        if not batch:
+            return 0
+        return self._apply(await asyncio.to_thread(self._write, backend, batch))
+
+    def _save(
+        self, backend: SessionBackend, snapshot: SessionState, expected: int, base: SessionState
+    ) -> Tuple[int, SessionState]:
+        """Write `snapshot`, merging on conflict; returns the new version and what was stored."""
+        for _ in range(3):
+            version = backend.save(snapshot, expected)
+            self.backend_writes += 1
+            if version is not None:
+                return version, snapshot
+            # Someone else wrote since we read: merge onto their copy and retry
+            self.conflicts += 1
+            loaded = backend.load(snapshot.from_waid)
+            if loaded is None:
+                remote, expected = SessionState(from_waid=snapshot.from_waid), 0
+            else:
+                remote, expected = loaded
+            snapshot = _merge(base, snapshot, remote)
+            base = remote
+            logger.info("session_conflict", extra={"from": snapshot.from_waid, "version": expected})
+        raise RuntimeError(f"session write kept conflicting for {snapshot.from_waid}")
+
+    async def _flush_loop(self, interval_s: float) -> None:
+        last_purge = self._clock()
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                await self.flush_async()
+                purge = getattr(self._backend, "purge", None)
+                if purge is not None and self._clock() - last_purge >= 3600:
+                    await asyncio.to_thread(purge)
+                    last_purge = self._clock()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("session_flush_failed", extra={"error": str(exc)})
+
+    def start(self, interval_s: float) -> None:
+        if self._backend is not None and self._task is None:
+            self._task = asyncio.create_task(self._flush_loop(interval_s), name="session-flusher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        backend = self._backend
+        if backend is not None:
+            await self.flush_async()
+            self.attach(None)
+            backend.close()
 
     def clear(self, waid: Optional[str] = None) -> None:
-        if waid is None:
-            self._sessions.clear()
-        else:
-            self._sessions.pop(waid, None)
+        with self._lock:
+            if waid is None:
+                self._sessions.clear()
+                self._touched.clear()
+                self._loaded.clear()
+                self._versions.clear()
+                self._base.clear()
+                self._dirty.clear()
+                return
+            self._dirty.pop(waid, None)
+            self._drop(waid)
+            backend = self._backend
+        if backend is not None:
+            backend.delete(waid)
+
+    def export(self) -> List[Tuple[SessionState, float]]:
+        """Live sessions (oldest first) with how long each has been idle, in seconds.
+
+        The states are not copied: serialise them before any handler runs again.
+        """
+        now = self._clock()
+        with self._lock:
+            self._trim(now)
+            return [
+                (state, now - self._touched.get(waid, now))
+                for waid, state in self._sessions.items()
+            ]
+
+    def restore(self, items: List[Tuple[SessionState, float]]) -> int:
+        """Bulk-load exported sessions; entries idle past the TTL are skipped.
+
+        Returns how many were kept.
+        """
+        now = self._clock()
+        kept = 0
+        with self._lock:
+            had_entries = bool(self._sessions)
+            for state, idle_s in items:
+                if idle_s > self._idle_ttl_s or state.from_waid in self._sessions:
+                    continue
+                self._sessions[state.from_waid] = state
+                self._touched[state.from_waid] = now - idle_s
+                if self._backend is not None:
+                    # Let the first read check the shared copy
+                    self._loaded[state.from_waid] = now - self._revalidate_s
+                kept += 1
+            if had_entries:
+                # Keep least-recently-used order across old and restored entries
+                for waid in sorted(self._sessions, key=lambda w: self._touched.get(w, now)):
+                    self._sessions.move_to_end(waid)
+            self._trim(now)
+        return kept
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "size": len(self._sessions),
+            "capacity": self._capacity,
+            "idle_ttl_s": self._idle_ttl_s,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+        if self._backend is not None:
+            out["backend"] = {
+                "name": self._backend.name,
+                "dirty": len(self._dirty),
+                "reads": self.backend_reads,
+                "writes": self.backend_writes,
+                "conflicts": self.conflicts,
+                "write_errors": self.write_errors,
+            }
+        return out
 
 
 store = InMemorySessionStore()
+
+
+def configure_from_settings(settings: Settings) -> InMemorySessionStore:
+    # Local import to avoid a cycle
+    from agents.session_backends import from_settings as backend_from_settings
+
+    # Never keep an idle conversation longer than the retention policy allows
+    idle_ttl_s = min(settings.session_idle_ttl_s, settings.data_retention_days * 86400)
+    store.configure(capacity=settings.session_capacity, idle_ttl_s=idle_ttl_s)
+    store.attach(backend_from_settings(settings), revalidate_s=settings.session_revalidate_s)
+    return store
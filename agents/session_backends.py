@@ -0,0 +1,194 @@
+"""
+Shared session backends, so several workers or pods see the same conversations.
+
+Every stored session carries a version. A write names the version it was
+based on and is refused if another process wrote in between (optimistic
+concurrency), so conflicts are detected instead of silently overwritten.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from agents.session import _STATE_FIELDS, SessionBackend, SessionState
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def state_to_json(state: SessionState) -> str:
+    return json.dumps(asdict(state), ensure_ascii=False, separators=(",", ":"))
+
+
+def state_from_json(data: Any) -> SessionState:
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    raw: Dict[str, Any] = json.loads(data)
+    # Unknown keys (written by a newer release) are ignored
+    return SessionState(**{k: v for k, v in raw.items() if k in _STATE_FIELDS})
+
+
+class SQLiteSessionBackend:
+    """Sessions in a local SQLite file (WAL), shared by every worker on the host."""
+
+    name = "sqlite"
+
+    def __init__(
+        self, path: str, *, ttl_s: float = 7 * 86400, clock: Callable[[], float] = time.time
+    ) -> None:
+        self._ttl_s = ttl_s
+        self._clock = clock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "waid TEXT PRIMARY KEY, version INTEGER NOT NULL, data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    def load(self, waid: str) -> Optional[Tuple[SessionState, int]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, version FROM sessions WHERE waid = ? AND updated_at >= ?",
+                (waid, self._clock() - self._ttl_s),
+            ).fetchone()
+        if row is None:
+            return None
+        return state_from_json(row[0]), int(row[1])
+
+    def save(self, state: SessionState, expected_version: int) -> Optional[int]:
+        data = state_to_json(state)
+        now = self._clock()
+        with self._lock:
+            if expected_version != 0:
+                cur = self._conn.execute(
+                    "UPDATE sessions SET version = version + 1, data = ?, updated_at = ? "
+                    "WHERE waid = ? AND version = ?",
+                    (data, now, state.from_waid, expected_version),
+                )
+                return expected_version + 1 if cur.rowcount == 1 else None
+            # `load` hides rows past the TTL, so "not stored yet" may still find an expired
+            # row awaiting `purge`: take it over, continuing its version so a writer that
+            # read it before it expired still conflicts
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(
+                    "INSERT INTO sessions (waid, version, data, updated_at) VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT(waid) DO UPDATE SET version = version + 1, "
+                    "data = excluded.data, updated_at = excluded.updated_at "
+                    "WHERE sessions.updated_at < ?",
+                    (state.from_waid, data, now, now - self._ttl_s),
+                )
+                row = None
+                if cur.rowcount == 1:
+                    row = self._conn.execute(
+                        "SELECT version FROM sessions WHERE waid = ?", (state.from_waid,)
+                    ).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return int(row[0]) if row is not None else None
+
+    def delete(self, waid: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE waid = ?", (waid,))
+
+    def purge(self) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (self._clock() - self._ttl_s,)
+            )
+            return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# KEYS[1] = session key; ARGV = expected version, new version, data, ttl seconds
+_CAS_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'v')
+if (not current and ARGV[1] == '0') or current == ARGV[1] then
+  redis.call('HSET', KEYS[1], 'v', ARGV[2], 'd', ARGV[3])
+  if tonumber(ARGV[4]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+  end
+  return 1
+end
+return 0
+"""
+
+
+class RedisSessionBackend:
+    """Sessions in Redis (or anything speaking its protocol), shared across hosts.
+
+    Takes a redis-py compatible client. Each session is a hash with the
+    version and the JSON state; the compare-and-set runs as a Lua script so it
+    is atomic on the server. Keys expire after `ttl_s` of inactivity.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self, client: Any, *, prefix: str = "mediflow:session:", ttl_s: float = 7 * 86400
+    ) -> None:
+        self._client = client
+        self._prefix = prefix
+        self._ttl_s = int(ttl_s)
+        self._cas = client.register_script(_CAS_SCRIPT)
+
+    def _key(self, waid: str) -> str:
+        return f"{self._prefix}{waid}"
+
+    def load(self, waid: str) -> Optional[Tuple[SessionState, int]]:
+        version, data = self._client.hmget(self._key(waid), "v", "d")
+        if version is None or data is None:
+            return None
+        return state_from_json(data), int(version)
+
+    def save(self, state: SessionState, expected_version: int) -> Optional[int]:
+        new_version = expected_version + 1
+        ok = self._cas(
+            keys=[self._key(state.from_waid)],
+            args=[str(expected_version), str(new_version), state_to_json(state), str(self._ttl_s)],
+        )
+        return new_version if int(ok) == 1 else None
+
+    def delete(self, waid: str) -> None:
+        self._client.delete(self._key(waid))
+
+    def close(self) -> None:
+        close = getattr(self._client, "close", None)
+        if close is not None:
+            close()
+
+
+def from_settings(settings: Settings) -> Optional[SessionBackend]:
+    """Build the configured backend; None keeps sessions in process memory only."""
+    kind = (settings.session_backend or "memory").lower()
+    ttl_s = min(settings.session_idle_ttl_s, settings.data_retention_days * 86400)
+    if kind == "sqlite":
+        return SQLiteSessionBackend(settings.session_db_path or "sessions.db", ttl_s=ttl_s)
+    if kind == "redis":
+        try:
+            import redis  # type: ignore
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("session_redis_unavailable", extra={"error": str(exc)})
+            return None
+        if not settings.session_redis_url:
+            logger.warning(
+                "session_redis_unavailable", extra={"error": "SESSION_REDIS_URL not set"}
+            )
+            return None
+        return RedisSessionBackend(redis.Redis.from_url(settings.session_redis_url), ttl_s=ttl_s)
+    if kind != "memory":
+        logger.warning("session_backend_unknown", extra={"backend": kind})
+    return None
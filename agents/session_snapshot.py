@@ -0,0 +1,148 @@
+"""
+Binary snapshot of the session store, so a restart keeps conversations in flight.
+
+Layout: a fixed header (magic, format version, write time, session count)
+followed by a zlib-compressed JSON body. The body names the state fields
+once and then holds one row per session, so it stays small and loads in a
+single decode. Field names make additions and removals to `SessionState`
+readable across releases; a new layout bumps `FORMAT_VERSION`, and files in
+a format this release does not know are ignored.
+"""
+
+import gc
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from agents.session import _STATE_FIELDS, InMemorySessionStore, SessionState
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MFSS"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct(">4sHdI")  # magic, format version, written at (epoch s), sessions
+_values = attrgetter(*_STATE_FIELDS)
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # Building every session at once would otherwise trigger repeated full GC passes
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def encode(items: List[Tuple[SessionState, float]], *, now: float) -> bytes:
+    rows = [(round(idle_s, 3), *_values(state)) for state, idle_s in items]
+    body = json.dumps(
+        {"fields": _STATE_FIELDS, "rows": rows}, ensure_ascii=False, separators=(",", ":")
+    )
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, now, len(rows))
+    return header + zlib.compress(body.encode("utf-8"), 6)
+
+
+def decode(blob: bytes, *, now: float) -> List[Tuple[SessionState, float]]:
+    """Sessions with their idle time, counting the time since the snapshot was written."""
+    if len(blob) < _HEADER.size:
+        raise SnapshotError("truncated header")
+    magic, version, written_at, count = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise SnapshotError("not a session snapshot")
+    if version != FORMAT_VERSION:
+        raise SnapshotError(f"unsupported snapshot format {version}")
+    try:
+        body: Dict[str, Any] = json.loads(zlib.decompress(blob[_HEADER.size :]))
+    except (zlib.error, ValueError) as exc:
+        raise SnapshotError(f"corrupt body: {exc}") from exc
+    rows = body.get("rows") or []
+    if len(rows) != count:
+        raise SnapshotError(f"expected {count} sessions, found {len(rows)}")
+    downtime = max(0.0, now - written_at)
+    names = tuple(body.get("fields") or ())
+    if "from_waid" not in names:
+        raise SnapshotError("snapshot rows have no from_waid")
+    try:
+        if names == _STATE_FIELDS:
+            # Same schema as this release: positional construction is the fast path
+            return [(SessionState(*row[1:]), row[0] + downtime) for row in rows]
+        # Written by another release: match by name, drop unknown fields, default missing ones
+        known = [(i + 1, name) for i, name in enumerate(names) if name in _STATE_FIELDS]
+        return [
+            (SessionState(**{name: row[i] for i, name in known}), row[0] + downtime) for row in rows
+        ]
+    except (TypeError, IndexError) as exc:
+        raise SnapshotError(f"malformed row: {exc}") from exc
+
+
+def save_snapshot(
+    store: InMemorySessionStore, path: str, *, clock: Callable[[], float] = time.time
+) -> int:
+    """Write the store's live sessions to `path` atomically; returns how many were written."""
+    with _gc_paused():
+        items = store.export()
+        blob = encode(items, now=clock())
+    tmp = f"{path}.tmp"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(tmp, "wb") as fh:
+        fh.write(blob)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+    logger.info("session_snapshot_saved", extra={"sessions": len(items), "bytes": len(blob)})
+    return len(items)
+
+
+def load_snapshot(
+    store: InMemorySessionStore, path: str, *, clock: Callable[[], float] = time.time
+) -> int:
+    """Restore sessions from `path` into the store; returns how many were kept.
+
+    A missing, unreadable or unknown-format file is logged and skipped: the
+    service starts with an empty store rather than not at all. The file is
+    removed once loaded, so a crash later on never brings back stale state.
+    """
+    started = time.perf_counter()
+    try:
+        with open(path, "rb") as fh:
+            blob = fh.read()
+    except FileNotFoundError:
+        return 0
+    except OSError as exc:
+        logger.warning("session_snapshot_unreadable", extra={"error": str(exc)})
+        return 0
+    try:
+        with _gc_paused():
+            items = decode(blob, now=clock())
+            kept = store.restore(items)
+    except SnapshotError as exc:
+        logger.warning("session_snapshot_invalid", extra={"error": str(exc)})
+        return 0
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    logger.info(
+        "session_snapshot_loaded",
+        extra={
+            "sessions": kept,
+            "skipped": len(items) - kept,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        },
+    )
+    return kept
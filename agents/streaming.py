@@ -0,0 +1,110 @@
+"""
+Incremental parsing of a streamed JSON object.
+
+The model answers with a single flat JSON object. Members are decoded as soon
+as they are complete, so the caller can stop reading the stream once every
+field it needs has arrived instead of waiting for the end of the response.
+"""
+
+import json
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from agents.usage import TokenUsage, usage_from_response
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalObjectParser:
+    """Feed text chunks; completed top-level members appear in `fields`.
+
+    Text before the first `{` (prose, a code fence) is skipped. Nested values
+    are kept whole and decoded once their member is complete.
+    """
+
+    def __init__(self) -> None:
+        self.fields: Dict[str, Any] = {}
+        self.closed = False
+        self._buf: list = []
+        self._member: list = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> None:
+        self._buf.append(chunk)
+        for ch in chunk:
+            if self.closed:
+                return
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                continue
+            if self._in_string:
+                self._member.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+            if self._depth == 1 and ch == ",":
+                self._finish_member()
+                continue
+            if self._depth == 0:
+                self._finish_member()
+                self.closed = True
+                return
+            self._member.append(ch)
+
+    def _finish_member(self) -> None:
+        text = "".join(self._member).strip()
+        self._member = []
+        if not text:
+            return
+        try:
+            self.fields.update(json.loads("{" + text + "}"))
+        except ValueError:
+            # Malformed member: leave it to the full-text parser
+            pass
+
+    @property
+    def text(self) -> str:
+        return "".join(self._buf)
+
+
+async def collect_stream(
+    stream: Any, done: Callable[[Dict[str, Any]], bool]
+) -> Tuple[str, Optional[TokenUsage]]:
+    """Read a Responses API event stream until `done(fields)` or its end.
+
+    Returns the text to parse (the decoded members when stopped early, so the
+    result is always a complete object) and the usage if the stream finished.
+    """
+    parser = IncrementalObjectParser()
+    usage: Optional[TokenUsage] = None
+    try:
+        async for event in stream:
+            etype = getattr(event, "type", "")
+            if etype == "response.output_text.delta":
+                parser.feed(getattr(event, "delta", "") or "")
+                if parser.fields and done(parser.fields):
+                    logger.info("agent_stream_early_stop", extra={"fields": sorted(parser.fields)})
+                    return json.dumps(parser.fields, ensure_ascii=False), None
+            elif etype == "response.completed":
+                usage = usage_from_response(getattr(event, "response", None))
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            try:
+                await close()
+            except Exception as exc:  # noqa: BLE001
+                logger.debug("agent_stream_close_failed: %s", exc)
+    return parser.text, usage
@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class TokenUsage:
+    calls: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+
+    def add(self, other: "TokenUsage") -> None:
+        self.calls += other.calls
+        self.input_tokens += other.input_tokens
+        self.cached_tokens += other.cached_tokens
+        self.output_tokens += other.output_tokens
+
+    @property
+    def cached_ratio(self) -> float:
+        return (self.cached_tokens / self.input_tokens) if self.input_tokens else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = asdict(self)
+        out["cached_ratio"] = round(self.cached_ratio, 4)
+        return out
+
+
+def usage_from_response(resp: Any) -> Optional[TokenUsage]:
+    """Read `usage` (including cached prompt tokens) from a Responses API result."""
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return None
+    details = getattr(usage, "input_tokens_details", None)
+    return TokenUsage(
+        calls=1,
+        input_tokens=int(getattr(usage, "input_tokens", 0) or 0),
+        cached_tokens=int(getattr(details, "cached_tokens", 0) or 0),
+        output_tokens=int(getattr(usage, "output_tokens", 0) or 0),
+    )
+
+
+class UsageTracker:
+    """Token usage per conversation (bounded, least recently active dropped first), per model
+    and in total.
+    """
+
+    def __init__(self, max_conversations: int = 10000) -> None:
+        self._max = max(1, max_conversations)
+        self._lock = threading.Lock()
+        self._by_conversation: "OrderedDict[str, TokenUsage]" = OrderedDict()
+        self._by_model: Dict[str, TokenUsage] = {}
+        self.total = TokenUsage()
+
+    def record(
+        self, conversation: Optional[str], usage: TokenUsage, model: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self.total.add(usage)
+            if model is not None:
+                self._by_model.setdefault(model, TokenUsage()).add(usage)
+            if conversation is None:
+                return
+            entry = self._by_conversation.get(conversation)
+            if entry is None:
+                entry = self._by_conversation[conversation] = TokenUsage()
+            entry.add(usage)
+            self._by_conversation.move_to_end(conversation)
+            while len(self._by_conversation) > self._max:
+                self._by_conversation.popitem(last=False)
+
+    def conversation(self, conversation: str) -> Optional[TokenUsage]:
+        return self._by_conversation.get(conversation)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_conversation.clear()
+            self._by_model.clear()
+            self.total = TokenUsage()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_model = {m: u.to_dict() for m, u in self._by_model.items()}
+        return {
+            "total": self.total.to_dict(),
+            "by_model": by_model,
+            "conversations": len(self._by_conversation),
+        }
+
+
+tracker = UsageTracker()
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 
 
 def _try_load_dotenv() -> None:
@@ -28,6 +28,35 @@ class Settings:
     openai_project: Optional[str] = None
     agent_auto_reply: bool = False
     agent_dry_run: bool = True
+    openai_timeout_s: int = 20
+    openai_max_retries: int = 1
+    openai_max_connections: int = 50
+    openai_max_keepalive: int = 20
+    openai_keepalive_s: int = 30
+    agent_capabilities_path: Optional[str] = None
+    agent_capability_probe: bool = False
+    agent_rules_enabled: bool = True
+    agent_rules_min_confidence: float = 0.85
+    extraction_cache_size: int = 2048
+    extraction_cache_ttl_s: int = 3600
+    agent_deadline_s: float = 8.0
+    calendar_deadline_s: float = 4.0
+    whatsapp_send_deadline_s: float = 5.0
+    agent_streaming: bool = False
+    agent_strict_models: Tuple[str, ...] = ()
+    agent_model_tiers: Tuple[str, ...] = ()
+    agent_routing_min_rule_confidence: float = 0.6
+    calendar_speculation: bool = True
+    session_capacity: int = 100_000
+    session_idle_ttl_s: int = 7 * 86400
+    session_backend: str = "memory"
+    session_db_path: Optional[str] = None
+    session_redis_url: Optional[str] = None
+    session_revalidate_s: float = 2.0
+    session_flush_interval_ms: int = 200
+    session_snapshot_path: Optional[str] = None
+    agent_breaker_failures: int = 5
+    agent_breaker_reset_s: int = 30
 
     # WhatsApp (Cloud API)
     whatsapp_token: Optional[str] = None
@@ -35,13 +64,37 @@ class Settings:
     whatsapp_phone_id: Optional[str] = None
     whatsapp_base_url: str = "https://graph.facebook.com/v18.0"
 
+    # Ingestion (background processing of inbound messages)
+    ingest_workers: int = 4
+    ingest_queue_size: int = 1000
+    ingest_drain_timeout_s: int = 10
+    ingest_coalesce_ms: int = 0
+    ingest_coalesce_max_ms: int = 2000
+    dedup_capacity: int = 10000
+    dedup_ttl_s: int = 86400
+    dedup_db_path: Optional[str] = None
+    message_store_capacity: int = 10000
+    message_store_raw: str = "keep"  # keep | strip | compress
+    journal_dir: Optional[str] = None
+    journal_segment_max_bytes: int = 16 * 1024 * 1024
+    journal_segment_max_age_s: int = 3600
+    journal_fsync_interval_ms: int = 200
+
     # Google Calendar
     google_creds_json: Optional[str] = None
     google_creds_json_b64: Optional[str] = None
     google_calendar_id: Optional[str] = None
+    google_busy_calendar_ids: Tuple[str, ...] = ()
+    google_mirror_weeks: int = 4
+    google_mirror_sync_s: float = 30.0
+    google_mirror_max_age_s: float = 120.0
+    google_creds_refresh_s: float = 300.0
 
     # Scheduling / Jobs
     reminder_hours_before: int = 24
+    clinic_hours: str = "mon-fri 09:00-12:30,13:30-18:00"
+    slot_granularity_min: int = 15
+    slot_search_days: int = 7
 
     # Security & Privacy
     redact_logs: bool = True
@@ -71,6 +124,18 @@ def load_settings() -> Settings:
         except ValueError:
             return default
 
+    def getenv_float(name: str, default: float) -> float:
+        value = os.getenv(name)
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            return default
+
+    def getenv_list(name: str) -> Tuple[str, ...]:
+        return tuple(v.strip() for v in (os.getenv(name) or "").split(",") if v.strip())
+
     def getenv_bool(name: str, default: bool) -> bool:
         value = os.getenv(name)
         if value is None:
@@ -88,15 +153,66 @@ def load_settings() -> Settings:
         openai_project=getenv("OPENAI_PROJECT"),
         agent_auto_reply=getenv_bool("AGENT_AUTO_REPLY", False),
         agent_dry_run=getenv_bool("AGENT_DRY_RUN", True),
+        openai_timeout_s=getenv_int("OPENAI_TIMEOUT_S", 20),
+        openai_max_retries=getenv_int("OPENAI_MAX_RETRIES", 1),
+        openai_max_connections=getenv_int("OPENAI_MAX_CONNECTIONS", 50),
+        openai_max_keepalive=getenv_int("OPENAI_MAX_KEEPALIVE", 20),
+        openai_keepalive_s=getenv_int("OPENAI_KEEPALIVE_S", 30),
+        agent_capabilities_path=getenv("AGENT_CAPABILITIES_PATH") or None,
+        agent_capability_probe=getenv_bool("AGENT_CAPABILITY_PROBE", False),
+        agent_rules_enabled=getenv_bool("AGENT_RULES_ENABLED", True),
+        agent_rules_min_confidence=getenv_float("AGENT_RULES_MIN_CONFIDENCE", 0.85),
+        extraction_cache_size=getenv_int("EXTRACTION_CACHE_SIZE", 2048),
+        extraction_cache_ttl_s=getenv_int("EXTRACTION_CACHE_TTL_S", 3600),
+        agent_deadline_s=getenv_float("AGENT_DEADLINE_S", 8.0),
+        calendar_deadline_s=getenv_float("CALENDAR_DEADLINE_S", 4.0),
+        whatsapp_send_deadline_s=getenv_float("WHATSAPP_SEND_DEADLINE_S", 5.0),
+        agent_streaming=getenv_bool("AGENT_STREAMING", False),
+        agent_strict_models=getenv_list("AGENT_STRICT_MODELS"),
+        agent_model_tiers=getenv_list("AGENT_MODEL_TIERS"),
+        agent_routing_min_rule_confidence=getenv_float("AGENT_ROUTING_MIN_RULE_CONFIDENCE", 0.6),
+        calendar_speculation=getenv_bool("CALENDAR_SPECULATION", True),
+        session_capacity=getenv_int("SESSION_CAPACITY", 100_000),
+        session_idle_ttl_s=getenv_int("SESSION_IDLE_TTL_S", 7 * 86400),
+        session_backend=getenv("SESSION_BACKEND", "memory") or "memory",
+        session_db_path=getenv("SESSION_DB_PATH") or None,
+        session_redis_url=getenv("SESSION_REDIS_URL") or None,
+        session_revalidate_s=getenv_float("SESSION_REVALIDATE_S", 2.0),
+        session_flush_interval_ms=getenv_int("SESSION_FLUSH_INTERVAL_MS", 200),
+        session_snapshot_path=getenv("SESSION_SNAPSHOT_PATH") or None,
+        agent_breaker_failures=getenv_int("AGENT_BREAKER_FAILURES", 5),
+        agent_breaker_reset_s=getenv_int("AGENT_BREAKER_RESET_S", 30),
         whatsapp_token=getenv("WHATSAPP_TOKEN"),
         whatsapp_verify_token=getenv("WHATSAPP_VERIFY_TOKEN"),
         whatsapp_phone_id=getenv("WHATSAPP_PHONE_ID"),
         whatsapp_base_url=getenv("WHATSAPP_BASE_URL", "https://graph.facebook.com/v18.0")
         or "https://graph.facebook.com/v18.0",
+        ingest_workers=getenv_int("INGEST_WORKERS", 4),
+        ingest_queue_size=getenv_int("INGEST_QUEUE_SIZE", 1000),
+        ingest_drain_timeout_s=getenv_int("INGEST_DRAIN_TIMEOUT_S", 10),
+        ingest_coalesce_ms=getenv_int("INGEST_COALESCE_MS", 0),
+        ingest_coalesce_max_ms=getenv_int("INGEST_COALESCE_MAX_MS", 2000),
+        dedup_capacity=getenv_int("DEDUP_CAPACITY", 10000),
+        dedup_ttl_s=getenv_int("DEDUP_TTL_S", 86400),
+        dedup_db_path=getenv("DEDUP_DB_PATH") or None,
+        message_store_capacity=getenv_int("MESSAGE_STORE_CAPACITY", 10000),
+        message_store_raw=(getenv("MESSAGE_STORE_RAW", "keep") or "keep").lower(),
+        journal_dir=getenv("JOURNAL_DIR") or None,
+        journal_segment_max_bytes=getenv_int("JOURNAL_SEGMENT_MAX_BYTES", 16 * 1024 * 1024),
+        journal_segment_max_age_s=getenv_int("JOURNAL_SEGMENT_MAX_AGE_S", 3600),
+        journal_fsync_interval_ms=getenv_int("JOURNAL_FSYNC_INTERVAL_MS", 200),
         google_creds_json=getenv("GOOGLE_CREDS_JSON"),
         google_creds_json_b64=getenv("GOOGLE_CREDS_JSON_B64"),
         google_calendar_id=getenv("GOOGLE_CALENDAR_ID"),
+        google_busy_calendar_ids=getenv_list("GOOGLE_BUSY_CALENDAR_IDS"),
+        google_mirror_weeks=getenv_int("GOOGLE_MIRROR_WEEKS", 4),
+        google_mirror_sync_s=getenv_float("GOOGLE_MIRROR_SYNC_S", 30.0),
+        google_mirror_max_age_s=getenv_float("GOOGLE_MIRROR_MAX_AGE_S", 120.0),
+        google_creds_refresh_s=getenv_float("GOOGLE_CREDS_REFRESH_S", 300.0),
         reminder_hours_before=getenv_int("REMINDER_HOURS_BEFORE", 24),
+        clinic_hours=getenv("CLINIC_HOURS", "mon-fri 09:00-12:30,13:30-18:00") or "",
+        slot_granularity_min=getenv_int("SLOT_GRANULARITY_MIN", 15),
+        slot_search_days=getenv_int("SLOT_SEARCH_DAYS", 7),
         redact_logs=getenv_bool("REDACT_LOGS", True),
         data_retention_days=getenv_int("DATA_RETENTION_DAYS", 90),
         port=getenv_int("PORT", 8080),
@@ -1,13 +1,58 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 
 from fastapi import FastAPI
 
-from app.config import load_settings
+from agents.breaker import breakers
+from agents.breaker import configure_from_settings as configure_breakers
+from agents.cache import configure_from_settings as configure_extraction_cache
+from agents.cache import extraction_cache
+from agents.capabilities import configure_from_settings as configure_capabilities
+from agents.capabilities import registry as capability_registry
+from agents.client import close_agents_client, init_agents_client
+from agents.conversation import PROMPT_VERSION, STATIC_PREFIX
+from agents.dispatch import IngestionQueue
+from agents.dispatch import from_settings as ingestion_queue_from_settings
+from agents.locks import conversation_locks
+from agents.routing import model_tiers, routing_stats
+from agents.session import configure_from_settings as configure_sessions
+from agents.session import store as session_store
+from agents.session_snapshot import load_snapshot, save_snapshot
+from agents.usage import tracker as usage_tracker
+from app.config import Settings, load_settings
 from app.logging import CorrelationIdMiddleware, setup_logging
-from connectors.whatsapp import get_router as get_whatsapp_router
+from connectors.calendar.mirror import configure_from_settings as configure_calendar_mirrors
+from connectors.calendar.mirror import mirrors as calendar_mirrors
+from connectors.calendar.provider import configure_from_settings as configure_calendar_providers
 from connectors.calendar.provider import get_calendar_provider
+from connectors.calendar.provider import registry as calendar_providers
+from connectors.calendar.slots import configure_from_settings as configure_slots
+from connectors.whatsapp import get_router as get_whatsapp_router
+from connectors.whatsapp.journal import MessageJournal
+from connectors.whatsapp.journal import from_settings as journal_from_settings
+
+
+async def _replay_journal(
+    journal: MessageJournal, queue: IngestionQueue, settings: Settings
+) -> None:
+    """Re-submit messages that were journaled but never processed before the last stop."""
+    pending = journal.pending()
+    if not pending:
+        return
+    logging.getLogger(__name__).info("journal_replay", extra={"messages": len(pending)})
+    for msg in pending:
+        if await queue.put(msg):
+            continue
+        try:
+            from agents.ingest import handle_inbound_message  # local import to avoid cycle
+
+            await handle_inbound_message(msg, settings)
+        except Exception as exc:  # noqa: BLE001
+            logging.getLogger(__name__).exception("agent ingestion failed: %s", exc)
+        finally:
+            journal.ack(msg.message_id)
 
 
 def create_app() -> FastAPI:
@@ -17,10 +62,70 @@ def create_app() -> FastAPI:
     @asynccontextmanager
     async def lifespan(_app: FastAPI):  # type: ignore
         logging.getLogger(__name__).info("service starting")
+        capabilities = configure_capabilities(settings)
+        configure_breakers(settings)
+        configure_extraction_cache(settings)
+        configure_slots(settings)
+        # Built once here (with its first token) and reused by every message
+        providers = configure_calendar_providers(settings)
+        providers.start(settings.google_creds_refresh_s)
+        mirrors = configure_calendar_mirrors(settings)
+        mirrors.start(settings.google_mirror_sync_s)
+        sessions = configure_sessions(settings)
+        if settings.session_snapshot_path:
+            load_snapshot(sessions, settings.session_snapshot_path)
+        sessions.start(settings.session_flush_interval_ms / 1000)
+        init_agents_client(settings)
+        probe_task = None
+        if settings.agent_capability_probe and settings.openai_api_key:
+            from agents.ingest import probe_model_capabilities  # local import to avoid cycle
+
+            # Runs in the background so a slow model does not delay startup
+            probe_task = asyncio.create_task(probe_model_capabilities(settings))
+        journal = journal_from_settings(settings)
+        if journal is not None:
+            journal.open()
+            journal.compact()
+            journal.start()
+        _app.state.journal = journal
+        on_done = None
+        if journal is not None:
+
+            def on_done(m):  # type: ignore[no-untyped-def]
+                # A coalesced message acks every message folded into it
+                for mid in m.ids():
+                    journal.ack(mid)
+
+        queue = ingestion_queue_from_settings(settings, on_done=on_done)
+        queue.start()
+        _app.state.ingestion_queue = queue
+        if journal is not None:
+            await _replay_journal(journal, queue, settings)
         try:
             yield
         finally:
             logging.getLogger(__name__).info("service stopping")
+            await queue.stop(timeout=settings.ingest_drain_timeout_s)
+            _app.state.ingestion_queue = None
+            if journal is not None:
+                await journal.stop()
+            _app.state.journal = None
+            # Queue is drained: write the last session changes out
+            await sessions.stop()
+            await mirrors.stop()
+            await providers.stop()
+            if settings.session_snapshot_path:
+                try:
+                    save_snapshot(sessions, settings.session_snapshot_path)
+                except Exception as exc:  # noqa: BLE001
+                    logging.getLogger(__name__).warning(
+                        "session_snapshot_failed", extra={"error": str(exc)}
+                    )
+            if probe_task is not None:
+                probe_task.cancel()
+                await asyncio.gather(probe_task, return_exceptions=True)
+            capabilities.save()
+            await close_agents_client()
 
     app = FastAPI(title="Mediflow API", version=settings.app_version, lifespan=lifespan)
 
@@ -36,13 +141,72 @@ def create_app() -> FastAPI:
         async def provider_info():  # type: ignore
             s = load_settings()
             provider = get_calendar_provider(s)
-            provider_name = provider.__class__.__name__ if provider else None
+            provider_name = provider.__class__.__name__ if provider is not None else None
             return {
                 "provider": provider_name,
                 "google_configured": bool(s.google_creds_json and s.google_calendar_id),
                 "calendar_id": s.google_calendar_id,
+                **calendar_providers.stats(),
             }
 
+        @app.post("/_debug/provider/reload")
+        async def provider_reload():  # type: ignore
+            # Picks up rotated credentials; the mirrors move to the new ones too
+            s = load_settings()
+            await asyncio.to_thread(calendar_providers.reload, s)
+            await asyncio.to_thread(calendar_providers.refresh)
+            configure_calendar_mirrors(s).start(s.google_mirror_sync_s)
+            return calendar_providers.stats()
+
+        @app.get("/_debug/agent-capabilities")
+        async def agent_capabilities():  # type: ignore
+            return {"model": settings.agent_model, "capabilities": capability_registry.snapshot()}
+
+        @app.get("/_debug/breakers")
+        async def breaker_stats():  # type: ignore
+            return {"deadline_s": settings.agent_deadline_s, "breakers": breakers.stats()}
+
+        @app.get("/_debug/routing")
+        async def routing():  # type: ignore
+            return {
+                "models": list(model_tiers(settings)),
+                **routing_stats.stats(),
+                "tokens_by_model": usage_tracker.stats()["by_model"],
+            }
+
+        @app.get("/_debug/calendar-mirror")
+        async def calendar_mirror_stats():  # type: ignore
+            return {"max_age_s": settings.google_mirror_max_age_s, **calendar_mirrors.stats()}
+
+        @app.get("/_debug/sessions")
+        async def session_stats():  # type: ignore
+            return session_store.stats()
+
+        @app.get("/_debug/locks")
+        async def lock_stats():  # type: ignore
+            return conversation_locks.stats()
+
+        @app.get("/_debug/extraction-cache")
+        async def extraction_cache_stats():  # type: ignore
+            return extraction_cache.stats()
+
+        @app.post("/_debug/extraction-cache/invalidate")
+        async def extraction_cache_invalidate():  # type: ignore
+            return {"invalidated": extraction_cache.invalidate()}
+
+        @app.get("/_debug/usage")
+        async def usage_stats():  # type: ignore
+            return {
+                "prompt_version": PROMPT_VERSION,
+                "static_prefix_chars": len(STATIC_PREFIX),
+                **usage_tracker.stats(),
+            }
+
+        @app.get("/_debug/usage/{waid}")
+        async def usage_for_conversation(waid: str):  # type: ignore
+            usage = usage_tracker.conversation(waid)
+            return usage.to_dict() if usage else {}
+
     # Health endpoint
     @app.get("/healthz")
     async def healthz():  # type: ignore
@@ -57,6 +221,7 @@ def create_app() -> FastAPI:
             "env": s.app_env,
             "time": now.isoformat(),
             "agents_configured": agents_configured,
+            "agent_breaker": breakers.get(s.agent_model).state,
         }
 
     return app
@@ -0,0 +1,55 @@
+"""
+Benchmark in-memory calendar availability checks as the number of events grows.
+
+Usage: python -m benchmarks.calendar_index [--sizes 100,1000,...] [--queries N]
+"""
+
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from connectors.calendar.inmemory import InMemoryCalendar
+
+T0 = datetime(2030, 1, 7, 8, 0, tzinfo=timezone.utc)
+
+
+def fill(cal: InMemoryCalendar, count: int) -> None:
+    # A busy practice: 30-minute appointments with gaps, in time order
+    t = T0
+    for _ in range(count):
+        cal.create_event(t, duration_min=30, title="rdv")
+        t += timedelta(minutes=random.choice((30, 45, 60, 90)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="100,1000,10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    for size in (int(s) for s in args.sizes.split(",")):
+        cal = InMemoryCalendar()
+        fill(cal, size)
+        horizon = size * 55
+        probes = [T0 + timedelta(minutes=random.randrange(horizon)) for _ in range(args.queries)]
+
+        def available() -> None:
+            for p in probes:
+                cal.is_available(p)
+
+        def alternatives() -> None:
+            for p in probes:
+                cal.suggest_alternatives(p)
+
+        avail_us = min(timeit.repeat(available, number=1, repeat=3)) / len(probes) * 1e6
+        alt_us = min(timeit.repeat(alternatives, number=1, repeat=3)) / len(probes) * 1e6
+        print(
+            f"{size:>8} events: is_available {avail_us:5.2f} µs,"
+            f" suggest_alternatives {alt_us:6.2f} µs"
+        )
+
+
+if __name__ == "__main__":
+    main()
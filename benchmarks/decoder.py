@@ -0,0 +1,41 @@
+"""
+Benchmark the model-output decoder on the messy-output corpus.
+
+Usage: python -m benchmarks.decoder [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import timeit
+
+from agents.decoder import decode_extraction
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "model_outputs.jsonl")
+
+
+def load_corpus(path: str = CORPUS) -> list:
+    with open(path, "r", encoding="utf-8") as fh:
+        return [json.loads(line)["raw"] for line in fh if line.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    clean = [raw for raw in corpus if raw.startswith("{") and raw.endswith("}")]
+
+    def run(samples: list) -> None:
+        for raw in samples:
+            decode_extraction(raw)
+
+    for label, samples in (("all", corpus), ("clean", clean)):
+        seconds = min(timeit.repeat(lambda: run(samples), number=args.repeat, repeat=3))
+        per_call_us = seconds / (args.repeat * len(samples)) * 1e6
+        print(f"{label:>5}: {len(samples):3d} outputs, {per_call_us:6.2f} µs/output")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark writing and restoring a session snapshot at a given store size.
+
+Usage: python -m benchmarks.session_snapshot [--sessions N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from agents.session import InMemorySessionStore, SessionState
+from agents.session_snapshot import load_snapshot, save_snapshot
+
+
+def fill(store: InMemorySessionStore, count: int) -> None:
+    for i in range(count):
+        waid = f"+3247{i:07d}"
+        state = SessionState(from_waid=waid, name=f"Patient {i}", reason="contrôle")
+        if i % 3 == 0:
+            state.preferred_time = "mardi 10h"
+            state.pending_alternatives = ["2030-01-01T10:00:00+01:00", "2030-01-01T11:00:00+01:00"]
+            state.pending_duration_min = 30
+        store.put(state)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    args = parser.parse_args()
+
+    src = InMemorySessionStore(capacity=args.sessions)
+    fill(src, args.sessions)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.snap")
+        started = time.perf_counter()
+        save_snapshot(src, path)
+        save_ms = (time.perf_counter() - started) * 1000
+        size = os.path.getsize(path)
+        dst = InMemorySessionStore(capacity=args.sessions)
+        started = time.perf_counter()
+        load_snapshot(dst, path)
+        load_ms = (time.perf_counter() - started) * 1000
+    print(
+        f"{args.sessions} sessions: save {save_ms:.0f} ms, load {load_ms:.0f} ms, "
+        f"{size / 1024:.0f} KiB ({size / args.sessions:.1f} B/session)"
+    )
+
+
+if __name__ == "__main__":
+    main()
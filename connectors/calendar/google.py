@@ -1,5 +1,3 @@
-from __future__ import annotations
-
 """
 Google Calendar provider (optional).
 
@@ -11,12 +9,23 @@ Required packages (install when using this provider):
   pip install google-api-python-client google-auth
 """
 
-from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.config import Settings
+from connectors.calendar import slots
 from connectors.calendar.base import CalendarEvent, CalendarProvider
+from connectors.calendar.intervals import IntervalIndex
+from connectors.calendar.mirror import mirrors
+
+logger = logging.getLogger(__name__)
 
 
 def _import_google() -> Optional[Dict[str, Any]]:
@@ -37,8 +46,6 @@ def _load_credentials(settings: Settings):
     # 1) Base64-encoded JSON
     if getattr(settings, "google_creds_json_b64", None):
         try:
-            import base64, json
-
             decoded = base64.b64decode(settings.google_creds_json_b64.encode("utf-8")).decode("utf-8")
             data = json.loads(decoded)
             return SACredentials.from_service_account_info(
@@ -53,8 +60,6 @@ def _load_credentials(settings: Settings):
         return None
     # 2) Inline JSON string
     if raw.strip().startswith("{"):
-        import json
-
         data = json.loads(raw)
         return SACredentials.from_service_account_info(
             data, scopes=["https://www.googleapis.com/auth/calendar"]
@@ -65,51 +70,171 @@ def _load_credentials(settings: Settings):
     )
 
 
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+_Interval = Tuple[datetime, datetime]
+
+# A FreeBusy answer is reused this long for the same search window, so the
+# availability check and the alternatives of one booking turn share one query
+_FREEBUSY_REUSE_S = 10.0
+
+# Access tokens are refreshed ahead of time once they expire within this margin
+_TOKEN_REFRESH_MARGIN = timedelta(minutes=10)
+
+
+def load_credentials(settings: Settings) -> Any:
+    """Service-account credentials for the Calendar scope; raises when unavailable."""
+    if _import_google() is None:
+        raise RuntimeError("Google libraries not installed")
+    creds = _load_credentials(settings)
+    if creds is None:
+        raise RuntimeError("Google credentials not configured")
+    return creds
+
+
+def build_service(settings: Settings, credentials: Any = None) -> Any:
+    """Calendar API v3 client for the configured service account."""
+    g = _import_google()
+    if g is None:
+        raise RuntimeError("Google libraries not installed")
+    creds = credentials if credentials is not None else load_credentials(settings)
+    return g["build"]("calendar", "v3", credentials=creds)
+
+
+def _auth_request() -> Any:
+    # The transport googleapiclient itself depends on
+    import google_auth_httplib2  # type: ignore
+    import httplib2  # type: ignore
+
+    return google_auth_httplib2.Request(httplib2.Http())
+
+
+def _authorized_http(credentials: Any) -> Any:
+    """A connection of its own, authorized with `credentials`, for one thread."""
+    import google_auth_httplib2  # type: ignore
+    import httplib2  # type: ignore
+
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+
+
 class GoogleCalendarProvider(CalendarProvider):
-    def __init__(self, settings: Settings) -> None:
-        g = _import_google()
-        if g is None:
-            raise RuntimeError("Google libraries not installed")
-        creds = _load_credentials(settings)
-        if creds is None:
-            raise RuntimeError("Google credentials not configured")
-        self._build = g["build"]
-        self._service = self._build("calendar", "v3", credentials=creds)
+    def __init__(
+        self, settings: Settings, *, service: Any = None, credentials: Any = None
+    ) -> None:
+        if service is None:
+            credentials = credentials if credentials is not None else load_credentials(settings)
+            service = build_service(settings, credentials)
+        self._service = service
+        self.credentials = credentials
         self._calendar_id = settings.google_calendar_id or "primary"
+        # Other calendars whose busy time also blocks a slot (e.g. a practitioner's own)
+        self._busy_calendar_ids = list(
+            dict.fromkeys([self._calendar_id, *settings.google_busy_calendar_ids])
+        )
         self._tz = settings.clinic_tz or "Europe/Brussels"
+        self._mirror_max_age_s = settings.google_mirror_max_age_s
+        self._clock = time.monotonic
+        self._lock = threading.Lock()
+        # (window, fetched at, busy intervals) of the last FreeBusy query
+        self._freebusy: Optional[Tuple[_Interval, float, IntervalIndex[_Interval]]] = None
+        self.freebusy_queries = 0
+        # The client's connection (httplib2) is not thread-safe, and lookups run from
+        # worker threads while bookings run on the loop: every thread gets a connection
+        # of its own, or, for a client given without credentials, calls take turns
+        self._local = threading.local()
+        self._execute_lock = threading.Lock()
 
-    def _overlaps(self, start: datetime, end: datetime) -> bool:
-        # Query events within [start, end)
-        events = (
-            self._service.events()
-            .list(
-                calendarId=self._calendar_id,
-                timeMin=start.isoformat(),
-                timeMax=end.isoformat(),
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-            .get("items", [])
-        )
-        return len(events) > 0
+    def _execute(self, request: Any) -> Any:
+        if self.credentials is None:
+            with self._execute_lock:
+                return request.execute()
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = _authorized_http(self.credentials)
+        return request.execute(http=http)
+
+    def refresh_credentials(self, request: Any = None) -> bool:
+        """Fetch a new access token if the current one is missing or about to expire.
+
+        Run from the background so no patient message waits on the token
+        exchange; returns whether a refresh happened.
+        """
+        creds = self.credentials
+        if creds is None:
+            return False
+        # google-auth keeps `expiry` as naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        expiry = getattr(creds, "expiry", None)
+        if getattr(creds, "token", None) and expiry is not None:
+            if expiry - now > _TOKEN_REFRESH_MARGIN:
+                return False
+        creds.refresh(request if request is not None else _auth_request())
+        return True
+
+    def _query_freebusy(self, start: datetime, end: datetime) -> IntervalIndex[_Interval]:
+        """Busy intervals of every configured calendar in [start, end), in one request."""
+        body = {
+            "timeMin": start.isoformat(),
+            "timeMax": end.isoformat(),
+            "timeZone": self._tz,
+            "items": [{"id": cid} for cid in self._busy_calendar_ids],
+        }
+        resp = self._execute(self._service.freebusy().query(body=body))
+        self.freebusy_queries += 1
+        index: IntervalIndex[_Interval] = IntervalIndex()
+        for cid in self._busy_calendar_ids:
+            entry = (resp.get("calendars") or {}).get(cid) or {}
+            if entry.get("errors"):
+                reasons = [e.get("reason") for e in entry["errors"]]
+                if cid == self._calendar_id:
+                    # Without the booking calendar nothing can be said about availability
+                    raise RuntimeError(f"freebusy failed for {cid}: {reasons}")
+                logger.warning(
+                    "calendar_freebusy_error", extra={"calendar": cid, "reasons": reasons}
+                )
+                continue
+            for busy in entry.get("busy", []):
+                interval = (_parse_time(busy["start"]), _parse_time(busy["end"]))
+                index.add(*interval, interval)
+        return index
+
+    def _busy_index(self, start: datetime) -> IntervalIndex[_Interval]:
+        window = slots.finder.window(start)
+        with self._lock:
+            cached = self._freebusy
+            if (
+                cached is not None
+                and cached[0] == window
+                and self._clock() - cached[1] < _FREEBUSY_REUSE_S
+            ):
+                return cached[2]
+        index = self._query_freebusy(*window)
+        with self._lock:
+            self._freebusy = (window, self._clock(), index)
+        return index
+
+    def _mirrored(self, start: datetime, end: datetime) -> Optional[List[_Interval]]:
+        return mirrors.busy(self._busy_calendar_ids, start, end, max_age_s=self._mirror_max_age_s)
 
     def is_available(self, start: datetime, duration_min: int = 30) -> bool:
         end = start + timedelta(minutes=duration_min)
-        return not self._overlaps(start, end)
+        busy = self._mirrored(start, end)
+        if busy is not None:
+            return not busy
+        index = self._busy_index(start)
+        with self._lock:
+            return not index.overlaps(start, end)
 
     def suggest_alternatives(self, start: datetime, *, duration_min: int = 30, count: int = 2):
-        # Try +60m, +120m, next day same hour
-        from datetime import timedelta
-
-        candidates = [start + timedelta(minutes=60), start + timedelta(minutes=120), start + timedelta(days=1)]
-        out = []
-        for c in candidates:
-            if self.is_available(c, duration_min=duration_min):
-                out.append(c)
-            if len(out) >= count:
-                break
-        return out
+        window_start, window_end = slots.finder.window(start)
+        busy = self._mirrored(window_start, window_end)
+        if busy is None:
+            index = self._busy_index(start)
+            with self._lock:
+                busy = index.overlapping(window_start, window_end)
+        return slots.finder.nearest(start, busy, duration_min=duration_min, count=count)
 
     def create_event(
         self,
@@ -134,7 +259,13 @@ class GoogleCalendarProvider(CalendarProvider):
                 }
             },
         }
-        evt = self._service.events().insert(calendarId=self._calendar_id, body=body).execute()
+        evt = self._execute(self._service.events().insert(calendarId=self._calendar_id, body=body))
+        with self._lock:
+            cached = self._freebusy
+            if cached is not None and cached[0][0] <= start < cached[0][1]:
+                # Keep a reused FreeBusy answer in step with our own booking
+                cached[2].add(start, end, (start, end))
+        mirrors.record(self._calendar_id, evt.get("id", ""), start, end)
         return CalendarEvent(
             id=evt.get("id", ""),
             start=start,
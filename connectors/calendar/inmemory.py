@@ -1,27 +1,44 @@
 from __future__ import annotations
 
-import itertools
+import threading
 import uuid
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
 
+from connectors.calendar import slots
 from connectors.calendar.base import CalendarEvent, CalendarProvider
+from connectors.calendar.intervals import IntervalIndex
 
 
 class InMemoryCalendar(CalendarProvider):
     """Simple in-memory calendar for dev/test.
 
-    Not thread-safe and not persistent. Good enough for local E2E.
+    Not persistent. Events are kept in an interval index, so an availability
+    check bisects to the few events near the asked time instead of scanning
+    them all.
     """
 
     def __init__(self) -> None:
-        self._events: List[CalendarEvent] = []
+        self._lock = threading.Lock()
+        self._index: IntervalIndex[CalendarEvent] = IntervalIndex()
+        self._by_id: Dict[str, CalendarEvent] = {}
 
     def _overlaps(self, start: datetime, end: datetime) -> bool:
-        for e in self._events:
-            if not (end <= e.start or start >= e.end):
-                return True
-        return False
+        with self._lock:
+            return self._index.overlaps(start, end)
+
+    def list_events(self, start: datetime, end: datetime) -> List[CalendarEvent]:
+        """Events overlapping `[start, end)`, ordered by start."""
+        with self._lock:
+            return self._index.overlapping(start, end)
+
+    def delete_event(self, event_id: str) -> bool:
+        with self._lock:
+            evt = self._by_id.pop(event_id, None)
+            return evt is not None and self._index.remove(evt.start, evt)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
 
     def is_available(self, start: datetime, duration_min: int = 30) -> bool:
         end = start + timedelta(minutes=duration_min)
@@ -30,22 +47,10 @@ class InMemoryCalendar(CalendarProvider):
     def suggest_alternatives(
         self, start: datetime, *, duration_min: int = 30, count: int = 2
     ) -> List[datetime]:
-        """Return up to `count` alternative start times near the requested one.
-
-        Strategy: try +60m, +120m, next day at same hour, then next day +60m, etc.
-        """
-        candidates: List[datetime] = []
-        base = start
-        deltas = [60, 120, 24 * 60, 24 * 60 + 60, 24 * 60 + 120, 2 * 24 * 60]
-        for minutes in deltas:
-            candidates.append(base + timedelta(minutes=minutes))
-        out: List[datetime] = []
-        for c in candidates:
-            if self.is_available(c, duration_min=duration_min):
-                out.append(c)
-            if len(out) >= count:
-                break
-        return out
+        """Return up to `count` free start times nearest to the requested one."""
+        window_start, window_end = slots.finder.window(start)
+        busy = [(e.start, e.end) for e in self.list_events(window_start, window_end)]
+        return slots.finder.nearest(start, busy, duration_min=duration_min, count=count)
 
     def create_event(
         self,
@@ -67,7 +72,9 @@ class InMemoryCalendar(CalendarProvider):
             patient_phone=patient_phone,
             patient_name=patient_name,
         )
-        self._events.append(evt)
+        with self._lock:
+            self._index.add(evt.start, evt.end, evt)
+            self._by_id[evt.id] = evt
         return evt
 
 
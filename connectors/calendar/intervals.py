@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import datetime
+from typing import Generic, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def _key(dt: datetime) -> float:
+    return dt.timestamp()
+
+
+class IntervalIndex(Generic[T]):
+    """Half-open `[start, end)` intervals kept sorted by start, with a payload each.
+
+    Lookups bisect on the start times. Every interval overlapping `[a, b)`
+    starts in `[a - longest, b)`, where `longest` is the longest interval
+    currently stored, so a query costs O(log n + k), k being the number of
+    intervals starting in that slice. `add` and `remove` bisect too, but
+    shifting the parallel lists makes them O(n) memory moves; at calendar
+    sizes that is a fast memmove, far below the cost of a linear scan.
+    """
+
+    def __init__(self) -> None:
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+        self._items: List[T] = []
+        # How many stored intervals have each length, so `_longest` can shrink on removal
+        self._lengths: Counter[float] = Counter()
+        self._longest = 0.0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, start: datetime, end: datetime, item: T) -> None:
+        s, e = _key(start), _key(end)
+        # bisect_right keeps insertion order among equal starts; adding in time order appends
+        i = bisect_right(self._starts, s)
+        self._starts.insert(i, s)
+        self._ends.insert(i, e)
+        self._items.insert(i, item)
+        self._lengths[e - s] += 1
+        if e - s > self._longest:
+            self._longest = e - s
+
+    def remove(self, start: datetime, item: T) -> bool:
+        """Remove `item` stored at `start`; returns False if it is not there."""
+        s = _key(start)
+        i = bisect_left(self._starts, s)
+        while i < len(self._starts) and self._starts[i] == s:
+            if self._items[i] is item or self._items[i] == item:
+                self._forget_length(self._ends[i] - s)
+                del self._starts[i], self._ends[i], self._items[i]
+                return True
+            i += 1
+        return False
+
+    def _forget_length(self, length: float) -> None:
+        self._lengths[length] -= 1
+        if self._lengths[length] <= 0:
+            del self._lengths[length]
+            if length >= self._longest:
+                # Few distinct lengths (appointment types), so this max is cheap
+                self._longest = max(self._lengths, default=0.0)
+
+    def clear(self) -> None:
+        self._starts.clear()
+        self._ends.clear()
+        self._items.clear()
+        self._lengths.clear()
+        self._longest = 0.0
+
+    def _window(self, start: datetime, end: datetime) -> Tuple[float, int, int]:
+        s = _key(start)
+        lo = bisect_left(self._starts, s - self._longest)
+        hi = bisect_left(self._starts, _key(end))
+        return s, lo, hi
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        s, lo, hi = self._window(start, end)
+        ends = self._ends
+        for i in range(lo, hi):
+            if ends[i] > s:
+                return True
+        return False
+
+    def overlapping(self, start: datetime, end: datetime) -> List[T]:
+        """Items overlapping `[start, end)`, ordered by start."""
+        s, lo, hi = self._window(start, end)
+        ends, items = self._ends, self._items
+        return [items[i] for i in range(lo, hi) if ends[i] > s]
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(list(self._items))
@@ -0,0 +1,304 @@
+"""
+Local mirror of Google calendars, kept fresh by incremental sync.
+
+A full sync lists the events from yesterday to `weeks` ahead and keeps the
+`nextSyncToken`; each later sync asks Google only for what changed since
+that token. Availability can then be answered from memory. A caller checks
+`busy()`, which returns None whenever the mirror cannot be trusted (never
+synced, older than the allowed age, or not covering the asked range), and
+then falls back to a live query.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from datetime import time as dt_time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config import Settings
+from connectors.calendar.intervals import IntervalIndex
+
+logger = logging.getLogger(__name__)
+
+_Interval = Tuple[datetime, datetime]
+
+# Resync from scratch once the mirrored span ends less than this far ahead
+_HORIZON_SLACK = timedelta(days=1)
+
+
+def event_interval(item: Dict[str, Any], tzinfo: Any) -> Optional[_Interval]:
+    """(start, end) of an events.list item; all-day events span their local dates."""
+    bounds = []
+    for key in ("start", "end"):
+        value = item.get(key) or {}
+        if value.get("dateTime"):
+            bounds.append(datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")))
+        elif value.get("date"):
+            day = date.fromisoformat(value["date"])
+            bounds.append(datetime.combine(day, dt_time(0), tzinfo=tzinfo))
+        else:
+            return None
+    return bounds[0], bounds[1]
+
+
+def _http_status(exc: Exception) -> Optional[int]:
+    # googleapiclient.errors.HttpError carries the response; avoid importing it here
+    status = getattr(getattr(exc, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CalendarMirror:
+    """Busy intervals of one calendar, from yesterday to `weeks` ahead."""
+
+    def __init__(
+        self,
+        service: Any,
+        calendar_id: str,
+        *,
+        weeks: int = 4,
+        tzinfo: Any = timezone.utc,
+        clock: Callable[[], float] = time.monotonic,
+        now: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+    ) -> None:
+        self.calendar_id = calendar_id
+        self._service = service
+        self._span = timedelta(weeks=weeks)
+        self._tzinfo = tzinfo
+        self._clock = clock
+        self._now = now
+        self._lock = threading.Lock()
+        self._index: IntervalIndex[_Interval] = IntervalIndex()
+        self._by_id: Dict[str, _Interval] = {}
+        # Events recorded locally while a full sync is listing, re-applied after it
+        self._recorded: Dict[str, _Interval] = {}
+        self._token: Optional[str] = None
+        self._covers: Optional[_Interval] = None
+        self._synced_at: Optional[float] = None
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self.changes = 0
+
+    # --- sync ----------------------------------------------------------
+    def sync(self) -> None:
+        """Bring the mirror up to date (incrementally when possible); raises on API errors."""
+        now = self._now()
+        covers = self._covers
+        if self._token is None or covers is None or covers[1] - now < _HORIZON_SLACK:
+            self._full_sync(now)
+            return
+        try:
+            self._incremental_sync()
+        except Exception as exc:  # noqa: BLE001
+            if _http_status(exc) != 410:
+                raise
+            # Sync token expired (410 Gone): start over
+            logger.info("calendar_mirror_token_expired", extra={"calendar": self.calendar_id})
+            self._full_sync(now)
+
+    def _pages(self, **params: Any) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        items: List[Dict[str, Any]] = []
+        page_token = None
+        while True:
+            resp = (
+                self._service.events()
+                .list(
+                    calendarId=self.calendar_id, singleEvents=True, pageToken=page_token, **params
+                )
+                .execute()
+            )
+            items.extend(resp.get("items", []))
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                return items, resp.get("nextSyncToken")
+
+    def _full_sync(self, now: datetime) -> None:
+        start, end = now - timedelta(days=1), now + self._span
+        with self._lock:
+            self._recorded.clear()
+        items, token = self._pages(timeMin=start.isoformat(), timeMax=end.isoformat())
+        index: IntervalIndex[_Interval] = IntervalIndex()
+        by_id: Dict[str, _Interval] = {}
+        for item in items:
+            interval = self._busy_interval(item)
+            if interval is not None:
+                index.add(*interval, interval)
+                by_id[item["id"]] = interval
+        with self._lock:
+            for event_id, interval in self._recorded.items():
+                if event_id not in by_id:
+                    index.add(*interval, interval)
+                    by_id[event_id] = interval
+            self._recorded.clear()
+            self._index, self._by_id = index, by_id
+            self._token = token
+            self._covers = (start, end)
+            self._synced_at = self._clock()
+        self.full_syncs += 1
+        logger.info(
+            "calendar_mirror_full_sync", extra={"calendar": self.calendar_id, "events": len(by_id)}
+        )
+
+    def _incremental_sync(self) -> None:
+        items, token = self._pages(syncToken=self._token)
+        with self._lock:
+            for item in items:
+                self._apply_locked(item["id"], self._busy_interval(item))
+            self._token = token or self._token
+            self._synced_at = self._clock()
+        self.incremental_syncs += 1
+        self.changes += len(items)
+
+    def _busy_interval(self, item: Dict[str, Any]) -> Optional[_Interval]:
+        # Cancelled events and events marked "free" do not block a slot
+        if item.get("status") == "cancelled" or item.get("transparency") == "transparent":
+            return None
+        return event_interval(item, self._tzinfo)
+
+    def _apply_locked(self, event_id: str, interval: Optional[_Interval]) -> None:
+        old = self._by_id.pop(event_id, None)
+        if old is not None:
+            self._index.remove(old[0], old)
+        if interval is not None:
+            self._index.add(*interval, interval)
+            self._by_id[event_id] = interval
+
+    def record(self, event_id: str, start: datetime, end: datetime) -> None:
+        """Reflect an event we just created, ahead of the next sync."""
+        with self._lock:
+            self._apply_locked(event_id, (start, end))
+            self._recorded[event_id] = (start, end)
+
+    # --- queries -------------------------------------------------------
+    def age(self) -> float:
+        synced_at = self._synced_at
+        return math.inf if synced_at is None else self._clock() - synced_at
+
+    def busy(
+        self, start: datetime, end: datetime, *, max_age_s: float
+    ) -> Optional[List[_Interval]]:
+        """Busy intervals overlapping [start, end), or None if the mirror can't answer."""
+        with self._lock:
+            covers = self._covers
+            if covers is None or self.age() > max_age_s:
+                return None
+            if start < covers[0] or end > covers[1]:
+                return None
+            return self._index.overlapping(start, end)
+
+    def stats(self) -> Dict[str, Any]:
+        age = self.age()
+        return {
+            "events": len(self._by_id),
+            "age_s": None if math.isinf(age) else round(age, 1),
+            "covers": [c.isoformat() for c in self._covers] if self._covers else None,
+            "full_syncs": self.full_syncs,
+            "incremental_syncs": self.incremental_syncs,
+            "changes": self.changes,
+        }
+
+
+class MirrorSet:
+    """The mirrors of every calendar that blocks a slot, synced in the background."""
+
+    def __init__(self) -> None:
+        self._mirrors: Dict[str, CalendarMirror] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.hits = 0
+        self.misses = 0
+        self.sync_errors = 0
+
+    def configure(self, mirrors: Sequence[CalendarMirror]) -> None:
+        self._mirrors = {m.calendar_id: m for m in mirrors}
+        self.hits = self.misses = self.sync_errors = 0
+
+    def get(self, calendar_id: str) -> Optional[CalendarMirror]:
+        return self._mirrors.get(calendar_id)
+
+    def busy(
+        self, calendar_ids: Sequence[str], start: datetime, end: datetime, *, max_age_s: float
+    ) -> Optional[List[_Interval]]:
+        """Busy intervals of all `calendar_ids`, or None unless every mirror can answer."""
+        if not self._mirrors:
+            return None
+        out: List[_Interval] = []
+        for cid in calendar_ids:
+            mirror = self._mirrors.get(cid)
+            busy = mirror.busy(start, end, max_age_s=max_age_s) if mirror is not None else None
+            if busy is None:
+                self.misses += 1
+                return None
+            out.extend(busy)
+        self.hits += 1
+        return out
+
+    def record(self, calendar_id: str, event_id: str, start: datetime, end: datetime) -> None:
+        mirror = self._mirrors.get(calendar_id)
+        if mirror is not None:
+            mirror.record(event_id, start, end)
+
+    def sync(self) -> None:
+        for mirror in list(self._mirrors.values()):
+            try:
+                mirror.sync()
+            except Exception as exc:  # noqa: BLE001
+                self.sync_errors += 1
+                logger.warning(
+                    "calendar_mirror_sync_failed",
+                    extra={"calendar": mirror.calendar_id, "error": str(exc)},
+                )
+
+    async def _sync_loop(self, interval_s: float) -> None:
+        while True:
+            await asyncio.to_thread(self.sync)
+            await asyncio.sleep(interval_s)
+
+    def start(self, interval_s: float) -> None:
+        if self._mirrors and self._task is None:
+            self._task = asyncio.create_task(self._sync_loop(interval_s), name="calendar-mirror")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "sync_errors": self.sync_errors,
+            "calendars": {cid: m.stats() for cid, m in self._mirrors.items()},
+        }
+
+
+mirrors = MirrorSet()
+
+
+def configure_from_settings(settings: Settings) -> MirrorSet:
+    from zoneinfo import ZoneInfo
+
+    from connectors.calendar.google import build_service  # local import to avoid cycle
+    from connectors.calendar.provider import registry as providers
+
+    mirrors.configure([])
+    # Shares the provider's credentials, so the background token refresh covers both
+    credentials = providers.credentials()
+    if settings.google_mirror_weeks <= 0 or credentials is None:
+        return mirrors
+    try:
+        # A client of its own: the sync thread and booking turns must not share one connection
+        service = build_service(settings, credentials)
+    except Exception as exc:  # noqa: BLE001
+        logger.info("calendar_mirror_unavailable", extra={"error": str(exc)})
+        return mirrors
+    tzinfo = ZoneInfo(settings.clinic_tz or "Europe/Brussels")
+    ids = dict.fromkeys([settings.google_calendar_id, *settings.google_busy_calendar_ids])
+    weeks = settings.google_mirror_weeks
+    mirrors.configure([CalendarMirror(service, cid, weeks=weeks, tzinfo=tzinfo) for cid in ids])
+    return mirrors
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import Optional
-
+import asyncio
 import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
 
 from app.config import Settings
 from connectors.calendar.base import CalendarProvider
@@ -14,7 +15,8 @@ def _try_google_provider(settings: Settings):
     try:
         from connectors.calendar.google import GoogleCalendarProvider  # type: ignore
 
-        if settings.google_creds_json and settings.google_calendar_id:
+        has_creds = bool(settings.google_creds_json or settings.google_creds_json_b64)
+        if has_creds and settings.google_calendar_id:
             try:
                 provider = GoogleCalendarProvider(settings)
                 logger.info("calendar_provider", extra={"provider": "google"})
@@ -28,15 +30,136 @@ def _try_google_provider(settings: Settings):
     return None
 
 
-def get_calendar_provider(settings: Settings) -> Optional[CalendarProvider]:
-    """Return a calendar provider based on configuration.
-
-    - If Google credentials are present, a Google provider could be returned (future).
-    - Otherwise, return an in-memory provider for dev/test to complete the flow.
-    """
+def _build_provider(settings: Settings) -> CalendarProvider:
     # Prefer Google provider if configured and available, else fallback to in-memory dev provider.
     gp = _try_google_provider(settings)
     if gp is not None:
         return gp
     logger.info("calendar_provider", extra={"provider": "inmemory"})
     return inmemory_store
+
+
+def _config_key(settings: Settings) -> Tuple[Any, ...]:
+    # Everything a provider is built from; a different value means a different provider
+    return (
+        settings.google_creds_json,
+        settings.google_creds_json_b64,
+        settings.google_calendar_id,
+        settings.google_busy_calendar_ids,
+        settings.clinic_tz,
+        settings.google_mirror_max_age_s,
+    )
+
+
+class ProviderRegistry:
+    """The calendar provider of the process, built once and reused by every message.
+
+    Building the Google provider decodes the service-account key and builds
+    the API client, which is too slow to repeat per message. The instance is
+    kept until the calendar settings change or `reload` is called, and its
+    access token is refreshed in the background.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._provider: Optional[CalendarProvider] = None
+        self._key: Optional[Tuple[Any, ...]] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.builds = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def get(self, settings: Settings) -> CalendarProvider:
+        key = _config_key(settings)
+        provider = self._provider
+        if provider is not None and self._key == key:
+            return provider
+        with self._lock:
+            # Another thread may have built it while we waited
+            if self._provider is None or self._key != key:
+                self._provider, self._key = _build_provider(settings), key
+                self.builds += 1
+            return self._provider
+
+    def reload(self, settings: Settings) -> CalendarProvider:
+        """Drop the cached provider and build a new one (e.g. after rotating credentials)."""
+        with self._lock:
+            self._provider, self._key = None, None
+        return self.get(settings)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._provider, self._key = None, None
+            self.builds = self.refreshes = self.refresh_errors = 0
+
+    def credentials(self) -> Any:
+        return getattr(self._provider, "credentials", None)
+
+    def refresh(self) -> bool:
+        """Refresh the provider's access token if it is about to expire; never raises."""
+        provider = self._provider
+        refresh = getattr(provider, "refresh_credentials", None)
+        if refresh is None:
+            return False
+        try:
+            refreshed = bool(refresh())
+        except Exception as exc:  # noqa: BLE001
+            self.refresh_errors += 1
+            logger.warning("calendar_credentials_refresh_failed", extra={"error": str(exc)})
+            return False
+        if refreshed:
+            self.refreshes += 1
+        return refreshed
+
+    def warm_up(self, settings: Settings) -> CalendarProvider:
+        """Build the provider and fetch a first token so the first message pays for neither."""
+        provider = self.get(settings)
+        self.refresh()
+        return provider
+
+    async def _refresh_loop(self, interval_s: float) -> None:
+        while True:
+            await asyncio.sleep(interval_s)
+            await asyncio.to_thread(self.refresh)
+
+    def start(self, interval_s: float) -> None:
+        if interval_s > 0 and self._task is None and self.credentials() is not None:
+            self._task = asyncio.create_task(
+                self._refresh_loop(interval_s), name="calendar-credentials"
+            )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        creds = self.credentials()
+        expiry = getattr(creds, "expiry", None)
+        return {
+            "provider": type(self._provider).__name__ if self._provider is not None else None,
+            "builds": self.builds,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "token_expiry": expiry.isoformat() if expiry is not None else None,
+        }
+
+
+registry = ProviderRegistry()
+
+
+def configure_from_settings(settings: Settings) -> ProviderRegistry:
+    """Build (or rebuild) the provider at startup and fetch its first token."""
+    registry.clear()
+    registry.warm_up(settings)
+    return registry
+
+
+def get_calendar_provider(settings: Settings) -> Optional[CalendarProvider]:
+    """Return the process-wide calendar provider for this configuration.
+
+    - If Google credentials are present and the libraries installed, the Google provider.
+    - Otherwise, the in-memory provider for dev/test to complete the flow.
+    """
+    return registry.get(settings)
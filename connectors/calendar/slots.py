@@ -0,0 +1,188 @@
+"""
+Free-slot search for alternative appointment times.
+
+The search window (a few days from the requested date) is cut into slots of
+`granularity_min` minutes. One occupancy bitmap marks the slots that are
+outside opening hours (breaks are the gaps between a day's ranges) or
+overlap a busy interval. A slot can start an appointment when the following
+`ceil(duration / granularity)` slots are all free. The free starts nearest to
+the requested time are returned.
+
+The bitmap is a `bytearray` filled with slice assignments; a week of
+15-minute slots is 672 cells, small enough that one pass over it is cheap.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOURS = "mon-fri 09:00-12:30,13:30-18:00"
+
+_DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_RANGE_RE = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$")
+
+# Opening ranges per weekday (0 = Monday), as minutes since local midnight
+_Ranges = Tuple[Tuple[int, int], ...]
+
+
+def parse_hours(spec: Optional[str]) -> Dict[int, _Ranges]:
+    """Parse e.g. `"mon-fri 09:00-12:30,13:30-18:00; sat 09:00-12:00"`.
+
+    Days not listed are closed. An empty spec means open around the clock.
+    Raises ValueError on malformed input.
+    """
+    if not spec or not spec.strip():
+        return {d: ((0, 24 * 60),) for d in range(7)}
+    out: Dict[int, _Ranges] = {}
+    for part in spec.split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        days_s, _, ranges_s = part.partition(" ")
+        days = _parse_days(days_s.lower())
+        ranges: List[Tuple[int, int]] = []
+        for r in ranges_s.replace(" ", "").split(","):
+            m = _RANGE_RE.match(r)
+            if not m:
+                raise ValueError(f"bad time range {r!r} in {part!r}")
+            h1, m1, h2, m2 = (int(g) for g in m.groups())
+            start, end = h1 * 60 + m1, h2 * 60 + m2
+            if not (0 <= start < end <= 24 * 60) or m1 > 59 or m2 > 59:
+                raise ValueError(f"bad time range {r!r} in {part!r}")
+            ranges.append((start, end))
+        for d in days:
+            out[d] = tuple(sorted(out.get(d, ()) + tuple(ranges)))
+    return out
+
+
+def _parse_days(spec: str) -> List[int]:
+    days: List[int] = []
+    for item in spec.split(","):
+        first, _, last = item.partition("-")
+        if first not in _DAYS or (last and last not in _DAYS):
+            raise ValueError(f"bad day {item!r}")
+        a = _DAYS.index(first)
+        b = _DAYS.index(last) if last else a
+        days.extend(range(a, b + 1) if a <= b else [*range(a, 7), *range(0, b + 1)])
+    return days
+
+
+@dataclass
+class SlotFinder:
+    """Nearest free appointment starts within opening hours, in the clinic's timezone."""
+
+    hours: Dict[int, _Ranges] = field(default_factory=lambda: parse_hours(DEFAULT_HOURS))
+    tz: str = "Europe/Brussels"
+    granularity_min: int = 15
+    search_days: int = 7
+    clock: Callable[[], datetime] = field(default=lambda: datetime.now(timezone.utc), repr=False)
+
+    def window(self, requested: datetime) -> Tuple[datetime, datetime]:
+        """The span searched around `requested`: its local day and the following days."""
+        tzinfo = ZoneInfo(self.tz)
+        day = requested.astimezone(tzinfo).date()
+        end = day + timedelta(days=self.search_days)
+        return self._midnight(day, tzinfo), self._midnight(end, tzinfo)
+
+    @staticmethod
+    def _midnight(day: date, tzinfo: ZoneInfo) -> datetime:
+        return datetime.combine(day, time(0), tzinfo=tzinfo)
+
+    def nearest(
+        self,
+        requested: datetime,
+        busy: Iterable[Tuple[datetime, datetime]],
+        *,
+        duration_min: int = 30,
+        count: int = 2,
+    ) -> List[datetime]:
+        """Up to `count` free future start times in the window, nearest to `requested` first."""
+        tzinfo = ZoneInfo(self.tz)
+        origin, end = self.window(requested)
+        step = self.granularity_min * 60
+        origin_ts = origin.timestamp()
+        n = math.ceil((end.timestamp() - origin_ts) / step)
+
+        def index(dt: datetime, rounding) -> int:  # type: ignore[no-untyped-def]
+            return min(n, max(0, int(rounding((dt.timestamp() - origin_ts) / step))))
+
+        opens: List[Tuple[int, int]] = []
+        day = origin.date()
+        for d in range(self.search_days):
+            current = day + timedelta(days=d)
+            midnight = self._midnight(current, tzinfo)
+            for a, b in self.hours.get(current.weekday(), ()):
+                # Wall-clock times, so opening hours hold across DST changes
+                start = midnight.replace(hour=a // 60, minute=a % 60)
+                if b == 24 * 60:
+                    stop = self._midnight(current + timedelta(days=1), tzinfo)
+                else:
+                    stop = midnight.replace(hour=b // 60, minute=b % 60)
+                opens.append((index(start, math.ceil), index(stop, math.floor)))
+        # Rounding can empty a range shorter than a slot; drop those
+        opens = [(a, b) for a, b in opens if b > a]
+        blocked: List[Tuple[int, int]] = []
+        for s, e in busy:
+            a = math.floor((s.timestamp() - origin_ts) / step)
+            b = math.ceil((e.timestamp() - origin_ts) / step)
+            if b > 0 and a < n and b > a:
+                blocked.append((max(0, a), min(n, b)))
+        need = max(1, math.ceil(duration_min / self.granularity_min))
+        first = index(self.clock(), math.ceil)
+        target = (requested.timestamp() - origin_ts) / step
+        picked = _nearest_free(n, opens, blocked, need, first, target, count)
+        # Offsets are absolute time: add them in UTC, not on the local wall clock
+        base = origin.astimezone(timezone.utc)
+        out_tz = requested.tzinfo or tzinfo
+        return [(base + timedelta(seconds=i * step)).astimezone(out_tz) for i in picked]
+
+
+def _nearest_free(
+    n: int,
+    opens: Sequence[Tuple[int, int]],
+    blocked: Sequence[Tuple[int, int]],
+    need: int,
+    first: int,
+    target: float,
+    count: int,
+) -> List[int]:
+    free = bytearray(n)
+    for a, b in opens:
+        free[a:b] = b"\x01" * (b - a)
+    for a, b in blocked:
+        free[a:b] = bytes(b - a)
+    starts: List[int] = []
+    run = 0
+    # Walking backwards, `run` is the number of free slots from i onwards
+    for i in range(n - 1, first - 1, -1):
+        run = run + 1 if free[i] else 0
+        if run >= need:
+            starts.append(i)
+    return heapq.nsmallest(count, starts, key=lambda i: (abs(i - target), i))
+
+
+finder = SlotFinder()
+
+
+def configure_from_settings(settings: Settings) -> SlotFinder:
+    try:
+        hours = parse_hours(settings.clinic_hours)
+    except ValueError as exc:
+        logger.warning("clinic_hours_invalid", extra={"error": str(exc)})
+        hours = parse_hours(DEFAULT_HOURS)
+    finder.hours = hours
+    finder.tz = settings.clinic_tz or "Europe/Brussels"
+    finder.granularity_min = max(1, settings.slot_granularity_min)
+    finder.search_days = max(1, settings.slot_search_days)
+    return finder
@@ -0,0 +1,148 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteSeenBackend:
+    """Persistent seen-set so redeliveries are still caught after a restart."""
+
+    def __init__(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS seen_messages "
+                "(message_id TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+            )
+
+    def add(self, message_id: str, now: float, ttl_s: float) -> bool:
+        """Record `message_id`; return True if it was not seen within `ttl_s`."""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO seen_messages (message_id, seen_at) VALUES (?, ?) "
+                "ON CONFLICT(message_id) DO UPDATE SET seen_at = excluded.seen_at "
+                "WHERE seen_messages.seen_at < ?",
+                (message_id, now, now - ttl_s),
+            )
+            return cur.rowcount == 1
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM seen_messages WHERE seen_at < ?", (older_than,))
+            return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SeenMessageCache:
+    """Bounded, TTL-evicting set of inbound WhatsApp message ids.
+
+    Lookups and inserts are O(1): entries live in an insertion-ordered dict, so
+    the oldest entry is always at the front and eviction pops from there. An
+    optional persistent backend is consulted on in-memory misses only.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10000,
+        ttl_s: float = 86400,
+        *,
+        backend: Optional[SQLiteSeenBackend] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._capacity = max(1, capacity)
+        self._ttl_s = ttl_s
+        self._backend = backend
+        self._clock = clock
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._backend_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict(self, now: float) -> None:
+        while self._seen:
+            expires_at = next(iter(self._seen.values()))
+            if expires_at > now and len(self._seen) <= self._capacity:
+                break
+            self._seen.popitem(last=False)
+            self.evictions += 1
+
+    def is_duplicate(self, message_id: str) -> bool:
+        """Record `message_id` and return True if it was already seen."""
+        now = self._clock()
+        expires_at = self._seen.get(message_id)
+        if expires_at is not None and expires_at > now:
+            self.hits += 1
+            return True
+        if self._backend is not None:
+            try:
+                fresh = self._backend.add(message_id, now, self._ttl_s)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("dedup_backend_failed", extra={"error": str(exc)})
+                fresh = True
+            self._backend_writes += 1
+            if self._backend_writes % 1000 == 0:
+                self._purge_backend(now)
+            if not fresh:
+                self._remember(message_id, now)
+                self.hits += 1
+                return True
+        self._remember(message_id, now)
+        self.misses += 1
+        return False
+
+    def _remember(self, message_id: str, now: float) -> None:
+        self._seen.pop(message_id, None)
+        self._seen[message_id] = now + self._ttl_s
+        self._evict(now)
+
+    def _purge_backend(self, now: float) -> None:
+        try:
+            self._backend.purge(now - self._ttl_s)  # type: ignore[union-attr]
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("dedup_backend_purge_failed", extra={"error": str(exc)})
+
+    def clear(self) -> None:
+        self._seen.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._seen),
+            "capacity": self._capacity,
+            "ttl_s": self._ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "persistent": self._backend is not None,
+        }
+
+
+def from_settings(settings: Settings) -> SeenMessageCache:
+    backend = None
+    if settings.dedup_db_path:
+        try:
+            backend = SQLiteSeenBackend(settings.dedup_db_path)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("dedup_backend_unavailable", extra={"error": str(exc)})
+    return SeenMessageCache(
+        capacity=settings.dedup_capacity,
+        ttl_s=settings.dedup_ttl_s,
+        backend=backend,
+    )
@@ -0,0 +1,253 @@
+"""
+Append-only journal of inbound messages on local disk.
+
+Each accepted message is appended as one JSON line to the active segment
+file; when a worker has finished with it, an `ack` line is appended. On
+startup, messages without an ack are replayed. Appends only write into the
+file buffer; a background task flushes and fsyncs in batches so the webhook
+never waits on the disk.
+
+Segments rotate by size or age and are compacted oldest-first: a segment is
+deleted once every message in it is acked, or once it is older than the data
+retention period.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import IO, Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.config import Settings
+
+from .types import NormalizedMessage
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT_RE = re.compile(r"^segment-(\d{8})\.jsonl$")
+
+
+class MessageJournal:
+    def __init__(
+        self,
+        directory: str,
+        *,
+        segment_max_bytes: int = 16 * 1024 * 1024,
+        segment_max_age_s: float = 3600,
+        fsync_interval_ms: int = 200,
+        retention_days: int = 90,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._dir = directory
+        self._segment_max_bytes = segment_max_bytes
+        self._segment_max_age_s = segment_max_age_s
+        self._fsync_interval_s = max(1, fsync_interval_ms) / 1000.0
+        self._retention_s = retention_days * 86400
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._fh: Optional[IO[str]] = None
+        self._index = 0
+        self._opened_at = 0.0
+        self._bytes = 0
+        self._dirty = False
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._last_compact = 0.0
+        self.appended = 0
+        self.fsyncs = 0
+
+    # --- segments -------------------------------------------------------
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self._dir, f"segment-{index:08d}.jsonl")
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        out = []
+        for name in os.listdir(self._dir):
+            m = _SEGMENT_RE.match(name)
+            if m:
+                out.append((int(m.group(1)), os.path.join(self._dir, name)))
+        return sorted(out)
+
+    def open(self) -> None:
+        """Open a fresh active segment after any existing ones."""
+        os.makedirs(self._dir, exist_ok=True)
+        existing = self._segments()
+        self._index = existing[-1][0] + 1 if existing else 0
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        self._fh = open(self._segment_path(self._index), "a", encoding="utf-8")
+        self._opened_at = self._clock()
+        self._bytes = 0
+
+    def _rotate_locked(self) -> None:
+        assert self._fh is not None
+        # Rare (size/age bound), so the closing fsync is done inline
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        self._index += 1
+        self._open_segment()
+
+    # --- writes ---------------------------------------------------------
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._fh is None:
+                raise RuntimeError("journal is not open")
+            now = self._clock()
+            if self._bytes and (
+                self._bytes >= self._segment_max_bytes
+                or now - self._opened_at >= self._segment_max_age_s
+            ):
+                self._rotate_locked()
+            self._fh.write(line)
+            self._bytes += len(line.encode("utf-8"))
+            self._dirty = True
+
+    def append(self, msg: NormalizedMessage) -> None:
+        # vars() is a shallow view; asdict() would deep-copy the raw payload
+        self._write({"t": "msg", "ts": self._clock(), "m": vars(msg)})
+        self.appended += 1
+
+    def ack(self, message_id: str) -> None:
+        if message_id:
+            self._write({"t": "ack", "ts": self._clock(), "id": message_id})
+
+    def sync(self) -> None:
+        """Flush buffered records and fsync them to disk."""
+        with self._lock:
+            if self._fh is None or not self._dirty:
+                return
+            self._fh.flush()
+            self._dirty = False
+            # fsync a duplicate descriptor outside the lock so appends are not blocked
+            fd = os.dup(self._fh.fileno())
+        try:
+            os.fsync(fd)
+            self.fsyncs += 1
+        finally:
+            os.close(fd)
+
+    # --- reads ----------------------------------------------------------
+    def _read_segment(self, path: str) -> List[Dict[str, Any]]:
+        records = []
+        with open(path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn write at crash time: ignore the partial tail line
+                    continue
+        return records
+
+    def pending(self) -> List[NormalizedMessage]:
+        """Messages journaled but never acked, oldest first."""
+        msgs: Dict[str, NormalizedMessage] = {}
+        acked: Set[str] = set()
+        cutoff = self._clock() - self._retention_s
+        for _, path in self._segments():
+            for rec in self._read_segment(path):
+                if rec.get("t") == "ack":
+                    acked.add(rec.get("id") or "")
+                elif rec.get("t") == "msg" and float(rec.get("ts") or 0) >= cutoff:
+                    try:
+                        msg = NormalizedMessage(**rec["m"])
+                    except Exception:  # noqa: BLE001
+                        continue
+                    if msg.message_id:
+                        msgs.setdefault(msg.message_id, msg)
+        return [m for mid, m in msgs.items() if mid not in acked]
+
+    def compact(self) -> int:
+        """Delete closed segments that are fully acked or past retention, oldest first.
+
+        Stops at the first segment that must be kept: a later segment may hold
+        the acks for its messages, and deleting it would replay them again.
+        """
+        cutoff = self._clock() - self._retention_s
+        closed = [(i, p) for i, p in self._segments() if i != self._index]
+        acked: Set[str] = set()
+        per_segment: List[Tuple[str, Set[str], float]] = []
+        for _, path in closed:
+            ids: Set[str] = set()
+            newest = 0.0
+            for rec in self._read_segment(path):
+                newest = max(newest, float(rec.get("ts") or 0))
+                if rec.get("t") == "ack":
+                    acked.add(rec.get("id") or "")
+                elif rec.get("t") == "msg":
+                    ids.add((rec.get("m") or {}).get("message_id") or "")
+            ids.discard("")
+            per_segment.append((path, ids, newest))
+        # Acks written to the active segment count too
+        active = self._segment_path(self._index)
+        if os.path.exists(active):
+            with self._lock:
+                if self._fh is not None:
+                    self._fh.flush()
+            for rec in self._read_segment(active):
+                if rec.get("t") == "ack":
+                    acked.add(rec.get("id") or "")
+        removed = 0
+        for path, ids, newest in per_segment:
+            if newest >= cutoff and not ids <= acked:
+                break
+            os.remove(path)
+            removed += 1
+        self._last_compact = self._clock()
+        if removed:
+            logger.info("journal_compacted", extra={"segments_removed": removed})
+        return removed
+
+    # --- lifecycle ------------------------------------------------------
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._fsync_interval_s)
+            try:
+                await asyncio.to_thread(self.sync)
+                if self._clock() - self._last_compact >= 3600:
+                    await asyncio.to_thread(self.compact)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("journal_flush_failed", extra={"error": str(exc)})
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop(), name="journal-flusher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.close()
+
+    def close(self) -> None:
+        self.sync()
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self._dir,
+            "active_segment": self._index,
+            "active_bytes": self._bytes,
+            "appended": self.appended,
+            "fsyncs": self.fsyncs,
+        }
+
+
+def from_settings(settings: Settings) -> Optional[MessageJournal]:
+    if not settings.journal_dir:
+        return None
+    return MessageJournal(
+        settings.journal_dir,
+        segment_max_bytes=settings.journal_segment_max_bytes,
+        segment_max_age_s=settings.journal_segment_max_age_s,
+        fsync_interval_ms=settings.journal_fsync_interval_ms,
+        retention_days=settings.data_retention_days,
+    )
@@ -1,21 +1,118 @@
-from typing import List
+import json
+import zlib
+from collections import deque
+from dataclasses import replace
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
 
 from .types import NormalizedMessage
 
+RAW_MODES = ("keep", "strip", "compress")
+
+# (message with raw possibly removed, zlib-compressed raw JSON when raw_mode == "compress")
+_Entry = Tuple[NormalizedMessage, Optional[bytes]]
+
 
 class InMemoryMessageStore:
-    def __init__(self) -> None:
-        self._messages: List[NormalizedMessage] = []
+    """Fixed-capacity ring buffer of received messages.
+
+    Once full, each save overwrites the oldest message, so memory stays flat
+    however long the process runs. A per-sender index of sequence numbers
+    allows listing one conversation without scanning the whole buffer.
+    """
+
+    def __init__(self, capacity: int = 10000, raw_mode: str = "keep") -> None:
+        if raw_mode not in RAW_MODES:
+            raise ValueError(f"raw_mode must be one of {RAW_MODES}")
+        self._capacity = max(1, capacity)
+        self._raw_mode = raw_mode
+        self._slots: List[Optional[_Entry]] = [None] * self._capacity
+        self._by_waid: Dict[str, Deque[int]] = {}
+        self._next_seq = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def configure(self, *, capacity: Optional[int] = None, raw_mode: Optional[str] = None) -> None:
+        """Resize and/or change raw handling, keeping the newest messages."""
+        capacity = max(1, capacity) if capacity is not None else self._capacity
+        raw_mode = raw_mode or self._raw_mode
+        if raw_mode not in RAW_MODES:
+            raise ValueError(f"raw_mode must be one of {RAW_MODES}")
+        if capacity == self._capacity and raw_mode == self._raw_mode:
+            return
+        kept = self.all()[-capacity:]
+        self._capacity = capacity
+        self._raw_mode = raw_mode
+        self.clear()
+        for msg in kept:
+            self.save(msg)
+
+    def _oldest_seq(self) -> int:
+        return max(0, self._next_seq - self._capacity)
 
     def save(self, msg: NormalizedMessage) -> None:
-        self._messages.append(msg)
+        seq = self._next_seq
+        idx = seq % self._capacity
+        old = self._slots[idx]
+        if old is not None:
+            # The overwritten message is the oldest one for its sender
+            waid_seqs = self._by_waid.get(old[0].from_waid)
+            if waid_seqs:
+                waid_seqs.popleft()
+                if not waid_seqs:
+                    del self._by_waid[old[0].from_waid]
+        self._slots[idx] = self._pack(msg)
+        self._by_waid.setdefault(msg.from_waid, deque()).append(seq)
+        self._next_seq = seq + 1
+
+    def _pack(self, msg: NormalizedMessage) -> _Entry:
+        if self._raw_mode == "keep" or not msg.raw:
+            return (msg, None)
+        stripped = replace(msg, raw={})
+        if self._raw_mode == "strip":
+            return (stripped, None)
+        raw = json.dumps(msg.raw, ensure_ascii=False, separators=(",", ":"))
+        blob = zlib.compress(raw.encode("utf-8"))
+        return (stripped, blob)
+
+    @staticmethod
+    def _unpack(entry: _Entry) -> NormalizedMessage:
+        msg, blob = entry
+        if blob is None:
+            return msg
+        return replace(msg, raw=json.loads(zlib.decompress(blob).decode("utf-8")))
+
+    def iter_messages(
+        self,
+        *,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        from_waid: Optional[str] = None,
+        include_raw: bool = True,
+    ) -> Iterator[NormalizedMessage]:
+        """Yield messages oldest first, optionally for a single sender."""
+        if from_waid is not None:
+            seqs = list(self._by_waid.get(from_waid, ()))
+        else:
+            seqs = range(self._oldest_seq(), self._next_seq)  # type: ignore[assignment]
+        end = len(seqs) if limit is None else min(len(seqs), offset + max(0, limit))
+        for i in range(max(0, offset), end):
+            entry = self._slots[seqs[i] % self._capacity]
+            if entry is None:
+                continue
+            yield self._unpack(entry) if include_raw else entry[0]
 
     def all(self) -> List[NormalizedMessage]:
-        return list(self._messages)
+        return list(self.iter_messages())
+
+    def __len__(self) -> int:
+        return self._next_seq - self._oldest_seq()
 
     def clear(self) -> None:
-        self._messages.clear()
+        self._slots = [None] * self._capacity
+        self._by_waid.clear()
+        self._next_seq = 0
 
 
 store = InMemoryMessageStore()
-
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 
 
 @dataclass
@@ -12,4 +12,8 @@ class NormalizedMessage:
     text: Optional[str]
     contact_name: Optional[str]
     raw: Dict[str, Any]
+    # Ids of every inbound message folded into this one by coalescing (empty otherwise)
+    merged_ids: List[str] = field(default_factory=list)
 
+    def ids(self) -> List[str]:
+        return self.merged_ids or [self.message_id]
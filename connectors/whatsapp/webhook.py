@@ -1,12 +1,14 @@
+import json
 import logging
 from dataclasses import asdict
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 from fastapi import APIRouter, HTTPException, Query, Request
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from app.config import Settings, load_settings
 
+from .dedup import from_settings as dedup_from_settings
 from .store import store
 from .types import NormalizedMessage
 
@@ -20,6 +22,8 @@ def get_settings() -> Settings:
 def get_router(settings: Optional[Settings] = None) -> APIRouter:
     s = settings or load_settings()
     router = APIRouter(prefix="/webhooks/whatsapp", tags=["whatsapp"])
+    dedup = dedup_from_settings(s)
+    store.configure(capacity=s.message_store_capacity, raw_mode=s.message_store_raw)
 
     @router.get("")
     async def verify(
@@ -37,6 +41,13 @@ def get_router(settings: Optional[Settings] = None) -> APIRouter:
         payload: Dict[str, Any] = await request.json()
         normalized = normalize_inbound(payload)
         for msg in normalized:
+            # Meta redelivers on timeouts; drop ids we have already accepted
+            if msg.message_id and dedup.is_duplicate(msg.message_id):
+                logger.info("whatsapp_duplicate", extra={"message_id": msg.message_id})
+                continue
+            journal = getattr(request.app.state, "journal", None)
+            if journal is not None:
+                journal.append(msg)
             store.save(msg)
             # Log inbound message details (extras are included by JsonFormatter)
             logger.info(
@@ -48,23 +59,40 @@ def get_router(settings: Optional[Settings] = None) -> APIRouter:
                     "text": msg.text,
                 },
             )
+            # Hand off to the background workers so Meta gets its 200 immediately
+            queue = getattr(request.app.state, "ingestion_queue", None)
+            # When the sender's worker is full this waits for room (backpressure) rather than
+            # processing inline, which would overtake the sender's queued messages
+            if queue is not None and await queue.put(msg):
+                continue
+            # No running worker pool (e.g. lifespan not started): process inline
             try:
-                # Integration hook for Phase 3: route to Agents SDK (stub)
                 from agents.ingest import handle_inbound_message  # local import to avoid cycle
 
                 await handle_inbound_message(msg, s)
             except Exception as exc:  # noqa: BLE001
                 logger.exception("agent ingestion failed: %s", exc)
+            finally:
+                if journal is not None:
+                    journal.ack(msg.message_id)
         return PlainTextResponse("EVENT_RECEIVED")
 
     # Dev-only debug endpoint to view received messages
     if (s.app_env or "dev").lower() != "prod":
         @router.get("/_debug/messages")
-        async def debug_messages():  # type: ignore
-            items = []
-            for m in store.all():
-                items.append(
-                    {
+        async def debug_messages(
+            offset: int = Query(0, ge=0),
+            limit: int = Query(100, ge=1, le=1000),
+            from_waid: Optional[str] = Query(None, alias="from"),
+        ) -> StreamingResponse:  # type: ignore
+            def generate() -> Iterator[str]:
+                # Stream one item at a time instead of materialising the whole page
+                yield "["
+                msgs = store.iter_messages(
+                    offset=offset, limit=limit, from_waid=from_waid, include_raw=False
+                )
+                for i, m in enumerate(msgs):
+                    item = {
                         "message_id": m.message_id,
                         "timestamp": m.timestamp,
                         "from": m.from_waid,
@@ -73,8 +101,18 @@ def get_router(settings: Optional[Settings] = None) -> APIRouter:
                         "text": m.text,
                         "contact_name": m.contact_name,
                     }
-                )
-            return items
+                    yield ("," if i else "") + json.dumps(item, ensure_ascii=False)
+                yield "]"
+
+            return StreamingResponse(
+                generate(),
+                media_type="application/json",
+                headers={"X-Total-Count": str(len(store))},
+            )
+
+        @router.get("/_debug/dedup")
+        async def debug_dedup():  # type: ignore
+            return dedup.stats()
 
     return router
 
@@ -1,8 +1,35 @@
 import os
 import sys
 
+import pytest
+
 # Ensure repository root is on sys.path for `import app`
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
+
+@pytest.fixture(autouse=True)
+def _reset_agent_state():
+    # Process-wide learned state must not leak between tests
+    from agents.breaker import breakers
+    from agents.cache import extraction_cache
+    from agents.capabilities import registry
+    from agents.locks import conversation_locks
+    from agents.routing import routing_stats
+    from agents.usage import tracker
+    from connectors.calendar.provider import registry as calendar_providers
+
+    registry.configure(None)
+    registry.clear()
+    breakers.configure(failure_threshold=5, reset_timeout_s=30)
+    extraction_cache.clear()
+    tracker.clear()
+    routing_stats.clear()
+    conversation_locks.clear()
+    calendar_providers.clear()
+    yield
+    breakers.clear()
+    registry.clear()
+    extraction_cache.clear()
+    tracker.clear()
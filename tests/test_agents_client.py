@@ -0,0 +1,36 @@
+import asyncio
+
+from agents import client as agents_client
+from app.config import load_settings
+
+
+def test_get_agents_client_is_a_process_wide_singleton(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    s = load_settings()
+    c1 = agents_client.get_agents_client(s)
+    c2 = agents_client.get_agents_client(s)
+    assert c1 is not None and c1 is c2
+    assert c1.max_retries == s.openai_max_retries
+    asyncio.run(agents_client.close_agents_client())
+
+
+def test_get_agents_client_none_without_key_and_rebuilt_on_key_change(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "")
+    assert agents_client.get_agents_client(load_settings()) is None
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-one")
+    first = agents_client.get_agents_client(load_settings())
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-two")
+    second = agents_client.get_agents_client(load_settings())
+    assert first is not second
+    asyncio.run(agents_client.close_agents_client())
+
+
+def test_replaced_client_is_closed_on_shutdown(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-one")
+    first = agents_client.get_agents_client(load_settings())
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-two")
+    second = agents_client.get_agents_client(load_settings())
+    assert not first.is_closed()
+    asyncio.run(agents_client.close_agents_client())
+    assert first.is_closed() and second.is_closed()
@@ -28,7 +28,7 @@ class _StubClient:
         def __init__(self, payload: str) -> None:
             self._payload = payload
 
-        def create(self, **kwargs):  # type: ignore[no-untyped-def]
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
             return _StubResp(self._payload)
 
     def __init__(self, payload: str) -> None:
@@ -52,7 +52,9 @@ def test_booking_success_with_inmemory_calendar(monkeypatch):
         "reason": "Controle",
         "preferred_time": "mardi 10h30",
     })
-    monkeypatch.setattr("agents.ingest.create_agents_client", lambda settings: _StubClient(payload), raising=True)
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda settings: _StubClient(payload), raising=True
+    )
     monkeypatch.setattr("agents.ingest.parse_preferred_time_fr", _fixed_parse, raising=True)
 
     # WhatsApp stub
@@ -90,7 +92,9 @@ def test_booking_unavailable_offers_alternatives(monkeypatch):
         "reason": "Visite",
         "preferred_time": "mardi 10h30",
     })
-    monkeypatch.setattr("agents.ingest.create_agents_client", lambda settings: _StubClient(payload), raising=True)
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda settings: _StubClient(payload), raising=True
+    )
     monkeypatch.setattr("agents.ingest.parse_preferred_time_fr", _fixed_parse, raising=True)
 
     # WhatsApp stub
@@ -145,7 +149,9 @@ def test_booking_from_selection_of_alternative(monkeypatch):
         "reason": "Consultation",
         "preferred_time": "mardi 10h30",
     })
-    monkeypatch.setattr("agents.ingest.create_agents_client", lambda settings: _StubClient(payload), raising=True)
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda settings: _StubClient(payload), raising=True
+    )
     monkeypatch.setattr("agents.ingest.parse_preferred_time_fr", _fixed_parse, raising=True)
 
     wa_stub = _StubWA()
@@ -203,3 +209,203 @@ def test_booking_from_selection_of_alternative(monkeypatch):
     assert st2.event_id == "evt-1"
     assert st2.pending_alternatives is None
     assert wa_stub.sent and "Réservé" in wa_stub.sent[-1]["body"]
+
+
+class _SlowCalendar:
+    """Availability lookups take as long as the model call."""
+
+    def __init__(self, delay: float, timeline=None, available=None) -> None:
+        self.delay = delay
+        self.timeline = timeline if timeline is not None else []
+        # Successive is_available answers; free once exhausted
+        self.available = list(available or [])
+        self.lookups = []
+        self.events = []
+
+    def is_available(self, start, duration_min: int = 30):  # type: ignore[no-untyped-def]
+        import time
+
+        self.timeline.append("lookup")
+        time.sleep(self.delay)
+        self.lookups.append(start.isoformat())
+        return self.available.pop(0) if self.available else True
+
+    def suggest_alternatives(self, start, *, duration_min: int = 30, count: int = 2):  # type: ignore[no-untyped-def]
+        return [start.replace(hour=11)]
+
+    def create_event(self, start, **kwargs):  # type: ignore[no-untyped-def]
+        self.events.append(start.isoformat())
+        return type("E", (), {"id": f"evt-{len(self.events)}"})()
+
+
+def _slow_model(payload: str, delay: float, timeline=None):
+    class _Responses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            await asyncio.sleep(delay)
+            if timeline is not None:
+                timeline.append("model_done")
+            return _StubResp(payload)
+
+    return type("C", (), {"responses": _Responses()})()
+
+
+_ISO = {"mardi 10h": "2025-01-14T10:00:00+01:00", "jeudi 9h": "2025-01-16T09:00:00+01:00"}
+
+
+def _spec_message(message_id: str, from_waid: str) -> NormalizedMessage:
+    return NormalizedMessage(
+        message_id=message_id,
+        timestamp="0",
+        from_waid=from_waid,
+        to_phone_id="PHONE_ID",
+        type="text",
+        text="Jean Dupont, une carie, mardi 10h",
+        contact_name=None,
+        raw={},
+    )
+
+
+def test_calendar_lookup_overlaps_model_call(monkeypatch):
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_RULES_ENABLED", "false")
+    payload = json.dumps({"name": "Jean Dupont", "reason": "carie", "preferred_time": "mardi 10h"})
+    timeline = []
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda s: _slow_model(payload, 0.2, timeline)
+    )
+    monkeypatch.setattr(
+        "agents.ingest.parse_preferred_time_fr", lambda t: type("P", (), {"iso": _ISO[t]})()
+    )
+    cal = _SlowCalendar(0.0, timeline)
+    monkeypatch.setattr("agents.ingest.get_calendar_provider", lambda s: cal)
+
+    msg = _spec_message("wamid.SPEC1", "+32470000051")
+    asyncio.run(handle_inbound_message(msg, load_settings()))
+
+    # Looked up while the model was still answering, then re-checked before booking
+    assert timeline == ["lookup", "model_done", "lookup"]
+    assert cal.lookups == [_ISO["mardi 10h"]] * 2
+    assert cal.events == [_ISO["mardi 10h"]]
+
+
+def test_slot_taken_during_model_call_is_not_booked(monkeypatch):
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_RULES_ENABLED", "false")
+    monkeypatch.setenv("AGENT_AUTO_REPLY", "false")
+    payload = json.dumps({"name": "Jean Dupont", "reason": "carie", "preferred_time": "mardi 10h"})
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda s: _slow_model(payload, 0.05))
+    monkeypatch.setattr(
+        "agents.ingest.parse_preferred_time_fr", lambda t: type("P", (), {"iso": _ISO[t]})()
+    )
+    # Free when prefetched, booked by someone else by the time the model answers
+    cal = _SlowCalendar(0.0, available=[True, False])
+    monkeypatch.setattr("agents.ingest.get_calendar_provider", lambda s: cal)
+
+    msg = _spec_message("wamid.SPEC3", "+32470000053")
+    asyncio.run(handle_inbound_message(msg, load_settings()))
+
+    assert cal.events == []
+    assert session_store.get("+32470000053").pending_alternatives == ["2025-01-14T11:00:00+01:00"]
+
+
+def test_speculative_lookup_dropped_when_model_picks_another_time(monkeypatch):
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_RULES_ENABLED", "false")
+    payload = json.dumps({"name": "Jean Dupont", "reason": "carie", "preferred_time": "jeudi 9h"})
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda s: _slow_model(payload, 0.05))
+    monkeypatch.setattr(
+        "agents.ingest.parse_preferred_time_fr", lambda t: type("P", (), {"iso": _ISO[t]})()
+    )
+    cal = _SlowCalendar(0.0)
+    monkeypatch.setattr("agents.ingest.get_calendar_provider", lambda s: cal)
+    msg = _spec_message("wamid.SPEC2", "+32470000052")
+    asyncio.run(handle_inbound_message(msg, load_settings()))
+
+    # The booking uses the model's time, never the speculated one
+    assert _ISO["jeudi 9h"] in cal.lookups
+    assert cal.events == [_ISO["jeudi 9h"]]
+    assert session_store.get("+32470000052").preferred_time_iso == _ISO["jeudi 9h"]
+
+
+class _TimedWA(_StubWA):
+    def __init__(self, delay: float = 0.0) -> None:
+        super().__init__()
+        self.delay = delay
+        self.at = []
+
+    async def send_text(self, to: str, body: str, dry_run: bool = False):  # type: ignore[no-untyped-def]
+        await asyncio.sleep(self.delay)
+        self.at.append(asyncio.get_running_loop().time())
+        return await super().send_text(to, body, dry_run)
+
+
+def _budget_env(monkeypatch) -> None:
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_RULES_ENABLED", "false")
+    monkeypatch.setenv("CALENDAR_SPECULATION", "false")
+    monkeypatch.setenv("AGENT_AUTO_REPLY", "true")
+    monkeypatch.setattr(
+        "agents.ingest.parse_preferred_time_fr", lambda t: type("P", (), {"iso": _ISO[t]})()
+    )
+
+
+def test_slow_calendar_answers_with_followup_then_sends_booking(monkeypatch):
+    _budget_env(monkeypatch)
+    monkeypatch.setenv("CALENDAR_DEADLINE_S", "0.05")
+    payload = json.dumps({"name": "Jean Dupont", "reason": "carie", "preferred_time": "mardi 10h"})
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda s: _StubClient(payload))
+    cal = _SlowCalendar(0.3)
+    monkeypatch.setattr("agents.ingest.get_calendar_provider", lambda s: cal)
+    wa = _TimedWA()
+    monkeypatch.setattr("agents.ingest.whatsapp_from_settings", lambda s: wa)
+    ticks = []
+
+    async def run() -> float:
+        loop = asyncio.get_running_loop()
+
+        async def tick() -> None:
+            while True:
+                ticks.append(loop.time())
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        started = loop.time()
+        msg = _spec_message("wamid.BUDGET1", "+32470000054")
+        await handle_inbound_message(msg, load_settings())
+        ticker.cancel()
+        return started
+
+    started = asyncio.run(run())
+
+    # The patient hears back within the budget, and again once the booking lands
+    bodies = [m["body"] for m in wa.sent]
+    assert "Je regarde les disponibilités" in bodies[0] and "Réservé" in bodies[1]
+    assert wa.at[0] - started < 0.25 <= wa.at[1] - started
+    assert cal.events == [_ISO["mardi 10h"]]
+    assert session_store.get("+32470000054").event_id == "evt-1"
+    # The calendar call ran off the event loop
+    assert len(ticks) >= 10
+
+
+def test_hanging_whatsapp_send_is_abandoned_at_its_budget(monkeypatch):
+    _budget_env(monkeypatch)
+    monkeypatch.setenv("WHATSAPP_SEND_DEADLINE_S", "0.05")
+    payload = json.dumps({"name": "Jean Dupont", "reason": None, "preferred_time": None})
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda s: _StubClient(payload))
+    wa = _TimedWA(delay=5.0)
+    monkeypatch.setattr("agents.ingest.whatsapp_from_settings", lambda s: wa)
+
+    async def run() -> float:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        msg = _spec_message("wamid.BUDGET2", "+32470000055")
+        await handle_inbound_message(msg, load_settings())
+        return loop.time() - started
+
+    assert asyncio.run(run()) < 1.0
+    assert wa.sent == []
+    assert session_store.get("+32470000055").name == "Jean Dupont"
@@ -0,0 +1,53 @@
+from agents.breaker import CLOSED, HALF_OPEN, OPEN, BreakerRegistry, CircuitBreaker
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = _Clock()
+    b = CircuitBreaker("m", failure_threshold=3, reset_timeout_s=10, clock=clock)
+    b.record_failure()
+    b.record_failure()
+    b.record_success()  # a success resets the streak
+    b.record_failure()
+    b.record_failure()
+    assert b.state == CLOSED and b.allow()
+    b.record_failure()
+    assert b.state == OPEN
+    assert not b.allow()
+    assert b.stats() == {"state": OPEN, "consecutive_failures": 3, "trips": 1, "rejected": 1}
+
+
+def test_half_open_lets_one_trial_through():
+    clock = _Clock()
+    b = CircuitBreaker("m", failure_threshold=1, reset_timeout_s=10, clock=clock)
+    b.record_failure()
+    clock.now = 10
+    assert b.state == HALF_OPEN
+    assert b.allow()
+    assert not b.allow()  # only one trial in flight
+
+    # A failed trial re-opens for another full period
+    b.record_failure()
+    assert b.state == OPEN and b.trips == 2
+    clock.now = 15
+    assert not b.allow()
+
+    clock.now = 20
+    assert b.allow()
+    b.record_success()
+    assert b.state == CLOSED and b.allow()
+
+
+def test_registry_keeps_one_breaker_per_model():
+    reg = BreakerRegistry(failure_threshold=1, reset_timeout_s=30)
+    reg.get("gpt-a").record_failure()
+    assert reg.get("gpt-a") is reg.get("gpt-a")
+    assert reg.stats()["gpt-a"]["state"] == OPEN
+    assert reg.get("gpt-b").state == CLOSED
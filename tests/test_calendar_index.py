@@ -0,0 +1,76 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from connectors.calendar.inmemory import InMemoryCalendar
+from connectors.calendar.intervals import IntervalIndex
+
+T0 = datetime(2030, 1, 7, 8, 0, tzinfo=timezone.utc)
+
+
+def _at(minutes: int) -> datetime:
+    return T0 + timedelta(minutes=minutes)
+
+
+def test_overlap_is_half_open():
+    idx: IntervalIndex[str] = IntervalIndex()
+    idx.add(_at(60), _at(90), "a")
+    assert idx.overlaps(_at(30), _at(61))
+    assert idx.overlaps(_at(89), _at(120))
+    assert idx.overlaps(_at(0), _at(600))  # query containing the interval
+    assert not idx.overlaps(_at(30), _at(60))  # ends where it starts
+    assert not idx.overlaps(_at(90), _at(120))  # starts where it ends
+
+
+def test_long_interval_is_found_from_far_inside():
+    idx: IntervalIndex[str] = IntervalIndex()
+    idx.add(_at(0), _at(24 * 60), "day-off")
+    for i in range(30):
+        idx.add(_at(30 * i), _at(30 * i + 15), f"e{i}")
+    assert idx.overlapping(_at(20 * 60), _at(20 * 60 + 10)) == ["day-off"]
+
+
+def test_removing_the_longest_interval_narrows_the_scan():
+    idx: IntervalIndex[str] = IntervalIndex()
+    idx.add(_at(0), _at(24 * 60), "day-off")
+    idx.add(_at(60), _at(90), "a")
+    idx.add(_at(120), _at(150), "b")
+    assert idx.remove(_at(0), "day-off")
+    assert idx._longest == 30 * 60
+    assert idx.overlapping(_at(0), _at(24 * 60)) == ["a", "b"]
+    idx.remove(_at(60), "a")
+    idx.remove(_at(120), "b")
+    assert idx._longest == 0.0
+
+
+def test_index_matches_linear_scan():
+    rng = random.Random(7)
+    idx: IntervalIndex[int] = IntervalIndex()
+    spans = []
+    for i in range(400):
+        s = rng.randrange(0, 10_000)
+        e = s + rng.choice([15, 30, 45, 60, 240])
+        spans.append((s, e, i))
+        idx.add(_at(s), _at(e), i)
+    for s, e, i in spans[::3]:
+        assert idx.remove(_at(s), i)
+    live = spans[:]
+    del live[::3]
+    for _ in range(500):
+        qs = rng.randrange(-100, 10_100)
+        qe = qs + rng.choice([1, 30, 90])
+        expected = sorted((s, i) for s, e, i in live if s < qe and e > qs)
+        got = idx.overlapping(_at(qs), _at(qe))
+        assert sorted((s, i) for s, e, i in live if i in got) == expected
+        assert idx.overlaps(_at(qs), _at(qe)) == bool(expected)
+
+
+def test_calendar_lists_and_deletes_events():
+    cal = InMemoryCalendar()
+    a = cal.create_event(_at(60), duration_min=30, title="a")
+    b = cal.create_event(_at(0), duration_min=30, title="b")
+    assert not cal.is_available(_at(70))
+    assert [e.title for e in cal.list_events(_at(0), _at(24 * 60))] == ["b", "a"]
+    assert cal.delete_event(a.id)
+    assert not cal.delete_event(a.id)
+    assert cal.is_available(_at(70))
+    assert len(cal) == 1 and cal.list_events(_at(0), _at(30)) == [b]
@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.config import load_settings
+from connectors.calendar import slots
+from connectors.calendar.google import GoogleCalendarProvider
+from connectors.calendar.mirror import CalendarMirror, event_interval, mirrors
+from connectors.calendar.slots import SlotFinder
+
+TZ = ZoneInfo("Europe/Brussels")
+NOW = datetime(2030, 1, 7, 7, 0, tzinfo=timezone.utc)
+
+
+def _local(day: int, hh: int, mm: int = 0) -> datetime:
+    return datetime(2030, 1, day, hh, mm, tzinfo=TZ)
+
+
+def _event(event_id: str, start: datetime, end: datetime, **extra):
+    return {
+        "id": event_id,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": end.isoformat()},
+        **extra,
+    }
+
+
+class _Gone(Exception):
+    class resp:  # mimics googleapiclient.errors.HttpError
+        status = 410
+
+
+class _Events:
+    """events().list(...).execute() answering full and incremental syncs from scripts."""
+
+    def __init__(self):
+        self.full = []  # events returned by a full sync
+        self.changes = []  # batches returned by successive incremental syncs
+        self.calls = []
+        self.inserted = []
+        self.expire_token = False
+        self.on_list = None
+
+    def events(self):
+        return self
+
+    def list(self, **kw):
+        self.calls.append(kw)
+        if self.on_list is not None:
+            self.on_list()
+        if "syncToken" in kw:
+            if self.expire_token:
+                self.expire_token = False
+                raise _Gone()
+            items = self.changes.pop(0) if self.changes else []
+        else:
+            items = list(self.full)
+        return _Exec({"items": items, "nextSyncToken": f"t{len(self.calls)}"})
+
+    def insert(self, calendarId, body):
+        self.inserted.append(body)
+        return _Exec({"id": "created-1"})
+
+    def freebusy(self):
+        raise AssertionError("the mirror should have answered")
+
+
+class _Exec:
+    def __init__(self, value):
+        self._value = value
+
+    def execute(self):
+        return self._value
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def mirror_env(monkeypatch):
+    past = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    monkeypatch.setattr(slots, "finder", SlotFinder(clock=lambda: past))
+    monkeypatch.setenv("GOOGLE_CALENDAR_ID", "clinic")
+    service, clock = _Events(), _Clock()
+    mirror = CalendarMirror(service, "clinic", weeks=2, tzinfo=TZ, clock=clock, now=lambda: NOW)
+    mirrors.configure([mirror])
+    yield service, clock, mirror
+    mirrors.configure([])
+
+
+def test_full_then_incremental_sync(mirror_env):
+    service, _, mirror = mirror_env
+    service.full = [
+        _event("a", _local(7, 9), _local(7, 10)),
+        _event("free", _local(7, 11), _local(7, 12), transparency="transparent"),
+    ]
+    mirror.sync()
+    assert "timeMin" in service.calls[0] and "syncToken" not in service.calls[0]
+    assert mirror.busy(_local(7, 0), _local(8, 0), max_age_s=60) == [(_local(7, 9), _local(7, 10))]
+
+    service.changes = [
+        [
+            {"id": "a", "status": "cancelled"},
+            _event("b", _local(7, 14), _local(7, 15)),
+        ]
+    ]
+    mirror.sync()
+    assert service.calls[1] == {
+        "calendarId": "clinic",
+        "singleEvents": True,
+        "pageToken": None,
+        "syncToken": "t1",
+    }
+    assert mirror.busy(_local(7, 0), _local(8, 0), max_age_s=60) == [(_local(7, 14), _local(7, 15))]
+    assert mirror.stats()["full_syncs"] == 1 and mirror.stats()["incremental_syncs"] == 1
+
+
+def test_expired_sync_token_triggers_full_sync(mirror_env):
+    service, _, mirror = mirror_env
+    mirror.sync()
+    service.expire_token = True
+    service.full = [_event("a", _local(7, 9), _local(7, 10))]
+    mirror.sync()
+    assert mirror.stats()["full_syncs"] == 2
+    assert mirror.busy(_local(7, 9), _local(7, 10), max_age_s=60)
+
+
+def test_mirror_refuses_to_answer_when_stale_or_out_of_range(mirror_env):
+    _, clock, mirror = mirror_env
+    assert mirror.busy(_local(7, 9), _local(7, 10), max_age_s=60) is None  # never synced
+    mirror.sync()
+    assert mirror.busy(_local(7, 9), _local(7, 10), max_age_s=60) == []
+    assert mirror.busy(_local(7, 9), _local(30, 10), max_age_s=60) is None  # beyond 2 weeks
+    clock.now = 61
+    assert mirror.busy(_local(7, 9), _local(7, 10), max_age_s=60) is None
+
+
+def test_booking_recorded_during_full_sync_is_kept(mirror_env):
+    service, _, mirror = mirror_env
+    booked = (_local(7, 16), _local(7, 17))
+    # Booked while the full sync was listing: not in its answer, but must survive the swap
+    service.on_list = lambda: mirror.record("late", *booked)
+    mirror.sync()
+    assert mirror.busy(*booked, max_age_s=60) == [booked]
+
+
+def test_provider_answers_from_fresh_mirror_and_falls_back_when_stale(mirror_env, monkeypatch):
+    service, clock, mirror = mirror_env
+    monkeypatch.setenv("GOOGLE_MIRROR_MAX_AGE_S", "60")
+    service.full = [_event("a", _local(7, 9), _local(7, 12))]
+    mirror.sync()
+    provider = GoogleCalendarProvider(load_settings(), service=service)
+
+    assert not provider.is_available(_local(7, 10))
+    assert provider.suggest_alternatives(_local(7, 10), count=1) == [_local(7, 12)]
+    provider.create_event(_local(7, 12), title="RDV")
+    # Our own booking is visible before the next sync
+    assert not provider.is_available(_local(7, 12))
+    assert mirrors.stats()["hits"] == 3
+
+    clock.now = 61
+    with pytest.raises(AssertionError, match="mirror should have answered"):
+        provider.is_available(_local(7, 10))  # stale: goes to FreeBusy
+    assert mirrors.stats()["misses"] == 1
+
+
+def test_event_interval_handles_all_day_events():
+    item = {"start": {"date": "2030-01-07"}, "end": {"date": "2030-01-08"}}
+    assert event_interval(item, TZ) == (_local(7, 0), _local(8, 0))
+    assert event_interval({"start": {}, "end": {}}, TZ) is None
+    assert event_interval(_event("z", NOW, NOW + timedelta(hours=1)), TZ) == (
+        NOW,
+        NOW + timedelta(hours=1),
+    )
@@ -1,3 +1,10 @@
+import threading
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
 from app.config import load_settings
 from connectors.calendar.provider import get_calendar_provider
 
@@ -28,3 +35,211 @@ def test_provider_handles_b64_creds(monkeypatch):
     s = load_settings()
     provider = get_calendar_provider(s)
     assert provider is not None
+
+
+class _FreeBusyService:
+    """Stands in for the Calendar API client: FreeBusy queries and event inserts."""
+
+    def __init__(self, calendars):
+        self.calendars = calendars
+        self.queries = []
+        self.inserted = []
+
+    def freebusy(self):
+        return self
+
+    def events(self):
+        return self
+
+    def query(self, body):
+        self.queries.append(body)
+        return _Exec(lambda: {"calendars": self.calendars})
+
+    def insert(self, calendarId, body):
+        self.inserted.append(body)
+        return _Exec(lambda: {"id": f"evt-{len(self.inserted)}"})
+
+
+class _Exec:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+class _OneConnectionService(_FreeBusyService):
+    """Records the connection each FreeBusy call used; flags two threads using one at once."""
+
+    def __init__(self, calendars):
+        super().__init__(calendars)
+        self._guard = threading.Lock()
+        self._in_use = set()
+        self.used = []
+        self.overlapped = False
+
+    def query(self, body):
+        self.queries.append(body)
+        return self
+
+    def execute(self, http="shared"):
+        with self._guard:
+            self.overlapped = self.overlapped or http in self._in_use
+            self._in_use.add(http)
+            self.used.append((threading.get_ident(), http))
+        time.sleep(0.05)
+        with self._guard:
+            self._in_use.discard(http)
+        return {"calendars": self.calendars}
+
+
+def _google(monkeypatch, calendars, busy_ids="", service=None, credentials=None):
+    from connectors.calendar import slots
+    from connectors.calendar.google import GoogleCalendarProvider
+    from connectors.calendar.slots import SlotFinder
+
+    past = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    monkeypatch.setattr(slots, "finder", SlotFinder(clock=lambda: past))
+    monkeypatch.setenv("GOOGLE_CALENDAR_ID", "clinic")
+    monkeypatch.setenv("GOOGLE_BUSY_CALENDAR_IDS", busy_ids)
+    service = service if service is not None else _FreeBusyService(calendars)
+    provider = GoogleCalendarProvider(load_settings(), service=service, credentials=credentials)
+    return provider, service
+
+
+def _busy(start, end):
+    return {"start": start, "end": end}
+
+
+def _local(hh, mm=0):
+    return datetime(2030, 1, 7, hh, mm, tzinfo=ZoneInfo("Europe/Brussels"))
+
+
+def test_google_booking_turn_uses_one_freebusy_query(monkeypatch):
+    provider, service = _google(
+        monkeypatch,
+        {
+            "clinic": {"busy": [_busy("2030-01-07T08:00:00Z", "2030-01-07T11:00:00Z")]},
+            "dr-lambert": {"busy": [_busy("2030-01-07T12:30:00Z", "2030-01-07T13:00:00Z")]},
+        },
+        busy_ids="dr-lambert",
+    )
+    assert not provider.is_available(_local(10))
+    # The clinic is booked until 12:00; the practitioner is away 13:30-14:00
+    assert provider.suggest_alternatives(_local(10), count=2) == [_local(12), _local(14)]
+    assert len(service.queries) == 1
+    assert [item["id"] for item in service.queries[0]["items"]] == ["clinic", "dr-lambert"]
+
+
+def test_google_booking_is_reflected_in_reused_freebusy(monkeypatch):
+    provider, service = _google(monkeypatch, {"clinic": {"busy": []}})
+    assert provider.is_available(_local(15))
+    provider.create_event(_local(15), title="RDV")
+    assert not provider.is_available(_local(15, 15))
+    assert len(service.queries) == 1
+
+
+def test_google_freebusy_errors(monkeypatch):
+    provider, _ = _google(
+        monkeypatch,
+        {"clinic": {"busy": []}, "other": {"errors": [{"reason": "notFound"}]}},
+        busy_ids="other",
+    )
+    # A missing extra calendar is skipped
+    assert provider.is_available(_local(15))
+    provider, _ = _google(monkeypatch, {"clinic": {"errors": [{"reason": "backendError"}]}})
+    with pytest.raises(RuntimeError):
+        provider.is_available(_local(15))
+
+
+def test_provider_is_built_once_and_rebuilt_on_config_change_or_reload(monkeypatch):
+    from connectors.calendar import provider as provider_mod
+
+    built = []
+    monkeypatch.setattr(provider_mod, "_build_provider", lambda s: built.append(s) or object())
+    monkeypatch.setenv("GOOGLE_CALENDAR_ID", "clinic")
+    first = get_calendar_provider(load_settings())
+    assert get_calendar_provider(load_settings()) is first
+    assert len(built) == 1
+
+    monkeypatch.setenv("GOOGLE_CALENDAR_ID", "other")
+    second = get_calendar_provider(load_settings())
+    assert second is not first
+    assert provider_mod.registry.reload(load_settings()) is not second
+    assert provider_mod.registry.stats()["builds"] == 3
+
+
+class _Credentials:
+    def __init__(self, expires_in, fail=False):
+        self.token = "tok"
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + expires_in
+        self.fail = fail
+        self.refreshed_with = []
+
+    def refresh(self, request):
+        if self.fail:
+            raise RuntimeError("token endpoint unreachable")
+        self.refreshed_with.append(request)
+
+
+def test_google_token_refreshed_only_when_about_to_expire(monkeypatch):
+    from datetime import timedelta
+
+    from connectors.calendar.google import GoogleCalendarProvider
+
+    monkeypatch.setenv("GOOGLE_CALENDAR_ID", "clinic")
+    creds = _Credentials(timedelta(hours=1))
+    provider = GoogleCalendarProvider(
+        load_settings(), service=_FreeBusyService({}), credentials=creds
+    )
+    assert not provider.refresh_credentials(request="req")
+    creds.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=2)
+    assert provider.refresh_credentials(request="req")
+    assert creds.refreshed_with == ["req"]
+
+
+def test_registry_refresh_failures_are_counted_not_raised(monkeypatch):
+    from datetime import timedelta
+
+    from connectors.calendar import provider as provider_mod
+    from connectors.calendar.google import GoogleCalendarProvider
+
+    monkeypatch.setenv("GOOGLE_CALENDAR_ID", "clinic")
+    creds = _Credentials(timedelta(0), fail=True)
+    google = GoogleCalendarProvider(
+        load_settings(), service=_FreeBusyService({}), credentials=creds
+    )
+    monkeypatch.setattr(provider_mod, "_build_provider", lambda s: google)
+    assert provider_mod.configure_from_settings(load_settings()).credentials() is creds
+    stats = provider_mod.registry.stats()
+    assert stats["provider"] == "GoogleCalendarProvider"
+    assert stats["refresh_errors"] == 1 and stats["refreshes"] == 0
+
+
+@pytest.mark.parametrize("with_credentials", [False, True])
+def test_google_lookups_from_two_threads_never_share_a_connection(monkeypatch, with_credentials):
+    from datetime import timedelta
+
+    from connectors.calendar import google
+
+    monkeypatch.setattr(google, "_authorized_http", lambda credentials: object())
+    credentials = _Credentials(timedelta(hours=1)) if with_credentials else None
+    service = _OneConnectionService({"clinic": {"busy": []}})
+    provider, _ = _google(monkeypatch, {}, service=service, credentials=credentials)
+    barrier = threading.Barrier(2)
+
+    def lookup(hour):
+        barrier.wait()
+        assert provider.is_available(_local(hour))
+
+    threads = [threading.Thread(target=lookup, args=(hour,)) for hour in (10, 11)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(service.used) == 2
+    assert not service.overlapped
+    if with_credentials:
+        # One connection per thread, so the two lookups may run at the same time
+        assert len({http for _, http in service.used}) == 2
@@ -1,5 +1,12 @@
+from agents.conversation import (
+    STATIC_PREFIX,
+    build_extraction_prompt,
+    build_messages,
+    compose_followup,
+    compute_missing,
+    merge_extracted,
+)
 from agents.session import SessionState
-from agents.conversation import compute_missing, compose_followup, merge_extracted
 
 
 def test_missing_and_followup_prompt_order():
@@ -20,3 +27,15 @@ def test_missing_and_followup_prompt_order():
     out = compose_followup(s)
     assert "Merci" in out and "Nom" in out and "Raison" in out and "Préférence" in out
 
+
+def test_prompt_static_prefix_is_byte_stable_and_dynamic_part_last():
+    a = build_messages("Bonjour", SessionState(from_waid="+1000"))
+    known = SessionState(from_waid="+2000", name="Alice", reason="Contrôle")
+    b = build_messages("Mardi 10h", known)
+    # Everything before the last message is identical, whatever the patient or message
+    assert a[:-1] == b[:-1]
+    assert a[0]["content"] == STATIC_PREFIX
+    assert "Alice" not in STATIC_PREFIX and "Mardi 10h" not in STATIC_PREFIX
+    assert b[-1]["content"].endswith("Message: Mardi 10h")
+    prompt = build_extraction_prompt("Bonjour", SessionState(from_waid="+1"))
+    assert prompt.startswith(STATIC_PREFIX)
@@ -0,0 +1,33 @@
+import json
+import os
+
+import pytest
+
+from agents.conversation import try_parse_json
+from agents.decoder import decode_extraction
+
+CORPUS = os.path.join(os.path.dirname(__file__), "fixtures", "model_outputs.jsonl")
+
+
+def _corpus():
+    with open(CORPUS, "r", encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+@pytest.mark.parametrize("case", _corpus(), ids=lambda c: c["raw"][:40])
+def test_decoder_handles_messy_model_outputs(case):
+    decoded = decode_extraction(case["raw"])
+    if case["expected"] is None:
+        assert decoded is None
+    else:
+        assert decoded is not None
+        assert decoded.model_dump() == case["expected"]
+
+
+def test_try_parse_json_returns_plain_dict():
+    assert try_parse_json('```json\n{"name": "Bob",}\n```') == {
+        "name": "Bob",
+        "reason": None,
+        "preferred_time": None,
+    }
+    assert try_parse_json("pas de JSON") is None
@@ -0,0 +1,86 @@
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from connectors.whatsapp.dedup import SeenMessageCache, SQLiteSeenBackend
+from connectors.whatsapp.store import store
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_seen_cache_counts_hits_and_misses():
+    cache = SeenMessageCache(capacity=10, ttl_s=60)
+    assert cache.is_duplicate("wamid.1") is False
+    assert cache.is_duplicate("wamid.1") is True
+    assert cache.is_duplicate("wamid.2") is False
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["size"] == 2
+
+
+def test_seen_cache_evicts_by_capacity_and_ttl():
+    clock = _Clock()
+    cache = SeenMessageCache(capacity=2, ttl_s=60, clock=clock)
+    for mid in ("a", "b", "c"):
+        cache.is_duplicate(mid)
+    # "a" was evicted by capacity
+    assert cache.is_duplicate("a") is False
+    clock.now += 61
+    # Everything older than the TTL is forgotten
+    assert cache.is_duplicate("c") is False
+    assert cache.stats()["size"] <= 2
+
+
+def test_seen_cache_persistent_backend_survives_restart(tmp_path):
+    path = str(tmp_path / "seen.db")
+    first = SeenMessageCache(capacity=10, ttl_s=60, backend=SQLiteSeenBackend(path))
+    assert first.is_duplicate("wamid.P") is False
+    # A fresh process has an empty memory set but the backend remembers
+    second = SeenMessageCache(capacity=10, ttl_s=60, backend=SQLiteSeenBackend(path))
+    assert second.is_duplicate("wamid.P") is True
+    assert second.is_duplicate("wamid.Q") is False
+
+
+def test_webhook_drops_redelivered_message(monkeypatch):
+    store.clear()
+    handled = []
+
+    async def fake_handle(msg, settings):  # type: ignore[no-untyped-def]
+        handled.append(msg.message_id)
+
+    monkeypatch.setattr("agents.ingest.handle_inbound_message", fake_handle, raising=True)
+    client = TestClient(create_app())
+    payload = {
+        "entry": [
+            {
+                "changes": [
+                    {
+                        "value": {
+                            "metadata": {"phone_number_id": "PHONE_ID"},
+                            "contacts": [{"profile": {"name": "Dan"}, "wa_id": "+32476666666"}],
+                            "messages": [
+                                {
+                                    "from": "+32476666666",
+                                    "id": "wamid.DUP",
+                                    "timestamp": "1690000000",
+                                    "type": "text",
+                                    "text": {"body": "Bonjour"},
+                                }
+                            ],
+                        }
+                    }
+                ]
+            }
+        ]
+    }
+    for _ in range(3):
+        resp = client.post("/webhooks/whatsapp", json=payload)
+        assert resp.status_code == 200 and resp.text == "EVENT_RECEIVED"
+    assert handled == ["wamid.DUP"]
+    assert len(store.all()) == 1
+    stats = client.get("/webhooks/whatsapp/_debug/dedup").json()
+    assert stats["hits"] == 2 and stats["misses"] == 1
@@ -0,0 +1,280 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from agents.dispatch import IngestionQueue
+from app.config import load_settings
+from connectors.whatsapp.types import NormalizedMessage
+
+
+def _msg(waid: str, mid: str, text: str = "Bonjour") -> NormalizedMessage:
+    return NormalizedMessage(
+        message_id=mid,
+        timestamp="0",
+        from_waid=waid,
+        to_phone_id="PHONE",
+        type="text",
+        text=text,
+        contact_name=None,
+        raw={},
+    )
+
+
+def test_queue_preserves_per_sender_order_and_drains_on_stop():
+    seen = []
+
+    async def handler(msg, settings):  # type: ignore[no-untyped-def]
+        # Later messages finish faster; order must still hold per sender
+        await asyncio.sleep(0.01 if msg.message_id.endswith("0") else 0)
+        seen.append((msg.from_waid, msg.message_id))
+
+    async def run() -> None:
+        q = IngestionQueue(load_settings(), workers=3, handler=handler)
+        q.start()
+        for i in range(5):
+            for waid in ("+321", "+322"):
+                assert q.submit(_msg(waid, f"{waid}-{i}"))
+        await q.stop(timeout=5)
+        assert q.stats()["processed"] == 10
+
+    asyncio.run(run())
+    for waid in ("+321", "+322"):
+        ids = [mid for w, mid in seen if w == waid]
+        assert ids == [f"{waid}-{i}" for i in range(5)]
+
+
+def test_queue_runs_different_senders_concurrently():
+    active = 0
+    peak = 0
+
+    async def handler(msg, settings):  # type: ignore[no-untyped-def]
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+
+    async def run() -> None:
+        q = IngestionQueue(load_settings(), workers=8, handler=handler)
+        q.start()
+        for i in range(8):
+            q.submit(_msg(f"+32{i}", f"m{i}"))
+        await q.stop(timeout=5)
+
+    asyncio.run(run())
+    assert peak > 1
+
+
+def test_queue_rejects_when_not_running_or_full():
+    async def handler(msg, settings):  # type: ignore[no-untyped-def]
+        await asyncio.sleep(0)
+
+    async def run() -> None:
+        q = IngestionQueue(load_settings(), workers=1, maxsize=1, handler=handler)
+        assert q.submit(_msg("+32", "a")) is False
+        q.start()
+        assert q.submit(_msg("+32", "b")) is True
+        assert q.submit(_msg("+32", "c")) is False
+        assert q.stats()["rejected"] == 1
+        await q.stop(timeout=5)
+
+    asyncio.run(run())
+
+
+def test_message_cut_short_at_drain_timeout_is_not_acked():
+    acked = []
+
+    async def handler(msg, settings):  # type: ignore[no-untyped-def]
+        if msg.message_id == "slow":
+            await asyncio.sleep(10)
+
+    async def run() -> None:
+        q = IngestionQueue(
+            load_settings(),
+            workers=1,
+            handler=handler,
+            on_done=lambda m: acked.append(m.message_id),
+        )
+        q.start()
+        q.submit(_msg("+32", "fast"))
+        q.submit(_msg("+32", "slow"))
+        await asyncio.sleep(0.01)
+        await q.stop(timeout=0.05)
+
+    asyncio.run(run())
+    # "slow" stays unacked so the journal replays it on the next start
+    assert acked == ["fast"]
+
+
+def test_webhook_acks_and_hands_off_to_workers(monkeypatch):
+    from app.main import create_app
+
+    handled = []
+
+    async def fake_handle(msg, settings):  # type: ignore[no-untyped-def]
+        handled.append(msg.message_id)
+
+    monkeypatch.setattr("agents.ingest.handle_inbound_message", fake_handle, raising=True)
+    payload = {
+        "entry": [
+            {
+                "changes": [
+                    {
+                        "value": {
+                            "metadata": {"phone_number_id": "PHONE_ID"},
+                            "contacts": [{"profile": {"name": "Eve"}, "wa_id": "+32475555555"}],
+                            "messages": [
+                                {
+                                    "from": "+32475555555",
+                                    "id": "wamid.QUEUED",
+                                    "timestamp": "1690000000",
+                                    "type": "text",
+                                    "text": {"body": "Bonjour"},
+                                }
+                            ],
+                        }
+                    }
+                ]
+            }
+        ]
+    }
+    with TestClient(create_app()) as client:
+        assert client.app.state.ingestion_queue.running
+        resp = client.post("/webhooks/whatsapp", json=payload)
+        assert resp.status_code == 200
+        assert resp.text == "EVENT_RECEIVED"
+    # Lifespan shutdown drains the queue
+    assert handled == ["wamid.QUEUED"]
+
+
+def test_queue_coalesces_bursts_per_sender_within_max_wait():
+    seen = []
+    acked = []
+
+    async def handler(msg, settings):  # type: ignore[no-untyped-def]
+        seen.append(msg)
+
+    async def run() -> None:
+        q = IngestionQueue(
+            load_settings(),
+            workers=2,
+            handler=handler,
+            on_done=lambda m: acked.extend(m.ids()),
+            coalesce_ms=50,
+            coalesce_max_ms=120,
+        )
+        q.start()
+        q.submit(_msg("+321", "a1", "Bonjour"))
+        q.submit(_msg("+322", "b1", "Salut"))
+        await asyncio.sleep(0.02)
+        q.submit(_msg("+321", "a2", "c'est Marie Dupont"))
+        await asyncio.sleep(0.02)
+        q.submit(_msg("+321", "a3", "pour un détartrage demain"))
+        await asyncio.sleep(0.1)
+        assert [m.message_id for m in seen] == ["b1", "a3"]
+
+        # A steady trickle is still flushed once the max wait is reached
+        for i in range(6):
+            q.submit(_msg("+323", f"c{i}", f"part {i}"))
+            await asyncio.sleep(0.03)
+        await q.stop(timeout=5)
+        assert q.stats()["coalesced"] >= 2 + 3
+
+    asyncio.run(run())
+    merged = next(m for m in seen if m.message_id == "a3")
+    assert merged.text == "Bonjour\nc'est Marie Dupont\npour un détartrage demain"
+    assert merged.merged_ids == ["a1", "a2", "a3"]
+    trickle = [m for m in seen if m.from_waid == "+323"]
+    assert len(trickle) >= 2
+    assert [mid for m in trickle for mid in m.ids()] == [f"c{i}" for i in range(6)]
+    assert sorted(acked) == sorted(["a1", "a2", "a3", "b1"] + [f"c{i}" for i in range(6)])
+
+
+def test_non_text_message_flushes_pending_burst_first():
+    seen = []
+
+    async def handler(msg, settings):  # type: ignore[no-untyped-def]
+        seen.append(msg.message_id)
+
+    async def run() -> None:
+        q = IngestionQueue(load_settings(), workers=1, handler=handler, coalesce_ms=1000)
+        q.start()
+        q.submit(_msg("+321", "t1"))
+        image = _msg("+321", "img")
+        image.type = "image"
+        q.submit(image)
+        await q.stop(timeout=5)
+
+    asyncio.run(run())
+    assert seen == ["t1", "img"]
+
+
+def test_buffered_messages_count_against_maxsize_and_stay_in_order():
+    seen = []
+
+    async def handler(msg, settings):  # type: ignore[no-untyped-def]
+        seen.append([mid for mid in msg.ids()])
+
+    async def run() -> None:
+        q = IngestionQueue(load_settings(), workers=1, maxsize=2, handler=handler, coalesce_ms=1000)
+        q.start()
+        assert q.submit(_msg("+321", "t1"))
+        assert q.submit(_msg("+321", "t2"))
+        # Two buffered texts fill the worker: no room left for the flush to overflow into
+        assert not q.submit(_msg("+322", "x"))
+        image = _msg("+321", "img")
+        image.type = "image"
+        assert not q.submit(image)
+        # Flushed on stop, ahead of the stop sentinel
+        await q.stop(timeout=5)
+
+    asyncio.run(run())
+    assert seen == [["t1", "t2"]]
+
+
+def test_put_waits_for_room_in_arrival_order():
+    seen = []
+    gate = asyncio.Event()
+
+    async def handler(msg, settings):  # type: ignore[no-untyped-def]
+        await gate.wait()
+        seen.append(msg.message_id)
+
+    async def run() -> None:
+        q = IngestionQueue(load_settings(), workers=1, maxsize=1, handler=handler)
+        q.start()
+        assert await q.put(_msg("+321", "a1"))
+        await asyncio.sleep(0)  # the worker takes a1 and blocks on the gate
+        assert await q.put(_msg("+321", "a2"))
+        third = asyncio.create_task(q.put(_msg("+321", "a3")))
+        await asyncio.sleep(0)
+        # a3 is waiting: nothing may overtake it, not even a non-blocking submit
+        assert not q.submit(_msg("+321", "late"))
+        fourth = asyncio.create_task(q.put(_msg("+321", "a4")))
+        await asyncio.sleep(0)
+        assert not third.done()
+        gate.set()
+        assert await third and await fourth
+        await q.stop(timeout=5)
+
+    asyncio.run(run())
+    assert seen == ["a1", "a2", "a3", "a4"]
+
+
+def test_stop_honours_timeout_with_full_queue_and_hung_handler():
+    async def handler(msg, settings):  # type: ignore[no-untyped-def]
+        await asyncio.sleep(10)
+
+    async def run() -> None:
+        q = IngestionQueue(load_settings(), workers=1, maxsize=1, handler=handler)
+        q.start()
+        q.submit(_msg("+321", "a1"))
+        await asyncio.sleep(0)
+        q.submit(_msg("+321", "a2"))
+        waiting = asyncio.create_task(q.put(_msg("+321", "a3")))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(q.stop(timeout=0.05), 1)
+        # Not accepted: the caller handles it another way
+        assert await waiting is False
+
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+from agents.cache import ExtractionCache
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _key(text: str, version: str = "v1") -> str:
+    return ExtractionCache.make_key(text, {"name": None}, "gpt-test", version)
+
+
+def test_cache_lru_capacity_and_ttl():
+    clock = _Clock()
+    cache = ExtractionCache(capacity=2, ttl_s=10, clock=clock)
+    cache.put(_key("oui"), {"name": None})
+    cache.put(_key("non"), {"name": None})
+    assert cache.get(_key("oui")) is not None  # refreshes "oui"
+    cache.put(_key("1"), {"name": None})  # evicts "non"
+    assert cache.get(_key("non")) is None
+    clock.now += 11
+    assert cache.get(_key("oui")) is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["hits"] == 1
+
+
+def test_cache_key_normalises_text_and_tracks_prompt_version():
+    assert _key("Bonjour ") == _key("bonjour")
+    assert _key("bonjour", "v1") != _key("bonjour", "v2")
+
+
+def test_cache_disabled_with_zero_capacity():
+    cache = ExtractionCache(capacity=0)
+    cache.put(_key("oui"), {"name": None})
+    assert cache.get(_key("oui")) is None
+    assert cache.stats()["size"] == 0
@@ -21,7 +21,7 @@ class _StubClient:
             self._fail = fail_on_response_format
             self._fail_temp_once = fail_on_temperature_once
 
-        def create(self, **kwargs):  # type: ignore[no-untyped-def]
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
             if self._fail and "response_format" in kwargs:
                 raise TypeError("create() got an unexpected keyword argument 'response_format'")
             if self._fail_temp_once and "temperature" in kwargs:
@@ -44,7 +44,9 @@ def test_ingest_merges_extraction_and_normalizes_time(monkeypatch):
         "reason": "Douleur dentaire",
         "preferred_time": "mardi 10h30",
     })
-    monkeypatch.setattr("agents.ingest.create_agents_client", lambda settings: _StubClient(payload), raising=True)
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda settings: _StubClient(payload), raising=True
+    )
     # Make normalization deterministic
     monkeypatch.setattr(
         "agents.ingest.parse_preferred_time_fr",
@@ -79,7 +81,7 @@ def test_ingest_fallback_without_response_format_when_unsupported(monkeypatch):
     payload = json.dumps({"name": "Bob", "reason": None, "preferred_time": "demain matin"})
     # First call will raise TypeError if response_format is present; our code should retry without it.
     monkeypatch.setattr(
-        "agents.ingest.create_agents_client",
+        "agents.ingest.get_agents_client",
         lambda settings: _StubClient(payload, fail_on_response_format=True),
         raising=True,
     )
@@ -112,7 +114,7 @@ def test_ingest_fallback_without_temperature_when_unsupported(monkeypatch):
     monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
     payload = json.dumps({"name": None, "reason": "Check-up", "preferred_time": "mercredi soir"})
     monkeypatch.setattr(
-        "agents.ingest.create_agents_client",
+        "agents.ingest.get_agents_client",
         lambda settings: _StubClient(payload, fail_on_response_format=False, fail_on_temperature_once=True),
         raising=True,
     )
@@ -137,3 +139,465 @@ def test_ingest_fallback_without_temperature_when_unsupported(monkeypatch):
     assert st.reason == "Check-up"
     assert st.preferred_time == "mercredi soir"
     assert st.preferred_time_iso == "2025-01-15T18:00:00+01:00"
+
+
+def test_ingest_conversations_do_not_serialise_on_model_call(monkeypatch):
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    payload = json.dumps({"name": None, "reason": None, "preferred_time": None})
+
+    class _SlowResponses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            await asyncio.sleep(0.2)
+            return _StubResp(payload)
+
+    slow = type("C", (), {"responses": _SlowResponses()})()
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda settings: slow, raising=True)
+    s = load_settings()
+
+    async def run() -> float:
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        await asyncio.gather(*[
+            handle_inbound_message(
+                NormalizedMessage(
+                    message_id=f"wamid.C{i}",
+                    timestamp="0",
+                    from_waid=f"+3249000000{i}",
+                    to_phone_id="PHONE",
+                    type="text",
+                    text="Bonjour",
+                    contact_name="",
+                    raw={},
+                ),
+                s,
+            )
+            for i in range(5)
+        ])
+        return loop.time() - t0
+
+    elapsed = asyncio.run(run())
+    assert elapsed < 0.6
+
+
+def test_rejected_parameter_is_remembered_across_messages(monkeypatch, tmp_path):
+    from agents.capabilities import ModelCapabilityRegistry, registry
+
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    registry.configure(str(tmp_path / "caps.json"))
+    payload = json.dumps({"name": None, "reason": "Check-up", "preferred_time": None})
+    stub = _StubClient(payload, fail_on_response_format=True)
+    calls = []
+    original = stub.responses.create
+
+    async def counting_create(**kwargs):  # type: ignore[no-untyped-def]
+        calls.append(sorted(kwargs))
+        return await original(**kwargs)
+
+    stub.responses.create = counting_create  # type: ignore[assignment]
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda settings: stub, raising=True)
+    s = load_settings()
+    for i in range(3):
+        msg = NormalizedMessage(
+            message_id=f"wamid.R{i}",
+            timestamp="0",
+            from_waid=f"+3222222222{i}",
+            to_phone_id="PHONE",
+            type="text",
+            text=f"Bonjour, message {i}",
+            contact_name="",
+            raw={},
+        )
+        asyncio.run(handle_inbound_message(msg, s))
+    # One failed discovery round-trip, then one call per message
+    assert len(calls) == 4
+    assert all("response_format" not in c for c in calls[1:])
+    # Persisted and reloaded by a fresh registry (e.g. after restart)
+    reloaded = ModelCapabilityRegistry(str(tmp_path / "caps.json"))
+    assert reloaded.supports(s.agent_model, s.openai_base_url, "response_format") is False
+    assert reloaded.supports(s.agent_model, s.openai_base_url, "temperature") is True
+
+
+def test_debug_capabilities_endpoint(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from agents.capabilities import registry
+    from app.main import create_app
+
+    registry.record("gpt-test", None, "temperature", False)
+    client = TestClient(create_app())
+    data = client.get("/_debug/agent-capabilities").json()
+    assert data["capabilities"]["default|gpt-test"] == {"temperature": False}
+
+
+def test_startup_probe_learns_capabilities(monkeypatch):
+    from agents.capabilities import registry
+    from agents.ingest import probe_model_capabilities
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    stub = _StubClient("{}", fail_on_temperature_once=True)
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda settings: stub, raising=True)
+    s = load_settings()
+    caps = asyncio.run(probe_model_capabilities(s))
+    key = f"default|{s.agent_model}"
+    assert caps[key]["temperature"] is False
+    assert caps[key]["response_format"] is True
+    assert registry.supports(s.agent_model, None, "temperature") is False
+
+
+def test_identical_message_and_context_reuse_cached_extraction(monkeypatch):
+    from agents.cache import extraction_cache
+
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    payload = json.dumps({"name": None, "reason": None, "preferred_time": None})
+    calls = []
+
+    class _Responses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            calls.append(kwargs)
+            return _StubResp(payload)
+
+    client = type("C", (), {"responses": _Responses()})()
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda settings: client, raising=True)
+    s = load_settings()
+    for i, text in enumerate(["Bonjour", "  bonjour ", "BONJOUR"]):
+        msg = NormalizedMessage(
+            message_id=f"wamid.H{i}",
+            timestamp="0",
+            from_waid=f"+3244444444{i}",
+            to_phone_id="PHONE",
+            type="text",
+            text=text,
+            contact_name="",
+            raw={},
+        )
+        asyncio.run(handle_inbound_message(msg, s))
+    assert len(calls) == 1
+    stats = extraction_cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+    # Different known-field context is a different key
+    st = session_store.get("+32444444449")
+    st.name = "Alice"
+    session_store.put(st)
+    msg = NormalizedMessage(
+        message_id="wamid.H9",
+        timestamp="0",
+        from_waid="+32444444449",
+        to_phone_id="PHONE",
+        type="text",
+        text="Bonjour",
+        contact_name="",
+        raw={},
+    )
+    asyncio.run(handle_inbound_message(msg, s))
+    assert len(calls) == 2
+
+
+def test_cached_prompt_tokens_recorded_per_conversation(monkeypatch):
+    from agents.usage import tracker
+
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    payload = json.dumps({"name": None, "reason": None, "preferred_time": None})
+
+    class _Usage:
+        input_tokens = 1200
+        output_tokens = 20
+        input_tokens_details = type("D", (), {"cached_tokens": 1024})()
+
+    class _Responses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            resp = _StubResp(payload)
+            resp.usage = _Usage()  # type: ignore[attr-defined]
+            return resp
+
+    client = type("C", (), {"responses": _Responses()})()
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda settings: client, raising=True)
+    msg = NormalizedMessage(
+        message_id="wamid.U",
+        timestamp="0",
+        from_waid="+32455555555",
+        to_phone_id="PHONE",
+        type="text",
+        text="Salut tout le monde",
+        contact_name="",
+        raw={},
+    )
+    asyncio.run(handle_inbound_message(msg, load_settings()))
+    usage = tracker.conversation("+32455555555")
+    assert usage is not None
+    assert usage.calls == 1 and usage.cached_tokens == 1024 and usage.input_tokens == 1200
+    assert tracker.stats()["total"]["cached_ratio"] > 0.8
+
+
+def test_slow_model_falls_back_to_local_reply_and_trips_breaker(monkeypatch):
+    from agents.breaker import OPEN, breakers
+
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_AUTO_REPLY", "true")
+    monkeypatch.setenv("AGENT_DEADLINE_S", "0.05")
+    breakers.configure(failure_threshold=2, reset_timeout_s=60)
+
+    calls = {"n": 0}
+
+    class _HangingResponses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            calls["n"] += 1
+            await asyncio.sleep(5)
+
+    class _HangingClient:
+        responses = _HangingResponses()
+
+    class _WA:
+        def __init__(self) -> None:
+            self.sent = []
+
+        async def send_text(self, to: str, body: str, dry_run: bool = False):  # type: ignore[no-untyped-def]
+            self.sent.append(body)
+            return {"ok": True}
+
+    wa = _WA()
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda settings: _HangingClient(), raising=True
+    )
+    monkeypatch.setattr("agents.ingest.whatsapp_from_settings", lambda s: wa, raising=True)
+
+    s = load_settings()
+    texts = ["Bonjour, j'ai une carie", "Je m'appelle Claire Martin", "Vers 10h"]
+    for i, text in enumerate(texts):
+        msg = NormalizedMessage(
+            message_id=f"wamid.SLOW{i}",
+            timestamp="0",
+            from_waid="+32470000011",
+            to_phone_id="PHONE_ID",
+            type="text",
+            text=text,
+            contact_name=None,
+            raw={},
+        )
+        asyncio.run(handle_inbound_message(msg, s))
+
+    # Two timeouts open the breaker; the third message never reaches the model
+    assert calls["n"] == 2
+    stats = breakers.stats()[s.agent_model]
+    assert stats["state"] == OPEN
+    assert stats["trips"] == 1
+    assert stats["rejected"] == 1
+
+    # Every message still got a reply built from local parsing
+    assert len(wa.sent) == 3
+    st = session_store.get("+32470000011")
+    assert st.reason == "carie"
+    assert st.name == "Claire Martin"
+    assert st.preferred_time == "10h"
+    assert "nom complet" in wa.sent[0]
+
+
+def _text_msg(mid: str, waid: str, text: str) -> NormalizedMessage:
+    return NormalizedMessage(
+        message_id=mid,
+        timestamp="0",
+        from_waid=waid,
+        to_phone_id="PHONE_ID",
+        type="text",
+        text=text,
+        contact_name=None,
+        raw={},
+    )
+
+
+def test_strict_mode_returns_typed_extraction(monkeypatch):
+    from agents.schemas import Extraction
+
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_STRICT_MODELS", "gpt-4o, gpt-4.1")
+    monkeypatch.setenv("AGENT_RULES_ENABLED", "false")
+    calls = []
+
+    class _Responses:
+        async def parse(self, **kwargs):  # type: ignore[no-untyped-def]
+            calls.append(("parse", kwargs))
+            parsed = Extraction(name="Zoé Petit", reason=" carie ")
+            return type("R", (), {"output_parsed": parsed})()
+
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            calls.append(("create", kwargs))
+            raise AssertionError("free-form path must not run")
+
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda s: type("C", (), {"responses": _Responses()})()
+    )
+    msg = _text_msg("wamid.STRICT", "+32470000031", "zoé petit, une carie")
+    asyncio.run(handle_inbound_message(msg, load_settings()))
+
+    assert [c[0] for c in calls] == ["parse"]
+    assert calls[0][1]["text_format"] is Extraction
+    assert "response_format" not in calls[0][1]
+    st = session_store.get("+32470000031")
+    assert (st.name, st.reason) == ("Zoé Petit", "carie")
+
+
+def test_strict_mode_falls_back_and_remembers_unsupported_model(monkeypatch):
+    from agents.capabilities import STRICT_OUTPUT, registry
+
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_STRICT_MODELS", "*")
+    monkeypatch.setenv("AGENT_RULES_ENABLED", "false")
+    calls = []
+
+    class _Responses:
+        async def parse(self, **kwargs):  # type: ignore[no-untyped-def]
+            calls.append("parse")
+            raise Exception(
+                "Invalid parameter: 'text.format' of type 'json_schema' is not supported"
+                " with this model."
+            )
+
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            calls.append("create")
+            payload = {"name": "Paul Roy", "reason": None, "preferred_time": None}
+            return _StubResp(json.dumps(payload))
+
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda s: type("C", (), {"responses": _Responses()})()
+    )
+    s = load_settings()
+    asyncio.run(handle_inbound_message(_text_msg("wamid.S1", "+32470000032", "paul roy"), s))
+    asyncio.run(handle_inbound_message(_text_msg("wamid.S2", "+32470000033", "paul roy ici"), s))
+
+    assert calls == ["parse", "create", "create"]
+    assert registry.supports(s.agent_model, s.openai_base_url, STRICT_OUTPUT) is False
+    assert session_store.get("+32470000032").name == "Paul Roy"
+
+
+class _Usage:
+    def __init__(self, n: int) -> None:
+        self.input_tokens = n
+        self.output_tokens = 10
+        self.input_tokens_details = type("D", (), {"cached_tokens": 0})()
+
+
+def _routing_client(answers, calls):
+    class _Responses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            calls.append(kwargs["model"])
+            resp = _StubResp(answers[kwargs["model"]])
+            resp.usage = _Usage(100 if kwargs["model"] == "mini" else 300)
+            return resp
+
+    return type("C", (), {"responses": _Responses()})()
+
+
+def test_routing_escalates_when_cheap_model_misses_visible_field(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_MODEL_TIERS", "mini,big")
+    calls = []
+    answers = {
+        "mini": json.dumps({"name": None, "reason": None, "preferred_time": None}),
+        "big": json.dumps({"name": "Claire Martin", "reason": None, "preferred_time": None}),
+    }
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda s: _routing_client(answers, calls)
+    )
+    s = load_settings()
+    msg = _text_msg("wamid.R1", "+32470000041", "Je m'appelle Claire Martin")
+    asyncio.run(handle_inbound_message(msg, s))
+    assert calls == ["mini", "big"]
+    assert session_store.get("+32470000041").name == "Claire Martin"
+
+    # Nothing to see in "Bonjour": the cheap answer is accepted
+    asyncio.run(handle_inbound_message(_text_msg("wamid.R2", "+32470000042", "Bonjour"), s))
+    assert calls == ["mini", "big", "mini"]
+
+    from app.main import create_app
+
+    body = TestClient(create_app()).get("/_debug/routing").json()
+    assert body["models"] == ["mini", "big"]
+    assert body["tiers"]["mini"]["calls"] == 2
+    assert body["escalation_reasons"] == {"empty_field": 1}
+    assert body["tokens_by_model"]["mini"]["input_tokens"] == 200
+    assert body["tokens_by_model"]["big"]["input_tokens"] == 300
+
+
+def test_routing_escalates_on_contradiction_with_session(monkeypatch):
+    from agents.routing import routing_stats
+    from agents.session import SessionState
+
+    session_store.clear()
+    session_store.put(SessionState(from_waid="+32470000043", name="Alice Durand"))
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_MODEL_TIERS", "mini,big")
+    monkeypatch.setenv("AGENT_RULES_ENABLED", "false")
+    calls = []
+    answers = {
+        "mini": json.dumps({"name": "Bob", "reason": "contrôle", "preferred_time": None}),
+        "big": json.dumps({"name": "Alice Durand", "reason": "contrôle", "preferred_time": None}),
+    }
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda s: _routing_client(answers, calls)
+    )
+    msg = _text_msg("wamid.R3", "+32470000043", "pour un contrôle svp")
+    asyncio.run(handle_inbound_message(msg, load_settings()))
+
+    assert calls == ["mini", "big"]
+    stats = routing_stats.stats()
+    assert stats["escalation_reasons"] == {"contradiction": 1}
+    assert stats["tiers"]["mini"]["escalation_rate"] == 1.0
+    assert stats["tiers"]["big"]["escalations"] == 0
+    assert session_store.get("+32470000043").reason == "contrôle"
+
+
+@pytest.mark.parametrize(
+    "text, confidence, escalates",
+    [("le matin", 0.4, False), ("vers 10h", 0.6, True)],
+)
+def test_routing_escalates_empty_field_only_above_rule_confidence(text, confidence, escalates):
+    from agents.routing import escalation_reason
+    from agents.rules import pre_extract
+    from agents.schemas import Extraction
+    from agents.session import SessionState
+
+    state = SessionState(from_waid="+1", name="Alice", reason="contrôle")
+    signals = pre_extract(text, state)
+    assert signals.preferred_time.confidence == confidence
+    min_confidence = load_settings().agent_routing_min_rule_confidence
+    reason = escalation_reason(
+        Extraction(), state, ["preferred_time"], signals, min_rule_confidence=min_confidence
+    )
+    assert reason == ("empty_field" if escalates else None)
+
+
+def test_same_sender_messages_never_run_concurrently(monkeypatch):
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_RULES_ENABLED", "false")
+    active = {"now": 0, "peak": 0}
+
+    class _Responses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.02)
+            active["now"] -= 1
+            return _StubResp(json.dumps({"name": None, "reason": None, "preferred_time": None}))
+
+    monkeypatch.setattr(
+        "agents.ingest.get_agents_client", lambda s: type("C", (), {"responses": _Responses()})()
+    )
+    s = load_settings()
+
+    async def run() -> None:
+        msgs = [_text_msg(f"wamid.L{i}", "+32470000061", f"message {i}") for i in range(3)]
+        await asyncio.gather(*(handle_inbound_message(m, s) for m in msgs))
+
+    asyncio.run(run())
+    assert active["peak"] == 1
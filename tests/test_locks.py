@@ -0,0 +1,48 @@
+import asyncio
+
+from agents.locks import ConversationLocks
+
+
+def test_same_key_is_serialised_and_lock_evicted_when_idle():
+    locks = ConversationLocks()
+    events = []
+
+    async def work(key: str, name: str) -> None:
+        async with locks.hold(key):
+            events.append(f"{name}-start")
+            await asyncio.sleep(0.02)
+            events.append(f"{name}-end")
+
+    async def run() -> None:
+        await asyncio.gather(work("+321", "a"), work("+321", "b"), work("+322", "c"))
+        assert len(locks) == 0
+
+    asyncio.run(run())
+    a, b = events.index("a-start"), events.index("b-start")
+    first, second = ("a", "b") if a < b else ("b", "a")
+    assert events.index(f"{first}-end") < events.index(f"{second}-start")
+    # Other conversations are not held up
+    assert events.index("c-start") < events.index(f"{first}-end")
+    stats = locks.stats()
+    assert stats["acquisitions"] == 3
+    assert stats["contended"] == 1
+    assert stats["wait_max_ms"] >= 15
+
+
+def test_cancelled_waiter_does_not_leak_lock_entry():
+    locks = ConversationLocks()
+
+    async def run() -> None:
+        async with locks.hold("+321"):
+            waiter = asyncio.create_task(_enter(locks, "+321"))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        assert len(locks) == 0
+
+    asyncio.run(run())
+
+
+async def _enter(locks: ConversationLocks, key: str) -> None:
+    async with locks.hold(key):
+        pass
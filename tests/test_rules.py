@@ -0,0 +1,150 @@
+import asyncio
+import json
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from agents.datetime_fr import parse_preferred_time_fr
+from agents.ingest import handle_inbound_message
+from agents.rules import pre_extract
+from agents.session import SessionState
+from agents.session import store as session_store
+from app.config import load_settings
+from connectors.whatsapp.types import NormalizedMessage
+
+
+def test_pre_extract_intro_name_and_time():
+    out = pre_extract(
+        "Bonjour, je m'appelle Alice Martin. Mardi 10h30.", SessionState(from_waid="+1")
+    )
+    assert out.name.value == "Alice Martin" and out.name.confidence >= 0.9
+    assert out.preferred_time.value == "Mardi 10h30" and out.preferred_time.confidence >= 0.9
+    assert out.reason.value is None
+
+
+def test_pre_extract_reason_gazetteer_and_relative_day():
+    out = pre_extract("pour un détartrage demain matin", SessionState(from_waid="+1"))
+    assert out.reason.value == "détartrage"
+    assert out.preferred_time.value == "demain matin"
+    assert out.name.value is None
+
+
+def test_pre_extract_bare_name_only_when_asked():
+    asked = SessionState(from_waid="+1")
+    assert pre_extract("Marie Dupont", asked).name.value == "Marie Dupont"
+    assert pre_extract("bonjour", asked).name.value is None
+    known = SessionState(from_waid="+1", name="Alice")
+    assert pre_extract("Marie Dupont", known).name.value is None
+
+
+def test_pre_extract_low_confidence_for_ambiguous_time():
+    out = pre_extract("vers 10h", SessionState(from_waid="+1"))
+    assert out.preferred_time.value == "10h"
+    assert out.preferred_time.confidence < 0.85
+    assert not out.covers(["preferred_time"], 0.85)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "pas demain, plutôt jeudi matin",
+        "Demain je ne peux pas, vendredi 10h",
+        "mardi ou jeudi 10h",
+        "jeudi 10h ou 14h",
+        "n'importe quand sauf lundi matin",
+    ],
+)
+def test_pre_extract_refused_or_several_times_left_to_model(text):
+    out = pre_extract(text, SessionState(from_waid="+1"))
+    assert out.preferred_time.confidence < 0.6
+    assert not out.covers(["preferred_time"], load_settings().agent_rules_min_confidence)
+
+
+@pytest.mark.parametrize(
+    "text, day",
+    [
+        ("demain matin", "2025-01-09"),
+        ("Mardi 10h30 si possible", "2025-01-14"),
+        ("pour un contrôle après-demain vers 14h", "2025-01-10"),
+        ("vendredi prochain le soir", "2025-01-17"),
+    ],
+)
+def test_pre_extract_time_parses_to_the_day_the_rule_saw(text, day):
+    now = datetime(2025, 1, 8, 8, 0, tzinfo=ZoneInfo("Europe/Brussels"))  # a Wednesday
+    guess = pre_extract(text, SessionState(from_waid="+1")).preferred_time
+    assert guess.confidence >= 0.85
+    assert parse_preferred_time_fr(guess.value, now=now).iso.startswith(day)
+
+
+def test_pre_extract_sentence_reply_is_not_a_name():
+    asked = SessionState(from_waid="+1")
+    assert pre_extract("je ne sais pas", asked).name.value is None
+    assert pre_extract("c'est pour moi", asked).name.value is None
+    assert pre_extract("marie dupont", asked).name.value == "Marie Dupont"
+
+
+def test_ingest_asks_model_when_a_day_is_refused(monkeypatch):
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    calls = []
+
+    class _Responses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            calls.append(kwargs)
+            payload = {"name": None, "reason": None, "preferred_time": "jeudi matin"}
+            return type("R", (), {"output_text": json.dumps(payload)})()
+
+    client = type("C", (), {"responses": _Responses()})()
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda settings: client, raising=True)
+    st = session_store.get("+32333333334")
+    st.name, st.reason = "Alice", "carie"
+    session_store.put(st)
+    msg = NormalizedMessage(
+        message_id="wamid.RULES2",
+        timestamp="0",
+        from_waid="+32333333334",
+        to_phone_id="PHONE",
+        type="text",
+        text="pas demain, plutôt jeudi matin",
+        contact_name="",
+        raw={},
+    )
+    asyncio.run(handle_inbound_message(msg, load_settings()))
+    assert len(calls) == 1
+    assert session_store.get("+32333333334").preferred_time == "jeudi matin"
+
+
+def test_ingest_skips_model_when_rules_fill_missing_fields(monkeypatch):
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    class _Responses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            raise AssertionError("model should not be called")
+
+    client = type("C", (), {"responses": _Responses()})()
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda settings: client, raising=True)
+    monkeypatch.setattr(
+        "agents.ingest.parse_preferred_time_fr",
+        lambda text: type("P", (), {"iso": "2025-01-11T09:00:00+01:00"})(),
+        raising=True,
+    )
+    st = session_store.get("+32333333333")
+    st.name = "Alice"
+    session_store.put(st)
+    msg = NormalizedMessage(
+        message_id="wamid.RULES",
+        timestamp="0",
+        from_waid="+32333333333",
+        to_phone_id="PHONE",
+        type="text",
+        text="douleur dentaire, demain matin si possible",
+        contact_name="",
+        raw={},
+    )
+    asyncio.run(handle_inbound_message(msg, load_settings()))
+    st = session_store.get("+32333333333")
+    assert st.reason == "douleur dentaire"
+    assert st.preferred_time == "demain matin"
+    assert st.preferred_time_iso == "2025-01-11T09:00:00+01:00"
@@ -0,0 +1,121 @@
+import json
+import zlib
+
+import pytest
+
+from agents.session import InMemorySessionStore, SessionState
+from agents.session_snapshot import (
+    _HEADER,
+    FORMAT_VERSION,
+    MAGIC,
+    SnapshotError,
+    decode,
+    encode,
+    load_snapshot,
+    save_snapshot,
+)
+
+
+class _Clock:
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_snapshot_round_trip_keeps_pending_alternatives_and_idle_time(tmp_path):
+    clock = _Clock(1000.0)
+    src = InMemorySessionStore(idle_ttl_s=3600, clock=clock)
+    a = src.get("+1")
+    a.name, a.reason = "Alice", "détartrage"
+    a.pending_alternatives = ["2030-01-01T10:00:00+01:00", "2030-01-01T11:00:00+01:00"]
+    a.pending_duration_min = 30
+    src.put(a)
+    clock.now = 1100.0
+    src.get("+2").name = "Bob"
+    clock.now = 1200.0
+
+    path = str(tmp_path / "sessions.snap")
+    assert save_snapshot(src, path, clock=lambda: 5000.0) == 2
+
+    dst_clock = _Clock(0.0)
+    dst = InMemorySessionStore(idle_ttl_s=3600, clock=dst_clock)
+    # Restarted 60s after the snapshot was written
+    assert load_snapshot(dst, path, clock=lambda: 5060.0) == 2
+    assert not (tmp_path / "sessions.snap").exists()
+    restored = dst.get("+1")
+    assert restored.name == "Alice" and restored.reason == "détartrage"
+    assert restored.pending_alternatives == a.pending_alternatives
+    assert restored.pending_duration_min == 30
+    # LRU order survives: +1 was the least recently active
+    assert list(dst._sessions)[0] == "+2"
+    assert dst._touched["+2"] == pytest.approx(-(100.0 + 60.0))
+
+
+def test_sessions_idle_past_ttl_across_downtime_are_dropped():
+    src = InMemorySessionStore(idle_ttl_s=600)
+    src.get("+1").name = "Alice"
+    blob = encode(src.export(), now=1000.0)
+    dst = InMemorySessionStore(idle_ttl_s=600)
+    assert dst.restore(decode(blob, now=1000.0 + 3600)) == 0
+    assert len(dst) == 0
+
+
+def test_snapshot_from_other_schema_is_matched_by_field_name():
+    body = {
+        "fields": ["from_waid", "name", "insurance"],
+        "rows": [[5.0, "+1", "Alice", "mutuelle"]],
+    }
+    blob = _HEADER.pack(MAGIC, FORMAT_VERSION, 0.0, 1) + zlib.compress(json.dumps(body).encode())
+    [(state, idle_s)] = decode(blob, now=0.0)
+    assert state == SessionState(from_waid="+1", name="Alice")
+    assert idle_s == 5.0
+
+
+@pytest.mark.parametrize(
+    "blob",
+    [
+        b"",
+        b"not a snapshot at all",
+        _HEADER.pack(MAGIC, FORMAT_VERSION + 1, 0.0, 0) + zlib.compress(b"{}"),
+        _HEADER.pack(MAGIC, FORMAT_VERSION, 0.0, 3)
+        + zlib.compress(b'{"fields":["from_waid"],"rows":[]}'),
+        _HEADER.pack(MAGIC, FORMAT_VERSION, 0.0, 0) + b"\x00garbage",
+    ],
+)
+def test_invalid_snapshots_are_rejected(blob):
+    with pytest.raises(SnapshotError):
+        decode(blob, now=0.0)
+
+
+def test_invalid_snapshot_file_starts_empty(tmp_path):
+    path = tmp_path / "sessions.snap"
+    path.write_bytes(b"MFSS\x00")
+    store = InMemorySessionStore()
+    assert load_snapshot(store, str(path)) == 0
+    assert load_snapshot(store, str(tmp_path / "missing.snap")) == 0
+    assert len(store) == 0
+
+
+def test_lifespan_saves_and_restores_sessions(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    from agents.session import store
+    from app.main import create_app
+
+    path = tmp_path / "sessions.snap"
+    monkeypatch.setenv("SESSION_SNAPSHOT_PATH", str(path))
+    store.clear()
+    with TestClient(create_app()):
+        st = store.get("+32470000081")
+        st.name = "Alice"
+        st.pending_alternatives = ["2030-01-01T10:00:00+01:00"]
+        store.put(st)
+    assert path.exists()
+    store.clear()
+    with TestClient(create_app()):
+        restored = store.get("+32470000081")
+        assert restored.name == "Alice"
+        assert restored.pending_alternatives == ["2030-01-01T10:00:00+01:00"]
+    store.clear()
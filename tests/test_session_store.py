@@ -0,0 +1,66 @@
+import dataclasses
+
+import pytest
+
+from agents.session import InMemorySessionStore, SessionState, configure_from_settings
+from app.config import load_settings
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_session_state_is_slotted_with_unique_fields():
+    names = [f.name for f in dataclasses.fields(SessionState)]
+    assert len(names) == len(set(names))
+    st = SessionState(from_waid="+1")
+    assert not hasattr(st, "__dict__")
+    with pytest.raises(AttributeError):
+        st.unknown = 1  # type: ignore[attr-defined]
+
+
+def test_store_evicts_least_recently_used_over_capacity():
+    s = InMemorySessionStore(capacity=2)
+    a = s.get("+1")
+    a.name = "Alice"
+    s.get("+2")
+    s.get("+1")  # +1 is now the most recent
+    s.get("+3")
+    assert len(s) == 2
+    assert s.get("+1").name == "Alice"
+    assert s.stats()["evictions"] >= 1
+    assert "+2" not in s._sessions
+
+
+def test_store_expires_idle_sessions():
+    clock = _Clock()
+    s = InMemorySessionStore(capacity=10, idle_ttl_s=60, clock=clock)
+    s.get("+1").name = "Alice"
+    s.get("+2").name = "Bob"
+    clock.now = 30
+    s.get("+2")
+    clock.now = 70
+    # +1 idle for 70s is gone (swept on write); +2 idle for 40s survives
+    s.put(SessionState(from_waid="+3"))
+    assert "+1" not in s._sessions
+    assert s.get("+2").name == "Bob"
+    clock.now = 200
+    assert s.get("+2").name is None  # expired on access, fresh session
+    assert s.stats()["expirations"] == 3  # +1, +2 and the idle +3
+
+
+def test_idle_ttl_capped_by_retention(monkeypatch):
+    monkeypatch.setenv("DATA_RETENTION_DAYS", "1")
+    monkeypatch.setenv("SESSION_IDLE_TTL_S", str(30 * 86400))
+    monkeypatch.setenv("SESSION_CAPACITY", "5")
+    try:
+        stats = configure_from_settings(load_settings()).stats()
+        assert stats["idle_ttl_s"] == 86400
+        assert stats["capacity"] == 5
+    finally:
+        monkeypatch.undo()
+        configure_from_settings(load_settings())
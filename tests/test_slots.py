@@ -0,0 +1,123 @@
+import random
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from connectors.calendar import slots
+from connectors.calendar.inmemory import InMemoryCalendar
+from connectors.calendar.slots import SlotFinder, parse_hours
+
+TZ = ZoneInfo("Europe/Brussels")
+PAST = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def _local(day: int, hh: int, mm: int = 0) -> datetime:
+    # January 2030: the 7th is a Monday
+    return datetime(2030, 1, day, hh, mm, tzinfo=TZ)
+
+
+def _finder(hours: str = "mon-fri 09:00-12:30,13:30-18:00", **kw) -> SlotFinder:
+    kw.setdefault("clock", lambda: PAST)
+    return SlotFinder(hours=parse_hours(hours), tz="Europe/Brussels", **kw)
+
+
+def test_parse_hours():
+    hours = parse_hours("mon-wed 08:30-12:00,13:00-17:00; sat 09:00-12:00")
+    assert hours[0] == ((510, 720), (780, 1020))
+    assert hours[2] == hours[0] and 3 not in hours
+    assert hours[5] == ((540, 720),)
+    assert parse_hours("sun-mon 10:00-11:00").keys() == {6, 0}
+    assert parse_hours("") == {d: ((0, 1440),) for d in range(7)}
+    for bad in ("mon 9-17", "xyz 09:00-10:00", "mon 10:00-09:00", "mon 09:00-25:00"):
+        with pytest.raises(ValueError):
+            parse_hours(bad)
+
+
+def test_nearest_slots_rank_by_distance_and_respect_breaks():
+    f = _finder()
+    busy = [(_local(7, 11, 0), _local(7, 12, 30)), (_local(7, 13, 30), _local(7, 14, 0))]
+    # 12:00 is busy, 12:30-13:30 is the lunch break and 13:30 is booked
+    out = f.nearest(_local(7, 12, 0), busy, duration_min=30, count=4)
+    assert out == [_local(7, 10, 30), _local(7, 10, 15), _local(7, 10, 0), _local(7, 14, 0)]
+
+
+def test_appointment_must_fit_before_closing():
+    f = _finder()
+    busy = [(_local(7, 9), _local(7, 17, 30))]
+    out = f.nearest(_local(7, 17, 0), busy, duration_min=45, count=2)
+    # 17:30 + 45 min would run past 18:00, so the next day's opening comes first
+    assert out == [_local(8, 9, 0), _local(8, 9, 15)]
+
+
+def test_granularity_and_partial_slot_overlap():
+    f = _finder(granularity_min=30)
+    busy = [(_local(7, 9, 0), _local(7, 9, 40))]
+    out = f.nearest(_local(7, 9, 0), busy, duration_min=30, count=1)
+    assert out == [_local(7, 10, 0)]
+
+
+def test_skips_weekend_and_past_slots():
+    f = _finder(clock=lambda: _local(11, 17, 50))
+    friday_evening = _local(11, 17, 45)
+    out = f.nearest(friday_evening, [], duration_min=30, count=2)
+    assert out == [_local(14, 9, 0), _local(14, 9, 15)]
+    f.clock = lambda: _local(20, 0)
+    assert f.nearest(_local(7, 9), [], count=2) == []
+
+
+def test_wall_clock_hours_across_dst_change():
+    f = _finder("mon-sun 09:00-10:00", search_days=2)
+    # Clocks go forward overnight into Sunday 2030-03-31 in Brussels
+    saturday = datetime(2030, 3, 30, 9, 0, tzinfo=TZ)
+    out = f.nearest(saturday, [(saturday, saturday + timedelta(hours=1))], count=2)
+    assert [o.isoformat() for o in out] == [
+        "2030-03-31T09:00:00+02:00",
+        "2030-03-31T09:15:00+02:00",
+    ]
+
+
+def _brute_force_nearest(finder, requested, busy, duration_min, count):
+    # Every slot start checked on its own against opening hours and busy intervals
+    origin, end = finder.window(requested)
+    step = timedelta(minutes=finder.granularity_min)
+    need = -(-duration_min // finder.granularity_min)
+
+    def free(u):
+        local = u.astimezone(TZ)
+        minute = local.hour * 60 + local.minute
+        ranges = finder.hours.get(local.weekday(), ())
+        in_hours = any(a <= minute and minute + finder.granularity_min <= b for a, b in ranges)
+        return in_hours and not any(s < u + step and e > u for s, e in busy)
+
+    starts = []
+    t = origin
+    while t < end:
+        slots_needed = [t + k * step for k in range(need)]
+        if all(u < end and free(u) for u in slots_needed):
+            starts.append(t)
+        t += step
+    return sorted(starts, key=lambda t: (abs(t - requested), t))[:count]
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(3)
+    finder = _finder()
+    for _ in range(50):
+        busy = []
+        for _ in range(rng.randrange(0, 30)):
+            s = _local(7, 8) + timedelta(minutes=rng.randrange(0, 7 * 24 * 60))
+            busy.append((s, s + timedelta(minutes=rng.choice([15, 30, 60, 240]))))
+        requested = _local(7, 9) + timedelta(minutes=15 * rng.randrange(0, 400))
+        kw = dict(duration_min=rng.choice([15, 30, 45, 90]), count=5)
+        expected = _brute_force_nearest(finder, requested, busy, **kw)
+        assert finder.nearest(requested, busy, **kw) == expected
+
+
+def test_inmemory_calendar_suggests_nearest_free_slots(monkeypatch):
+    monkeypatch.setattr(slots, "finder", _finder())
+    cal = InMemoryCalendar()
+    cal.create_event(_local(7, 10), duration_min=60, title="a")
+    out = cal.suggest_alternatives(_local(7, 10, 15), duration_min=30, count=2)
+    # Equally far on both sides: the earlier one first
+    assert out == [_local(7, 9, 30), _local(7, 11, 0)]
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from agents.session import store as session_store
+from agents.streaming import IncrementalObjectParser, collect_stream
+from app.config import load_settings
+from connectors.whatsapp.types import NormalizedMessage
+
+
+class _Event:
+    def __init__(self, type: str, delta: str = "", response=None) -> None:  # noqa: A002
+        self.type = type
+        self.delta = delta
+        self.response = response
+
+
+class _Stream:
+    def __init__(self, chunks) -> None:
+        self._chunks = list(chunks)
+        self.consumed = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for c in self._chunks:
+            self.consumed += 1
+            yield _Event("response.output_text.delta", delta=c)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def test_parser_decodes_members_as_they_complete():
+    p = IncrementalObjectParser()
+    p.feed('```json\n{"name": "Ali')
+    assert p.fields == {}
+    p.feed('ce, Dupont", "reason": null, "x": {"a": [1, "}"]}')
+    assert p.fields == {"name": "Alice, Dupont", "reason": None}
+    p.feed(', "preferred_time": "mardi \\"10h\\""}\n```')
+    assert p.closed
+    assert p.fields["x"] == {"a": [1, "}"]}
+    assert p.fields["preferred_time"] == 'mardi "10h"'
+
+
+def test_collect_stream_stops_once_fields_present():
+    stream = _Stream(
+        ['{"reason": "carie", ', '"name": "Bob"', ', "preferred_time": null}', "ignored"]
+    )
+    text, usage = asyncio.run(collect_stream(stream, lambda f: "name" in f and "reason" in f))
+    assert json.loads(text) == {"reason": "carie", "name": "Bob", "preferred_time": None}
+    assert usage is None
+    assert stream.consumed == 3  # "name" only completes with the third chunk
+    assert stream.closed
+
+
+def test_ingest_streaming_stops_early_and_merges(monkeypatch):
+    session_store.clear()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_STREAMING", "true")
+    monkeypatch.setenv("AGENT_RULES_ENABLED", "false")
+    monkeypatch.setattr(
+        "agents.ingest.parse_preferred_time_fr",
+        lambda text: type("P", (), {"iso": "2025-01-14T10:30:00+01:00"})(),
+        raising=True,
+    )
+    seen = {}
+    stream = _Stream(
+        ['{"name": "Alice", "reason": "contrôle", ', '"preferred_time": "mardi 10h30"}', "x", "y"]
+    )
+
+    class _Responses:
+        async def create(self, **kwargs):  # type: ignore[no-untyped-def]
+            seen.update(kwargs)
+            return stream
+
+    class _Client:
+        responses = _Responses()
+
+    monkeypatch.setattr("agents.ingest.get_agents_client", lambda s: _Client(), raising=True)
+    msg = NormalizedMessage(
+        message_id="wamid.STREAM",
+        timestamp="0",
+        from_waid="+32470000021",
+        to_phone_id="PHONE_ID",
+        type="text",
+        text="Alice, contrôle mardi 10h30",
+        contact_name=None,
+        raw={},
+    )
+    asyncio.run(handle(msg))
+
+    assert seen.get("stream") is True
+    assert stream.consumed == 2 and stream.closed
+    st = session_store.get("+32470000021")
+    assert (st.name, st.reason, st.preferred_time) == ("Alice", "contrôle", "mardi 10h30")
+
+
+async def handle(msg):
+    from agents.ingest import handle_inbound_message
+
+    await handle_inbound_message(msg, load_settings())
@@ -0,0 +1,56 @@
+from connectors.whatsapp.store import InMemoryMessageStore
+from connectors.whatsapp.types import NormalizedMessage
+
+
+def _msg(i: int, waid: str = "+32470000000") -> NormalizedMessage:
+    return NormalizedMessage(
+        message_id=f"wamid.{i}",
+        timestamp=str(i),
+        from_waid=waid,
+        to_phone_id="PHONE",
+        type="text",
+        text=f"msg {i}",
+        contact_name=None,
+        raw={"id": f"wamid.{i}", "text": {"body": f"msg {i}"}},
+    )
+
+
+def test_ring_buffer_keeps_only_newest_messages():
+    st = InMemoryMessageStore(capacity=3)
+    for i in range(10):
+        st.save(_msg(i, waid="+321" if i % 2 else "+322"))
+    assert len(st) == 3
+    assert [m.message_id for m in st.all()] == ["wamid.7", "wamid.8", "wamid.9"]
+    # The per-sender index only references messages still in the buffer
+    assert [m.message_id for m in st.iter_messages(from_waid="+321")] == ["wamid.7", "wamid.9"]
+    assert [m.message_id for m in st.iter_messages(from_waid="+322")] == ["wamid.8"]
+    assert list(st.iter_messages(from_waid="+329")) == []
+
+
+def test_ring_buffer_pagination():
+    st = InMemoryMessageStore(capacity=100)
+    for i in range(10):
+        st.save(_msg(i))
+    page = list(st.iter_messages(offset=4, limit=3))
+    assert [m.message_id for m in page] == ["wamid.4", "wamid.5", "wamid.6"]
+    assert list(st.iter_messages(offset=20, limit=5)) == []
+
+
+def test_raw_strip_and_compress_modes():
+    stripped = InMemoryMessageStore(capacity=5, raw_mode="strip")
+    stripped.save(_msg(1))
+    assert stripped.all()[0].raw == {}
+
+    compressed = InMemoryMessageStore(capacity=5, raw_mode="compress")
+    compressed.save(_msg(2))
+    assert compressed.all()[0].raw == {"id": "wamid.2", "text": {"body": "msg 2"}}
+    assert next(compressed.iter_messages(include_raw=False)).raw == {}
+
+
+def test_configure_shrinks_keeping_newest():
+    st = InMemoryMessageStore(capacity=10)
+    for i in range(6):
+        st.save(_msg(i))
+    st.configure(capacity=2)
+    assert st.capacity == 2
+    assert [m.message_id for m in st.all()] == ["wamid.4", "wamid.5"]
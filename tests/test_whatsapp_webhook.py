@@ -113,3 +113,42 @@ def test_whatsapp_debug_messages_endpoint(monkeypatch):
     data = r2.json()
     assert isinstance(data, list) and len(data) >= 1
     assert data[0]["from"] == "+32470000000"
+
+
+def test_whatsapp_debug_messages_paginated_by_sender(monkeypatch):
+    store.clear()
+    app = create_app()
+    client = TestClient(app)
+    for i, waid in enumerate(["+32471000001", "+32471000002", "+32471000001"]):
+        payload = {
+            "entry": [
+                {
+                    "changes": [
+                        {
+                            "value": {
+                                "metadata": {"phone_number_id": "PHONE_ID"},
+                                "contacts": [{"profile": {"name": "Pat"}, "wa_id": waid}],
+                                "messages": [
+                                    {
+                                        "from": waid,
+                                        "id": f"wamid.PAGE{i}",
+                                        "timestamp": "1690000000",
+                                        "type": "text",
+                                        "text": {"body": f"Message {i}"},
+                                    }
+                                ],
+                            }
+                        }
+                    ]
+                }
+            ]
+        }
+        assert client.post("/webhooks/whatsapp", json=payload).status_code == 200
+    r = client.get(
+        "/webhooks/whatsapp/_debug/messages",
+        params={"from": "+32471000001", "limit": 1, "offset": 1},
+    )
+    assert r.status_code == 200
+    assert r.headers["X-Total-Count"] == "3"
+    data = r.json()
+    assert [d["message_id"] for d in data] == ["wamid.PAGE2"]